@@ -0,0 +1,375 @@
+import os
+import gc
+import json
+import time
+import argparse
+import threading
+import subprocess
+from datetime import datetime
+from typing import List, Dict, Any, Callable, Tuple
+import pandas as pd
+import psutil
+from data_processors import (
+    MainData,
+    BureauData,
+    PreviousApplicationData,
+    InstallmentsPaymentsData,
+    POSCashBalanceData,
+    CreditCardBalanceData,
+    BureauBalanceData,
+)
+from synthetic_data import generate_synthetic_data
+from aggregation_backends import compare_feature_frames
+from worker_pool import shutdown_worker_pool
+
+
+class ResourceMonitor:
+    """
+    Context manager measuring wall time and peak resident memory of the current process and its children.
+
+    The processors run their segments in worker processes, so the memory of the whole process tree is sampled
+    in a background thread.
+
+    Attributes:
+        interval (float): Sampling interval in seconds.
+        seconds (float): Wall time of the block.
+        peak_rss_mb (float): Peak resident memory of the process tree, in MB.
+        start_rss_mb (float): Resident memory of the process tree when entering the block, in MB.
+    """
+
+    def __init__(self, interval: float = 0.05) -> None:
+        """
+        Initializes the ResourceMonitor.
+
+        Args:
+            interval (float): Sampling interval in seconds.
+        """
+        self.interval = interval
+        self.seconds = 0.0
+        self.peak_rss_mb = 0.0
+        self.start_rss_mb = 0.0
+        self._process = psutil.Process()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def tree_rss_mb(self) -> float:
+        """
+        Measures the resident memory of the process tree.
+
+        Returns:
+            float: Resident memory in MB.
+        """
+        rss = self._process.memory_info().rss
+        for child in self._process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        return rss / 2**20
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak_rss_mb = max(self.peak_rss_mb, self.tree_rss_mb())
+
+    def __enter__(self) -> "ResourceMonitor":
+        gc.collect()
+        self.start_rss_mb = self.peak_rss_mb = self.tree_rss_mb()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.seconds = time.perf_counter() - self._start
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss_mb = max(self.peak_rss_mb, self.tree_rss_mb())
+
+
+def measure(stage: str, scale: int, fn: Callable[[], Any], backend: str = "pandas") -> Tuple[Dict[str, Any], Any]:
+    """
+    Runs a benchmark stage and collects its measurements.
+
+    Args:
+        stage (str): Name of the stage.
+        scale (int): Number of train customers of the dataset.
+        fn (Callable[[], Any]): The stage to run.
+        backend (str): Aggregation backend used by the stage.
+
+    Returns:
+        Tuple[Dict[str, Any], Any]: The measurements and the value returned by the stage.
+    """
+    with ResourceMonitor() as monitor:
+        result = fn()
+    record = {
+        "stage": stage,
+        "scale": scale,
+        "backend": backend,
+        "seconds": round(monitor.seconds, 4),
+        "peak_rss_mb": round(monitor.peak_rss_mb, 1),
+        "delta_rss_mb": round(monitor.peak_rss_mb - monitor.start_rss_mb, 1),
+    }
+    print(record)
+    return record, result
+
+
+def benchmark_processors(
+    path_to_data: str, scale: int, num_parallel_processes: int, backend: str = "pandas"
+) -> List[Dict[str, Any]]:
+    """
+    Times and memory-profiles the loading and the process() call of every processor.
+
+    Args:
+        path_to_data (str): Path to the data directory.
+        scale (int): Number of train customers of the dataset.
+        num_parallel_processes (int): Number of parallel processes for data processing.
+        backend (str): Aggregation backend of the processor recipes.
+
+    Returns:
+        List[Dict[str, Any]]: One record per processor and stage.
+    """
+    records = []
+    record, main_data = measure("MainData.load", scale, lambda: MainData(path_to_data), backend)
+    records.append(record)
+    record, _ = measure("MainData.process", scale, main_data.process, backend)
+    records.append(record)
+    del main_data
+
+    record, bureau = measure(
+        "BureauData.load", scale, lambda: BureauData(path_to_data, num_parallel_processes, backend=backend).load_data(), backend
+    )
+    records.append(record)
+    record, _ = measure("BureauData.process", scale, bureau.process, backend)
+    records.append(record)
+    bureau_id_map = bureau.get_id_mapping()
+    del bureau
+
+    processor_factories = {
+        "PreviousApplicationData": lambda: PreviousApplicationData(path_to_data, num_parallel_processes, backend=backend),
+        "InstallmentsPaymentsData": lambda: InstallmentsPaymentsData(path_to_data, num_parallel_processes, backend=backend),
+        "POSCashBalanceData": lambda: POSCashBalanceData(path_to_data, num_parallel_processes, backend=backend),
+        "CreditCardBalanceData": lambda: CreditCardBalanceData(path_to_data, num_parallel_processes, backend=backend),
+        "BureauBalanceData": lambda: BureauBalanceData(
+            path_to_data, bureau_id_map, num_parallel_processes, backend=backend
+        ),
+    }
+    for name, factory in processor_factories.items():
+        record, processor = measure(f"{name}.load", scale, lambda: factory().load_data(), backend)
+        records.append(record)
+        record, _ = measure(f"{name}.process", scale, processor.process, backend)
+        records.append(record)
+        del processor
+        gc.collect()
+    shutdown_worker_pool()
+    return records
+
+
+def benchmark_feature_engineering(
+    path_to_data: str, scale: int, num_parallel_processes: int, backend: str = "pandas"
+) -> Tuple[Dict[str, Any], pd.DataFrame]:
+    """
+    Times and memory-profiles the whole feature_engineering step.
+
+    Args:
+        path_to_data (str): Path to the data directory.
+        scale (int): Number of train customers of the dataset.
+        num_parallel_processes (int): Number of parallel processes for data processing.
+        backend (str): Aggregation backend of the processor recipes.
+
+    Returns:
+        Tuple[Dict[str, Any], pd.DataFrame]: The measurements, with the shape of the resulting feature matrix,
+        and the feature matrix itself.
+    """
+    from main_pipeline import feature_engineering
+
+    record, (df, _, _) = measure(
+        "feature_engineering",
+        scale,
+        lambda: feature_engineering(path_to_data, num_parallel_processes, 1.0, backend=backend),
+        backend,
+    )
+    record["n_rows"], record["n_features"] = df.shape
+    return record, df
+
+
+def benchmark_store_training(
+    path_to_data: str, scale: int, num_parallel_processes: int, output_dir: str, n_fold: int = 3
+) -> Dict[str, Any]:
+    """
+    Smoke-runs out-of-core training: feature engineering of all tables (previous application one-hot counts
+    included) into a FeatureStore, then k-fold training on it.
+
+    Args:
+        path_to_data (str): Path to the data directory.
+        scale (int): Number of train customers of the dataset.
+        num_parallel_processes (int): Number of parallel processes for data processing.
+        output_dir (str): Directory for the feature store.
+        n_fold (int): Number of folds.
+
+    Returns:
+        Dict[str, Any]: The measurements, with the validation score.
+    """
+    from main_pipeline import feature_engineering
+    from models import TrainerLGBM
+
+    store_dir = os.path.join(output_dir, "feature_store", f"scale_{scale}")
+    store, y, _ = feature_engineering(path_to_data, num_parallel_processes, 1.0, feature_store_dir=store_dir)
+    # the previous application one-hot counts are integer-named, which LightGBM only accepts as strings
+    one_hot = [column for column in store.columns if column.isdigit()]
+    if not one_hot:
+        raise RuntimeError("The feature store has no previous application one-hot count columns")
+    params = {"n_estimators": 20, "learning_rate": 0.1, "num_leaves": 15, "verbose": -1}
+    record, (_, _, val_metric) = measure(
+        "store_training",
+        scale,
+        lambda: TrainerLGBM(seed=7).fit_kfold_store(store, y, "classification", params, "auc", n_fold, False),
+    )
+    record["val_metric"] = float(val_metric)
+    record["n_rows"], record["n_features"] = store.n_rows, len(store.columns)
+    return record
+
+
+def current_commit() -> str:
+    """
+    Returns the short hash of the checked-out commit, so results of different commits can be compared.
+
+    Returns:
+        str: The commit hash, or "unknown" outside of a git checkout.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return "unknown"
+
+
+def save_results(records: List[Dict[str, Any]], output_dir: str) -> str:
+    """
+    Appends benchmark records to the results file, tagged with the commit and the run time.
+
+    Args:
+        records (List[Dict[str, Any]]): The benchmark records.
+        output_dir (str): Directory with the results file.
+
+    Returns:
+        str: Path to the results file.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, "benchmark_results.jsonl")
+    commit = current_commit()
+    run_at = datetime.now().isoformat(timespec="seconds")
+    with open(path, "a") as file:
+        for record in records:
+            file.write(json.dumps({"commit": commit, "run_at": run_at, **record}) + "\n")
+    return path
+
+
+def summarize_results(output_dir: str, metric: str = "seconds") -> pd.DataFrame:
+    """
+    Pivots saved benchmark results to one row per stage, scale and backend and one column per commit.
+
+    Args:
+        output_dir (str): Directory with the results file.
+        metric (str): The metric to compare ('seconds' or 'peak_rss_mb').
+
+    Returns:
+        pd.DataFrame: The latest measurement of every stage, scale, backend and commit.
+    """
+    results = pd.read_json(os.path.join(output_dir, "benchmark_results.jsonl"), lines=True)
+    if "backend" not in results:
+        results["backend"] = "pandas"
+    # records saved before backends existed all ran on pandas
+    results["backend"] = results["backend"].fillna("pandas")
+    results = results.sort_values("run_at").drop_duplicates(["commit", "stage", "scale", "backend"], keep="last")
+    commits = results.drop_duplicates("commit")["commit"].tolist()
+    return results.pivot_table(index=["stage", "scale", "backend"], columns="commit", values=metric)[commits]
+
+
+def run_benchmarks(
+    scales: List[int],
+    output_dir: str,
+    num_parallel_processes: int,
+    seed: int,
+    backends: List[str] = ["pandas"],
+    check_parity: bool = False,
+    store_training: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Generates (or reuses) a synthetic dataset per scale and benchmarks the processors and the feature engineering.
+
+    Args:
+        scales (List[int]): Numbers of train customers to benchmark.
+        output_dir (str): Directory for the synthetic data and the results.
+        num_parallel_processes (int): Number of parallel processes for data processing.
+        seed (int): Random seed of the synthetic data.
+        backends (List[str]): Aggregation backends to benchmark. The first one is the parity reference.
+        check_parity (bool): Whether to check that every backend produces the features of the reference backend.
+        store_training (bool): Whether to also smoke-run out-of-core training on a FeatureStore.
+
+    Returns:
+        List[Dict[str, Any]]: All benchmark records.
+    """
+    records = []
+    for scale in scales:
+        path_to_data = os.path.join(output_dir, "data", f"scale_{scale}_seed_{seed}") + "/"
+        if not os.path.exists(os.path.join(path_to_data, "credit_card_balance.csv")):
+            generate_synthetic_data(path_to_data, scale, seed)
+        reference = None
+        for backend in backends:
+            records += benchmark_processors(path_to_data, scale, num_parallel_processes, backend)
+            record, df = benchmark_feature_engineering(path_to_data, scale, num_parallel_processes, backend)
+            if check_parity:
+                if reference is None:
+                    reference = df
+                else:
+                    record["parity"], record["max_abs_diff"] = compare_feature_frames(reference, df)
+                    if not record["parity"]:
+                        print(f"Parity check failed for {backend} at scale {scale}: max diff {record['max_abs_diff']}")
+            records.append(record)
+            del df
+            gc.collect()
+        if store_training:
+            records.append(benchmark_store_training(path_to_data, scale, num_parallel_processes, output_dir))
+    return records
+
+
+def main() -> None:
+    """
+    Runs the benchmark suite from the command line and prints the comparison with previous commits.
+    """
+    parser = argparse.ArgumentParser(description="Home Credit processor benchmarks")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1000, 10000, 50000], help="Train customers per benchmark")
+    parser.add_argument("--output_dir", type=str, default="benchmark_output", help="Directory for data and results")
+    parser.add_argument("--num_parallel_processes", type=int, default=4, help="Number of parallel processes")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed of the synthetic data")
+    parser.add_argument("--backends", type=str, nargs="+", default=["pandas"], help="Aggregation backends to compare")
+    parser.add_argument(
+        "--check_parity", action="store_true", help="Check that all backends produce the features of the first one"
+    )
+    parser.add_argument(
+        "--store_training", action="store_true", help="Also smoke-run feature store training on every scale"
+    )
+    args = parser.parse_args()
+
+    records = run_benchmarks(
+        args.scales,
+        args.output_dir,
+        args.num_parallel_processes,
+        args.seed,
+        args.backends,
+        args.check_parity,
+        args.store_training,
+    )
+    print(f"Results saved to {save_results(records, args.output_dir)}")
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(summarize_results(args.output_dir, "seconds"))
+        print(summarize_results(args.output_dir, "peak_rss_mb"))
+
+
+if __name__ == "__main__":
+    main()
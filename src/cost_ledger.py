@@ -0,0 +1,154 @@
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator
+from utils import recipe_feature_name
+from kernels import SegmentKernel
+
+### rough relative cost of a recipe entry within one grouped pass: built-in reductions are vectorized, other
+### callables run once per group in Python, segment kernels are compiled
+aggregation_weights = {
+    "count": 1.0,
+    "sum": 1.0,
+    "mean": 1.0,
+    "min": 1.0,
+    "max": 1.0,
+    "median": 2.0,
+    "std": 1.5,
+    "var": 1.5,
+    "nunique": 3.0,
+}
+callable_weight = 25.0
+kernel_weight = 2.0
+
+
+def entry_weight(agg: Any) -> float:
+    """
+    Returns the relative cost of a recipe entry.
+
+    Args:
+        agg (Any): The aggregation, either a string, a segment kernel or another callable.
+
+    Returns:
+        float: The relative cost.
+    """
+    if isinstance(agg, SegmentKernel):
+        return kernel_weight
+    if isinstance(agg, str):
+        return aggregation_weights.get(agg, 1.0)
+    return callable_weight
+
+
+class CostLedger:
+    """
+    Records the measured compute cost of every segment and window of the feature engineering, and apportions it to
+    the features they produce.
+
+    A segment (or a window) is the unit that is timed: one worker task or one in-process window pass. Its time is
+    split between its recipe entries in proportion to their relative cost, so every feature gets an estimate of
+    the seconds that computing it takes, and the seconds saved by not computing it.
+
+    Attributes:
+        segments (Dict[str, Dict[str, Any]]): Per segment prefix, its measured seconds and the seconds of every feature.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes an empty CostLedger.
+        """
+        self.segments = {}
+        self._lock = threading.Lock()
+
+    def record(self, agg_maps: Dict[str, Dict[str, List[Any]]], seconds: float) -> None:
+        """
+        Records the time of a computation covering one or more segments.
+
+        Args:
+            agg_maps (Dict[str, Dict[str, List[Any]]]): Aggregation mapping of every segment computed, by name prefix.
+            seconds (float): The measured wall time of the computation.
+        """
+        weights = {
+            prefix: {recipe_feature_name(prefix, column, agg): entry_weight(agg) for column, aggs in agg_map.items() for agg in aggs}
+            for prefix, agg_map in agg_maps.items()
+        }
+        total = sum(weight for features in weights.values() for weight in features.values())
+        if total == 0:
+            return
+        # pool tasks are recorded from the executor's thread
+        with self._lock:
+            for prefix, features in weights.items():
+                segment = self.segments.setdefault(prefix, {"seconds": 0.0, "features": {}})
+                for feature, weight in features.items():
+                    share = seconds * weight / total
+                    segment["seconds"] += share
+                    segment["features"][feature] = segment["features"].get(feature, 0.0) + share
+
+    @contextmanager
+    def measure(self, agg_maps: Dict[str, Dict[str, List[Any]]]) -> Iterator[None]:
+        """
+        Times a block computing some segments and records it.
+
+        Args:
+            agg_maps (Dict[str, Dict[str, List[Any]]]): Aggregation mapping of every segment computed, by name prefix.
+        """
+        start = time.perf_counter()
+        yield
+        self.record(agg_maps, time.perf_counter() - start)
+
+    def feature_costs(self) -> Dict[str, float]:
+        """
+        Returns the estimated compute seconds of every recorded feature.
+
+        Returns:
+            Dict[str, float]: Seconds by feature name.
+        """
+        return {feature: cost for segment in self.segments.values() for feature, cost in segment["features"].items()}
+
+    def segment_costs(self) -> Dict[str, float]:
+        """
+        Returns the measured compute seconds of every recorded segment.
+
+        Returns:
+            Dict[str, float]: Seconds by segment prefix.
+        """
+        return {prefix: segment["seconds"] for prefix, segment in self.segments.items()}
+
+    def save(self, path: str) -> None:
+        """
+        Saves the ledger as JSON.
+
+        Args:
+            path (str): The output file.
+        """
+        with open(path, "w") as file:
+            json.dump(self.segments, file, indent=1)
+
+    @classmethod
+    def load(cls, path: str) -> "CostLedger":
+        """
+        Loads a ledger saved by save.
+
+        Args:
+            path (str): The ledger file.
+
+        Returns:
+            CostLedger: The ledger.
+        """
+        ledger = cls()
+        with open(path, "r") as file:
+            ledger.segments = json.load(file)
+        return ledger
+
+
+_ledger = CostLedger()
+
+
+def get_cost_ledger() -> CostLedger:
+    """
+    Returns the ledger of the current run, shared by all processors.
+
+    Returns:
+        CostLedger: The ledger.
+    """
+    return _ledger
@@ -1,19 +1,25 @@
 from multiprocessing import Pool, cpu_count
-import math
 import concurrent.futures
 import pandas as pd
 import numpy as np
 import psutil
 import gc
 import time
-from sklearn import preprocessing
-from sklearn.preprocessing import OneHotEncoder
 from utils import dispersion, share_na, light_divide, reduce_column_names
-from typing import List, Tuple, Any, Set
+from kernels import skew, last_value, trend_slope, longest_positive_streak
+from feature_plan import FeaturePlan, plan_agg_map
+from aggregation_backends import get_backend
+from window_engine import WindowEngine
+from worker_pool import get_worker_pool
+from cost_ledger import get_cost_ledger
+from encoders import CategoryEncoder
+from feature_expressions import FeatureExpressions
+from typing import List, Tuple, Any, Set, Dict, Optional
 
 ### business settings
 common_sense_interest_threshold = 0.085
 days_in_month = 365 / 12
+payment_terms = [6, 12, 18, 24, 30, 36, 42, 48, 54, 60]
 
 aggregation_recipes = {
     "bureau": {
@@ -74,7 +80,9 @@ aggregation_recipes = {
         "days_diff_last_last": ["sum", "mean", "max", "min", dispersion, share_na],
     },
     "installments_payments": {
-        "delay": ["count", "sum", "mean", "max", "min", dispersion],
+        "delay": [
+            "count", "sum", "mean", "max", "min", dispersion, skew, last_value, trend_slope, longest_positive_streak
+        ],
         "lacking_money": ["sum", "mean", "max", "min", dispersion],
         "surplus_money": ["sum", "mean", "max", "min", dispersion],
         "delay_money": ["sum", "mean", "max", "min", dispersion],
@@ -82,6 +90,9 @@ aggregation_recipes = {
         "lacking_money_ratio": ["sum", "mean", "max", "min", dispersion],
         "surplus_money_ratio": ["sum", "mean", "max", "min", dispersion],
     },
+    "installments_payments_nested": {
+        "nested_pred": ["mean", "median", "max", "min", dispersion, last_value, trend_slope],
+    },
     "pos_bal": {
         "MONTHS_BALANCE": ["count", "sum", "mean", "max", "min", dispersion],
         "CNT_INSTALMENT": ["sum", "mean", "max", "min", dispersion],
@@ -130,6 +141,59 @@ aggregation_recipes = {
     },
 }
 
+previous_app_categoricals = [
+    "WEEKDAY_APPR_PROCESS_START",
+    "NAME_CASH_LOAN_PURPOSE",
+    "NAME_PAYMENT_TYPE",
+    "CODE_REJECT_REASON",
+    "NAME_TYPE_SUITE",
+    "NAME_CLIENT_TYPE",
+    "NAME_GOODS_CATEGORY",
+    "NAME_PRODUCT_TYPE",
+    "CHANNEL_TYPE",
+    "NAME_SELLER_INDUSTRY",
+    "NAME_YIELD_GROUP",
+    "PRODUCT_COMBINATION",
+]
+
+### ratio features of the application table, compiled once; shared subexpressions are evaluated once
+main_feature_expressions = {
+    "loan_to_income": "AMT_CREDIT / AMT_INCOME_TOTAL",
+    "loan_to_disp_income": "AMT_CREDIT / (AMT_INCOME_TOTAL / CNT_FAM_MEMBERS)",
+    "loan_to_car": "AMT_CREDIT / OWN_CAR_AGE",
+    "loan_to_good": "AMT_CREDIT / AMT_GOODS_PRICE",
+    "loan_to_age": "AMT_CREDIT / DAYS_BIRTH",
+    "loan_to_score": "AMT_CREDIT / EXT_SOURCE_1",
+    "ann_to_income": "AMT_ANNUITY / AMT_INCOME_TOTAL",
+    "ann_to_disp_income": "AMT_ANNUITY / (AMT_INCOME_TOTAL / CNT_FAM_MEMBERS)",
+    "ann_to_car": "AMT_ANNUITY / OWN_CAR_AGE",
+    "ann_to_good": "AMT_ANNUITY / AMT_GOODS_PRICE",
+    "ann_to_age": "AMT_ANNUITY / DAYS_BIRTH",
+    "ann_to_score": "AMT_ANNUITY / EXT_SOURCE_1",
+    "score1_2": "EXT_SOURCE_1 / EXT_SOURCE_2",
+    "score1_3": "EXT_SOURCE_1 / EXT_SOURCE_3",
+    "score2_3": "EXT_SOURCE_2 / EXT_SOURCE_3",
+    "loan_to_ann": "AMT_CREDIT / AMT_ANNUITY",
+}
+main_expressions = FeatureExpressions(main_feature_expressions)
+
+
+def semi_join(df: pd.DataFrame, ids: Optional[np.ndarray], key: str = "SK_ID_CURR") -> pd.DataFrame:
+    """
+    Keeps only the rows whose key is in the given id set.
+
+    Args:
+        df (pd.DataFrame): The table to filter.
+        ids (Optional[np.ndarray]): The ids to keep. If None, the table is returned unchanged.
+        key (str): The id column.
+
+    Returns:
+        pd.DataFrame: The filtered table.
+    """
+    if ids is None:
+        return df
+    return df[df[key].isin(ids)]
+
 
 class MainData:
     """
@@ -137,7 +201,9 @@ class MainData:
 
     Attributes:
         path_to_data (str): Path to the data directory.
-        sampling (float): Sampling rate for the training data.
+        sampling (float): Sampling rate for the training customers.
+        random_state (Optional[int]): Seed of the customer sampling.
+        customer_ids (np.array): SK_ID_CURR of the sampled train customers and all test customers.
         train_df (pd.DataFrame): DataFrame containing training data.
         test_df (pd.DataFrame): DataFrame containing test data.
         full_df (pd.DataFrame): DataFrame containing combined training and test data.
@@ -145,16 +211,21 @@ class MainData:
         y (np.array): Array containing target values.
         categorical_variables (List[str]): List of names of categorical variables.
         numerical_variables (List[str]): List of names of numerical variables.
+        encoder (Optional[CategoryEncoder]): Encoder of the categorical variables, fitted by fe_main if not given.
     """
-    def __init__(self, path_to_data: str, sampling: float = 1.0) -> None:
+    def __init__(self, path_to_data: str, sampling: float = 1.0, random_state: Optional[int] = None, encoder: Optional[CategoryEncoder] = None) -> None:
         """
         Constructs all the necessary attributes for the MainData object.
 
         Args:
             path_to_data (str): Path to the data directory.
-            sampling (float): Sampling rate for the training data.
+            sampling (float): Sampling rate for the training customers.
+            random_state (Optional[int]): Seed of the customer sampling.
+            encoder (Optional[CategoryEncoder]): Persisted encoder of the categorical variables, so codes are the
+                same as when the models were trained. If None, it is fitted on the data.
         """
         self.path_to_data = path_to_data
+        self.encoder = encoder
         self.train_df = None
         self.test_df = None
         self.full_df = None
@@ -163,19 +234,27 @@ class MainData:
         self.categorical_variables = []
         self.numerical_variables = []
         self.sampling = sampling
+        self.random_state = random_state
+        self.customer_ids = None
         
     def load_main_data(self) -> 'MainData':
         """
-        Loads the main data from CSV files, applies sampling if necessary, 
-        and creates the combined data frame.
+        Loads the main data from CSV files, samples the training customers if necessary, 
+        and creates the combined data frame. Test customers are always kept, so the submission is complete.
 
         Returns:
             MainData: The instance of MainData with loaded data.
         """
         self.train_df = pd.read_csv(self.path_to_data + "application_train.csv")
         if self.sampling < 1:
-            self.train_df = self.train_df.sample(frac=self.sampling)
+            sampled_ids = self.train_df["SK_ID_CURR"].sample(
+                frac=self.sampling, random_state=self.random_state
+            )
+            self.train_df = semi_join(self.train_df, sampled_ids.values)
         self.test_df = pd.read_csv(self.path_to_data + "application_test.csv")
+        self.customer_ids = np.concatenate(
+            [self.train_df["SK_ID_CURR"].values, self.test_df["SK_ID_CURR"].values]
+        )
         self.y = np.array(self.train_df.loc[:, self.target_col]).reshape(
             (self.train_df.shape[0],)
         )
@@ -183,6 +262,15 @@ class MainData:
         self.full_df = pd.concat([self.train_df, self.test_df], axis=0)
         return self
 
+    def get_customer_ids(self) -> np.array:
+        """
+        Gets the customers kept in the main frame, to be pushed down into the child tables.
+
+        Returns:
+            np.array: SK_ID_CURR of the sampled train customers and all test customers.
+        """
+        return self.customer_ids
+
     def set_variable_types(self) -> 'MainData':
         """
         Sets the variable types for categorical and numerical variables.
@@ -324,145 +412,87 @@ class MainData:
         Returns:
             MainData: The instance of MainData with engineered features.
         """
-        lbl = preprocessing.LabelEncoder()
-        for col in self.categorical_variables:
-            self.full_df.loc[:, col] = lbl.fit_transform(self.full_df[col].astype(str))
+        if self.encoder is None:
+            self.encoder = CategoryEncoder().fit(self.full_df, self.categorical_variables)
+        self.encoder.transform(self.full_df, self.categorical_variables)
 
-        self.full_df["loan_to_income"] = light_divide(
-            self.full_df["AMT_CREDIT"], self.full_df["AMT_INCOME_TOTAL"]
-        )
-        self.full_df["loan_to_disp_income"] = light_divide(
-            self.full_df["AMT_CREDIT"],
-            self.full_df["AMT_INCOME_TOTAL"] / self.full_df["CNT_FAM_MEMBERS"],
-        )
-        self.full_df["loan_to_car"] = light_divide(
-            self.full_df["AMT_CREDIT"], self.full_df["OWN_CAR_AGE"]
-        )
-        self.full_df["loan_to_good"] = light_divide(
-            self.full_df["AMT_CREDIT"], self.full_df["AMT_GOODS_PRICE"]
-        )
-        self.full_df["loan_to_age"] = light_divide(
-            self.full_df["AMT_CREDIT"], self.full_df["DAYS_BIRTH"]
-        )
-        self.full_df["loan_to_score"] = light_divide(
-            self.full_df["AMT_CREDIT"], self.full_df["EXT_SOURCE_1"]
-        )
-        self.full_df["ann_to_income"] = light_divide(
-            self.full_df["AMT_ANNUITY"], self.full_df["AMT_INCOME_TOTAL"]
-        )
-        self.full_df["ann_to_disp_income"] = light_divide(
-            self.full_df["AMT_ANNUITY"],
-            self.full_df["AMT_INCOME_TOTAL"] / self.full_df["CNT_FAM_MEMBERS"],
-        )
-        self.full_df["ann_to_car"] = light_divide(
-            self.full_df["AMT_ANNUITY"], self.full_df["OWN_CAR_AGE"]
-        )
-        self.full_df["ann_to_good"] = light_divide(
-            self.full_df["AMT_ANNUITY"], self.full_df["AMT_GOODS_PRICE"]
-        )
-        self.full_df["ann_to_age"] = light_divide(
-            self.full_df["AMT_ANNUITY"], self.full_df["DAYS_BIRTH"]
-        )
-        self.full_df["ann_to_score"] = light_divide(
-            self.full_df["AMT_ANNUITY"], self.full_df["EXT_SOURCE_1"]
-        )
-        self.full_df["score1_2"] = light_divide(
-            self.full_df["EXT_SOURCE_1"], self.full_df["EXT_SOURCE_2"]
-        )
-        self.full_df["score1_3"] = light_divide(
-            self.full_df["EXT_SOURCE_1"], self.full_df["EXT_SOURCE_3"]
-        )
-        self.full_df["score2_3"] = light_divide(
-            self.full_df["EXT_SOURCE_2"], self.full_df["EXT_SOURCE_3"]
-        )
-        self.full_df["loan_to_ann"] = light_divide(
-            self.full_df["AMT_CREDIT"], self.full_df["AMT_ANNUITY"]
-        )
-        self.full_df["app_completeness"] = self.full_df.isnull().sum(axis=1)
+        # count the missing values of the raw columns first, the ratios only add the NaNs of their own block
+        missing = self.full_df.isna().to_numpy().sum(axis=1)
+        ratios = main_expressions.evaluate(self.full_df)
+        ratio_df = pd.DataFrame(ratios, columns=main_expressions.names, index=self.full_df.index)
+        self.full_df = pd.concat([self.full_df.drop(columns=main_expressions.names, errors="ignore"), ratio_df], axis=1)
+        self.full_df["app_completeness"] = missing + np.isnan(ratios).sum(axis=1)
 
         return self
         
-    def generate_interest(self, credit_amt: float, annuity_amt: float) -> List[float]:
+    def generate_interest(self, credit_amt: np.ndarray, annuity_amt: np.ndarray) -> np.ndarray:
         """
-        Generates a table of interest rates for different time periods.
+        Generates a table of interest rates for different time periods, for all applications at once.
     
         Args:
-            credit_amt (float): The credit amount.
-            annuity_amt (float): The annuity amount.
+            credit_amt (np.ndarray): The credit amounts.
+            annuity_amt (np.ndarray): The annuity amounts.
     
         Returns:
-            List[float]: A list of calculated interest rates for predetermined time periods.
-        """
-        interest_table = []
-        for i in [6, 12, 18, 24, 30, 36, 42, 48, 54, 60]:
-            current_interest = ((annuity_amt * i) / credit_amt) ** (1 / (i / 12)) - 1
-            if math.isnan(current_interest) or current_interest == -np.inf:
-                current_interest = -1
-            interest_table.append(current_interest)
-        return interest_table
+            np.ndarray: The (n_applications, n_terms) interest rates for the predetermined time periods.
+        """
+        terms = np.asarray(payment_terms, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            interest_table = (
+                np.power((annuity_amt[:, None] * terms) / credit_amt[:, None], 1 / (terms / 12)) - 1
+            )
+        return np.where(np.isnan(interest_table) | (interest_table == -np.inf), -1, interest_table)
     
-    def generate_interest_stats(self, row: List[float]) -> List[float]:
+    def generate_interest_stats(self, interest_table: np.ndarray) -> np.ndarray:
         """
         Calculates statistical measures (minimum, maximum, mean, median, dispersion, count) 
-        for a given list of interest rates, filtering out values below a common-sense threshold.
+        of the interest rates of every application, filtering out values below a common-sense threshold.
     
         Args:
-            row (List[float]): A list of interest rates.
+            interest_table (np.ndarray): The (n_applications, n_terms) interest rates.
     
         Returns:
-            List[float]: A list containing statistical measures of the interest rates.
-        """
-        row_filtered = [x for x in row if x > common_sense_interest_threshold]
-        row_filtered = np.array(row_filtered)
-
-        if row_filtered.size > 0:
-            min_interest = np.min(row_filtered)
-            max_interest = np.max(row_filtered)
-            mean_interest = np.mean(row_filtered)
-            median_interest = np.median(row_filtered)
-            disp_interest = max_interest - min_interest
-            num_interest = row_filtered.size
-        else:
-            min_interest = (
-                max_interest
-            ) = mean_interest = median_interest = common_sense_interest_threshold
-            disp_interest = num_interest = 0
-        return [
-            min_interest,
-            max_interest,
-            mean_interest,
-            median_interest,
-            disp_interest,
-            num_interest,
-        ]
-
-    def generate_cnt_pmt_stats(self, row: List[float]) -> List[float]:
-        """
-        Generates statistics related to the count of payments above a defined interest threshold.
+            np.ndarray: The (n_applications, 6) statistical measures of the interest rates.
+        """
+        plausible = interest_table > common_sense_interest_threshold
+        num_interest = plausible.sum(axis=1)
+        # applications without a plausible rate get the threshold for every statistic but the count
+        rates = np.where(plausible, interest_table, np.nan)
+        rates[num_interest == 0] = common_sense_interest_threshold
+        with np.errstate(invalid="ignore"):
+            min_interest = np.nanmin(rates, axis=1)
+            max_interest = np.nanmax(rates, axis=1)
+            stats = [
+                min_interest,
+                max_interest,
+                np.nanmean(rates, axis=1),
+                np.nanmedian(rates, axis=1),
+                max_interest - min_interest,
+                num_interest,
+            ]
+        return np.column_stack(stats)
+
+    def generate_cnt_pmt_stats(self, interest_table: np.ndarray) -> np.ndarray:
+        """
+        Generates statistics of the payment counts with a positive interest rate, for every application.
     
         Args:
-            row (List[float]): A list of interest rates.
+            interest_table (np.ndarray): The (n_applications, n_terms) interest rates.
     
         Returns:
-            List[float]: A list of calculated statistics related to the count of payments.
-        """
-        common_sense_interest_threshold = 0  # Define a sensible threshold
-        row_filtered = [
-            (i + 1) * 6
-            for i, x in enumerate(row)
-            if x > common_sense_interest_threshold
-        ]
-        row_filtered = np.array(row_filtered)
-
-        if row_filtered.size > 0:
-            min_cnt = np.min(row_filtered)
-            max_cnt = np.max(row_filtered)
-            mean_cnt = np.mean(row_filtered)
-            median_cnt = np.median(row_filtered)
-            disp_cnt = max_cnt - min_cnt
-        else:
-            min_cnt = max_cnt = mean_cnt = median_cnt = disp_cnt = np.nan
-        return [min_cnt, max_cnt, mean_cnt, median_cnt, disp_cnt]
+            np.ndarray: The (n_applications, 5) statistics of the payment counts, NaN without a positive rate.
+        """
+        positive = interest_table > 0
+        counts = np.where(positive, np.asarray(payment_terms, dtype=np.float64), np.nan)
+        empty = ~positive.any(axis=1)
+        counts[empty] = 0
+        min_cnt = np.nanmin(counts, axis=1)
+        max_cnt = np.nanmax(counts, axis=1)
+        stats = np.column_stack(
+            [min_cnt, max_cnt, np.nanmean(counts, axis=1), np.nanmedian(counts, axis=1), max_cnt - min_cnt]
+        )
+        stats[empty] = np.nan
+        return stats
 
     def append_interest_features(self) -> 'MainData':
         """
@@ -471,19 +501,15 @@ class MainData:
         Returns:
             MainData: The instance of MainData with appended interest rate features.
         """
-        interest_table = self.full_df[["AMT_CREDIT", "AMT_ANNUITY"]].apply(
-            lambda x: self.generate_interest(x["AMT_CREDIT"], x["AMT_ANNUITY"]), axis=1
+        interest_table = self.generate_interest(
+            self.full_df["AMT_CREDIT"].to_numpy(dtype=np.float64),
+            self.full_df["AMT_ANNUITY"].to_numpy(dtype=np.float64),
         )
         interest_table_pd = pd.DataFrame(
-            list(interest_table),
-            columns=[
-                "ir_" + f
-                for f in ["6", "12", "18", "24", "30", "36", "42", "48", "54", "60"]
-            ],
+            interest_table, columns=["ir_" + str(term) for term in payment_terms]
         )
-        ir_stats = interest_table_pd.apply(self.generate_interest_stats, axis=1)
         ir_stats_pd = pd.DataFrame(
-            list(ir_stats),
+            self.generate_interest_stats(interest_table),
             columns=[
                 "min_int",
                 "max_int",
@@ -493,9 +519,8 @@ class MainData:
                 "num_int",
             ],
         )
-        cnt_stats = interest_table_pd.apply(self.generate_cnt_pmt_stats, axis=1)
         cnt_stats_pd = pd.DataFrame(
-            list(cnt_stats),
+            self.generate_cnt_pmt_stats(interest_table),
             columns=["min_cnt", "max_cnt", "mean_cnt", "median_cnt", "disp_cnt"],
         )
 
@@ -589,25 +614,30 @@ class BureauData:
     Attributes:
         path_to_data (str): Path to the data directory.
         num_parallel_processes (int): Number of parallel processes to use for data processing.
-        sampling (float): Sampling rate for the data processing.
+        customer_ids (Optional[np.ndarray]): SK_ID_CURR to keep. If None, all customers are processed.
         bureau_df (pd.DataFrame): DataFrame containing bureau data.
         dataset_name (str): Name of the dataset.
         agg_map (dict): Aggregation mapping for computing statistics.
         feature_dfs_to_merge_with_main_df (list): List to store feature DataFrames to be merged with the main DataFrame.
         credit_types (list): List of different credit types.
         credit_statuses (list): List of credit statuses.
+        feature_plan (Optional[FeaturePlan]): Plan used to skip aggregations of unselected features.
+        backend (Any): Aggregation backend running the recipes.
     """
     
-    def __init__(self, path_to_data: str, num_parallel_processes: int, sampling: float) -> None:
+    def __init__(self, path_to_data: str, num_parallel_processes: int, customer_ids: Optional[np.ndarray] = None, feature_plan: Optional[FeaturePlan] = None, backend: str = "pandas") -> None:
         """
-        Initializes the BureauData object with data path, number of parallel processes, and sampling rate.
+        Initializes the BureauData object with data path, number of parallel processes, and customers to keep.
 
         Args:
             path_to_data (str): Path to the data directory.
             num_parallel_processes (int): Number of parallel processes to use for data processing.
-            sampling (float): Sampling rate for the data processing.
+            customer_ids (Optional[np.ndarray]): SK_ID_CURR to keep. If None, all customers are processed.
+            feature_plan (Optional[FeaturePlan]): Plan used to skip aggregations of unselected features.
+            backend (str): Aggregation backend running the recipes ('pandas' or 'polars').
         """
-        self.bureau_df = pd.read_csv(path_to_data + "bureau.csv")
+        self.path_to_data = path_to_data
+        self.bureau_df = None
         self.dataset_name = "bureau"
         self.agg_map = aggregation_recipes[self.dataset_name]
         self.feature_dfs_to_merge_with_main_df = []
@@ -620,18 +650,28 @@ class BureauData:
             "Microloan",
         ]
         self.credit_statuses = ["Active", "Closed"]
-        self.sampling = sampling
+        self.customer_ids = customer_ids
         self.n_proc = num_parallel_processes
+        self.feature_plan = feature_plan
+        self.backend = get_backend(backend)
+
+    def load_data(self) -> 'BureauData':
+        """
+        Loads the bureau data of the selected customers. Kept out of __init__, so sources can be loaded lazily or prefetched.
+
+        Returns:
+            BureauData: The instance of BureauData with loaded data.
+        """
+        self.bureau_df = semi_join(pd.read_csv(self.path_to_data + "bureau.csv"), self.customer_ids)
+        return self
 
     def preprocess_data(self) -> 'BureauData':
         """
-        Preprocesses the bureau data by applying sampling and generating additional features.
+        Preprocesses the bureau data by generating additional features.
 
         Returns:
             BureauData: The instance of BureauData with preprocessed data.
         """
-        if self.sampling < 1:
-            self.bureau_df = self.bureau_df.sample(frac=self.sampling)
 
         self.bureau_df["missing_info"] = (
             self.bureau_df.isnull().sum(axis=1).astype(np.float32)
@@ -688,46 +728,43 @@ class BureauData:
 
         return self
 
-    def process_segment_of_credit_data(self, credit_type: str, credit_status: str, name_prefix: str) -> pd.DataFrame:
+    def segment_filters(self, credit_type: str, credit_status: str) -> List[Tuple[str, str, Any]]:
         """
-        Processes a segment of credit data based on credit type and status.
+        Builds the filters selecting a segment of credit data based on credit type and status.
 
         Args:
             credit_type (str): The type of credit to filter.
             credit_status (str): The status of the credit to filter.
-            name_prefix (str): The prefix for the column names in the resultant DataFrame.
 
         Returns:
-            pd.DataFrame: A DataFrame with aggregated statistics for the given segment.
+            List[Tuple[str, str, Any]]: (column, operator, value) filters of the segment.
         """
-        filtered = (
-            self.bureau_df
-            if credit_type == "all"
-            else self.bureau_df[self.bureau_df["CREDIT_TYPE"] == credit_type]
-        )
-        filtered = filtered[filtered["CREDIT_ACTIVE"] == credit_status]
-        stats = filtered.groupby("SK_ID_CURR").agg(self.agg_map).astype(np.float32)
-        stats.columns = reduce_column_names(stats, name_prefix)
-        return stats.reset_index()
+        filters = [] if credit_type == "all" else [("CREDIT_TYPE", "==", credit_type)]
+        return filters + [("CREDIT_ACTIVE", "==", credit_status)]
 
     def compute_features_concurrently(self) -> 'BureauData':
         """
-        Computes features concurrently for different segments of credit data.
+        Computes features concurrently for different segments of credit data on the shared worker pool.
 
         Returns:
             BureauData: The instance of BureauData with computed features.
         """
         futures = []
-        with concurrent.futures.ProcessPoolExecutor(
-            max_workers=self.n_proc
-        ) as executor:
+        pool = get_worker_pool(self.n_proc)
+        with pool.shared_frame(self.bureau_df) as frame:
             for credit_status in self.credit_statuses:
                 for credit_type in self.credit_types:
-                    future = executor.submit(
-                        self.process_segment_of_credit_data,
-                        credit_status,
-                        credit_type,
-                        f"{self.dataset_name}_{credit_status}_{credit_type}",
+                    name_prefix = f"{self.dataset_name}_{credit_status}_{credit_type}"
+                    agg_map = plan_agg_map(self.agg_map, name_prefix, self.feature_plan)
+                    if not agg_map:
+                        continue
+                    future = pool.submit(
+                        "aggregate_segment",
+                        frame,
+                        filters=self.segment_filters(credit_type, credit_status),
+                        agg_map=agg_map,
+                        name_prefix=name_prefix,
+                        backend=self.backend.name,
                     )
                     futures.append(future)
             for future in concurrent.futures.as_completed(futures):
@@ -751,6 +788,8 @@ class BureauData:
         Returns:
             List[pd.DataFrame]: A list of DataFrames with computed features for merging with the main DataFrame.
         """
+        if self.bureau_df is None:
+            self.load_data()
         self.preprocess_data().compute_features_concurrently()
         gc.collect()
         return self.feature_dfs_to_merge_with_main_df
@@ -762,53 +801,61 @@ class PreviousApplicationData:
     Attributes:
         path_to_data (str): Path to the data directory.
         num_parallel_processes (int): Number of parallel processes for data processing.
-        sampling (float): Sampling rate for the data processing.
+        customer_ids (Optional[np.ndarray]): SK_ID_CURR to keep. If None, all customers are processed.
         pr_app (pd.DataFrame): DataFrame containing previous application data.
         dataset_name (str): Name of the dataset.
         agg_map (dict): Aggregation mapping for computing statistics.
         feature_dfs_to_merge_with_main_df (list): List of feature DataFrames to be merged with the main DataFrame.
         categorical_variables (list): List of names of categorical variables.
+        feature_plan (Optional[FeaturePlan]): Plan used to skip aggregations of unselected features.
+        encoder (Optional[CategoryEncoder]): Encoder of the categorical variables, with fixed categories for encodings
+            consistent across data partitions and runs; fitted by encode_categoricals if not given.
+        backend (Any): Aggregation backend running the recipes.
     """
-    def __init__(self, path_to_data: str, num_parallel_processes: int, sampling: float = 1.0) -> None:
+    def __init__(self, path_to_data: str, num_parallel_processes: int, customer_ids: Optional[np.ndarray] = None, feature_plan: Optional[FeaturePlan] = None, category_vocab: Optional[Dict[str, List[str]]] = None, backend: str = "pandas") -> None:
         """
-        Initializes the PreviousApplicationData object with data path, number of parallel processes, and sampling rate.
+        Initializes the PreviousApplicationData object with data path, number of parallel processes, and customers to keep.
 
         Args:
             path_to_data (str): Path to the data directory.
             num_parallel_processes (int): Number of parallel processes to use for data processing.
-            sampling (float): Sampling rate for the data processing.
+            customer_ids (Optional[np.ndarray]): SK_ID_CURR to keep. If None, all customers are processed.
+            feature_plan (Optional[FeaturePlan]): Plan used to skip aggregations of unselected features.
+            category_vocab (Optional[Dict[str, List[str]]]): Sorted categories (as strings) per categorical variable. If None, they are fitted on the data.
+            backend (str): Aggregation backend running the recipes ('pandas' or 'polars').
         """
-        self.pr_app = pd.read_csv(path_to_data + "previous_application.csv")
+        self.path_to_data = path_to_data
+        self.pr_app = None
         self.dataset_name = "previous_app"
         self.agg_map = aggregation_recipes[self.dataset_name]
 
         self.feature_dfs_to_merge_with_main_df = []
-        self.categorical_variables = [
-            "WEEKDAY_APPR_PROCESS_START",
-            "NAME_CASH_LOAN_PURPOSE",
-            "NAME_PAYMENT_TYPE",
-            "CODE_REJECT_REASON",
-            "NAME_TYPE_SUITE",
-            "NAME_CLIENT_TYPE",
-            "NAME_GOODS_CATEGORY",
-            "NAME_PRODUCT_TYPE",
-            "CHANNEL_TYPE",
-            "NAME_SELLER_INDUSTRY",
-            "NAME_YIELD_GROUP",
-            "PRODUCT_COMBINATION",
-        ]
-        self.sampling = sampling
+        self.categorical_variables = list(previous_app_categoricals)
+        self.customer_ids = customer_ids
         self.n_proc = num_parallel_processes
+        self.feature_plan = feature_plan
+        self.backend = get_backend(backend)
+        self.encoder = CategoryEncoder(category_vocab) if category_vocab is not None else None
+
+    def load_data(self) -> 'PreviousApplicationData':
+        """
+        Loads the previous applications of the selected customers. Kept out of __init__, so sources can be loaded lazily or prefetched.
+
+        Returns:
+            PreviousApplicationData: The instance of PreviousApplicationData with loaded data.
+        """
+        self.pr_app = semi_join(
+            pd.read_csv(self.path_to_data + "previous_application.csv"), self.customer_ids
+        )
+        return self
 
     def preprocess_data(self) -> 'PreviousApplicationData':
         """
-        Preprocesses the previous application data by applying sampling and generating additional features.
+        Preprocesses the previous application data by generating additional features.
 
         Returns:
             PreviousApplicationData: The instance of PreviousApplicationData with preprocessed data.
         """
-        if self.sampling < 1:
-            self.pr_app = self.pr_app.sample(frac=self.sampling)
 
         self.pr_app["is_x_sell"] = (
             self.pr_app["PRODUCT_COMBINATION"].str.contains("X-Sell").fillna(0)
@@ -854,17 +901,12 @@ class PreviousApplicationData:
         Returns:
             PreviousApplicationData: The instance of PreviousApplicationData with encoded categorical variables.
         """
-        lbl = preprocessing.LabelEncoder()
-        for col in self.categorical_variables:
-            self.pr_app[col] = lbl.fit_transform(self.pr_app[col].astype(str))
-        enc = preprocessing.OneHotEncoder()
-        one_hot_pr_app = enc.fit_transform(
-            self.pr_app.loc[:, self.categorical_variables]
+        if self.encoder is None:
+            self.encoder = CategoryEncoder().fit(self.pr_app, self.categorical_variables)
+        self.encoder.transform(self.pr_app, self.categorical_variables)
+        self.feature_dfs_to_merge_with_main_df.append(
+            self.encoder.one_hot_counts(self.pr_app, self.categorical_variables)
         )
-        dense = pd.DataFrame(one_hot_pr_app.todense())
-        dense["SK_ID_CURR"] = self.pr_app["SK_ID_CURR"]
-        dense = dense.groupby("SK_ID_CURR").sum().reset_index()
-        self.feature_dfs_to_merge_with_main_df.append(dense)
 
         return self
 
@@ -875,101 +917,58 @@ class PreviousApplicationData:
         Returns:
             PreviousApplicationData: The instance of PreviousApplicationData with computed cross-selling features.
         """
-        agg_map = {"is_x_sell": ["sum"]}
+        windows, agg_maps = {}, {}
         for lookback_window in [-30, -360, -np.inf]:
-            cur_term_stats = (
-                self.pr_app[self.pr_app["DAYS_DECISION"] > lookback_window]
-                .groupby("SK_ID_CURR")
-                .agg(agg_map)
-                .astype(np.float32)
-            )
             name_prefix = f"{self.dataset_name}_xsell_in_{str(lookback_window)}"
+            agg_map = plan_agg_map({"is_x_sell": ["sum"]}, name_prefix, self.feature_plan)
+            if not agg_map:
+                continue
+            windows[name_prefix] = lookback_window
+            agg_maps[name_prefix] = agg_map
+        if not agg_maps:
+            return self
+
+        with get_cost_ledger().measure(agg_maps):
+            engine = WindowEngine(self.pr_app, "SK_ID_CURR", "DAYS_DECISION", self.backend)
+            window_stats = engine.aggregate_windows(windows, agg_maps)
+        for name_prefix, cur_term_stats in window_stats.items():
+            cur_term_stats = cur_term_stats.astype(np.float32)
             cur_term_stats.columns = reduce_column_names(cur_term_stats, name_prefix)
             self.feature_dfs_to_merge_with_main_df.append(cur_term_stats.reset_index())
 
         return self
 
-    def compute_active_closed_features(self, active_flag: bool, name_prefix: str) -> pd.DataFrame:
-        """
-        Computes features for either active or closed previous applications.
-
-        Args:
-            active_flag (bool): Flag indicating whether to compute for active or closed applications.
-            name_prefix (str): Prefix for the column names in the resultant DataFrame.
-
-        Returns:
-            pd.DataFrame: A DataFrame with aggregated statistics for the given segment.
+    def compute_segment_features_parallel(self) -> 'PreviousApplicationData':
         """
-        filtered = self.pr_app[self.pr_app["active"] == active_flag]
-        grouped = filtered.groupby("SK_ID_CURR").agg(self.agg_map).astype(np.float32)
-        grouped.columns = reduce_column_names(grouped, name_prefix)
-        return grouped.reset_index()
-
-    def compute_active_closed_features_parallel(self) -> 'PreviousApplicationData':
-        """
-        Computes features for active and closed previous applications in parallel.
+        Computes features for active and closed previous applications and for approved and refused ones in parallel
+        on the shared worker pool.
 
         Returns:
             PreviousApplicationData: The instance of PreviousApplicationData with computed features.
         """
-        with concurrent.futures.ProcessPoolExecutor(
-            max_workers=self.n_proc
-        ) as executor:
-            futures = {
-                executor.submit(
-                    self.compute_active_closed_features,
-                    True,
-                    f"{self.dataset_name}_active",
-                ),
-                executor.submit(
-                    self.compute_active_closed_features,
-                    False,
-                    f"{self.dataset_name}_closed",
-                ),
-            }
-            for future in concurrent.futures.as_completed(futures):
-                result = future.result()
-                self.feature_dfs_to_merge_with_main_df.append(result)
-
-        return self
-
-    def compute_status_features(self, status: str) -> pd.DataFrame:
-        """
-        Computes features based on the status of the previous application.
-
-        Args:
-            status (str): The status of the previous application to filter by.
-
-        Returns:
-            pd.DataFrame: A DataFrame with aggregated statistics for applications with the specified status.
-        """
-        agg_map = aggregation_recipes["previous_app"]
-        status_stats = (
-            self.pr_app[self.pr_app["NAME_CONTRACT_STATUS"] == status]
-            .groupby("SK_ID_CURR")
-            .agg(agg_map)
-            .astype(np.float32)
-        )
-        name_prefix = f"{self.dataset_name}_status_{status}"
-        status_stats.columns = reduce_column_names(status_stats, name_prefix)
-
-        return status_stats.reset_index()
-
-    def compute_status_features_parallel(self) -> 'PreviousApplicationData':
-        """
-        Computes features for different statuses of previous applications in parallel.
-
-        Returns:
-            PreviousApplicationData: The instance of PreviousApplicationData with computed status features.
-        """
-        statuses = ["Approved", "Refused"]
-        with concurrent.futures.ProcessPoolExecutor(
-            max_workers=self.n_proc
-        ) as executor:
-            futures = {
-                executor.submit(self.compute_status_features, status)
-                for status in statuses
-            }
+        segments = [
+            (f"{self.dataset_name}_active", [("active", "==", True)]),
+            (f"{self.dataset_name}_closed", [("active", "==", False)]),
+        ] + [
+            (f"{self.dataset_name}_status_{status}", [("NAME_CONTRACT_STATUS", "==", status)])
+            for status in ["Approved", "Refused"]
+        ]
+        futures = set()
+        pool = get_worker_pool(self.n_proc)
+        with pool.shared_frame(self.pr_app) as frame:
+            for name_prefix, filters in segments:
+                agg_map = plan_agg_map(self.agg_map, name_prefix, self.feature_plan)
+                if agg_map:
+                    futures.add(
+                        pool.submit(
+                            "aggregate_segment",
+                            frame,
+                            filters=filters,
+                            agg_map=agg_map,
+                            name_prefix=name_prefix,
+                            backend=self.backend.name,
+                        )
+                    )
             for future in concurrent.futures.as_completed(futures):
                 result = future.result()
                 self.feature_dfs_to_merge_with_main_df.append(result)
@@ -983,7 +982,9 @@ class PreviousApplicationData:
         Returns:
             List[pd.DataFrame]: A list of DataFrames with computed features for merging with the main DataFrame.
         """
-        self.preprocess_data().encode_categoricals().compute_xsell_features().compute_status_features_parallel().compute_active_closed_features_parallel()
+        if self.pr_app is None:
+            self.load_data()
+        self.preprocess_data().encode_categoricals().compute_xsell_features().compute_segment_features_parallel()
         gc.collect()
 
         return self.feature_dfs_to_merge_with_main_df
@@ -996,7 +997,7 @@ class InstallmentsPaymentsData:
     Attributes:
         path_to_data (str): Path to the data directory.
         num_parallel_processes (int): Number of parallel processes for data processing.
-        sampling (float): Sampling rate for the data processing.
+        customer_ids (Optional[np.ndarray]): SK_ID_CURR to keep. If None, all customers are processed.
         ip (pd.DataFrame): DataFrame containing installment payments data.
         feature_dfs_to_merge_with_main_df (list): List of feature DataFrames to be merged with the main DataFrame.
         days_in_month (int): Number of days in a month used for calculations.
@@ -1004,20 +1005,23 @@ class InstallmentsPaymentsData:
         agg_map (dict): Aggregation mapping for computing statistics.
         lb_window_prefix_map (dict): Mapping of lookback windows to their prefixes.
         version_filters (dict): Filters for different versions of installment payments.
+        feature_plan (Optional[FeaturePlan]): Plan used to skip aggregations of unselected features.
+        backend (Any): Aggregation backend running the recipes.
     """
     
-    def __init__(self, path_to_data: str, num_parallel_processes: int, sampling: float = 1) -> None:
+    def __init__(self, path_to_data: str, num_parallel_processes: int, customer_ids: Optional[np.ndarray] = None, feature_plan: Optional[FeaturePlan] = None, backend: str = "pandas") -> None:
         """
-        Initializes the InstallmentsPaymentsData object with data path, number of parallel processes, and sampling rate.
+        Initializes the InstallmentsPaymentsData object with data path, number of parallel processes, and customers to keep.
 
         Args:
             path_to_data (str): Path to the data directory.
             num_parallel_processes (int): Number of parallel processes to use for data processing.
-            sampling (float): Sampling rate for the data processing.
+            customer_ids (Optional[np.ndarray]): SK_ID_CURR to keep. If None, all customers are processed.
+            feature_plan (Optional[FeaturePlan]): Plan used to skip aggregations of unselected features.
+            backend (str): Aggregation backend running the recipes ('pandas' or 'polars').
         """
-        self.ip = pd.read_csv(path_to_data + "installments_payments.csv").sort_values(
-            ["SK_ID_PREV", "DAYS_INSTALMENT"]
-        )
+        self.path_to_data = path_to_data
+        self.ip = None
         self.feature_dfs_to_merge_with_main_df = []
         self.days_in_month = days_in_month
         self.dataset_name = "installments_payments"
@@ -1037,18 +1041,30 @@ class InstallmentsPaymentsData:
             "<3": "first_2",
             "<6": "first_5",
         }
-        self.sampling = sampling
+        self.customer_ids = customer_ids
         self.n_proc = num_parallel_processes
+        self.feature_plan = feature_plan
+        self.backend = get_backend(backend)
+
+    def load_data(self) -> 'InstallmentsPaymentsData':
+        """
+        Loads the installment payments of the selected customers. Kept out of __init__, so sources can be loaded lazily or prefetched.
+
+        Returns:
+            InstallmentsPaymentsData: The instance of InstallmentsPaymentsData with loaded data.
+        """
+        self.ip = semi_join(
+            pd.read_csv(self.path_to_data + "installments_payments.csv"), self.customer_ids
+        ).sort_values(["SK_ID_PREV", "DAYS_INSTALMENT"])
+        return self
 
     def preprocess_data(self) -> 'InstallmentsPaymentsData':
         """
-        Preprocesses the installment payments data by applying sampling and generating additional features.
+        Preprocesses the installment payments data by generating additional features.
 
         Returns:
             InstallmentsPaymentsData: The instance of InstallmentsPaymentsData with preprocessed data.
         """
-        if self.sampling < 1:
-            self.ip = self.ip.sample(frac=self.sampling)
         self.ip["delay"] = -(self.ip["DAYS_INSTALMENT"] - self.ip["DAYS_ENTRY_PAYMENT"])
         self.ip["lacking_money"] = np.maximum(
             self.ip["AMT_INSTALMENT"] - self.ip["AMT_PAYMENT"], 0
@@ -1076,87 +1092,66 @@ class InstallmentsPaymentsData:
 
         return self
 
-    def compute_features_for_group(self, group_df: pd.DataFrame, name_prefix: str) -> pd.DataFrame:
+    def version_filter_conditions(self, version_filter: Any) -> List[Tuple[str, str, Any]]:
         """
-        Computes features for a given group of installment payment data.
+        Translates a version filter to the filters selecting the matching installment payments.
 
         Args:
-            group_df (pd.DataFrame): The DataFrame representing a group of installment payment data.
-            name_prefix (str): Prefix for the column names in the resultant DataFrame.
-
-        Returns:
-            pd.DataFrame: A DataFrame with aggregated statistics for the given group.
-        """
-        stats = group_df.groupby("SK_ID_CURR").agg(self.agg_map).astype(np.float32)
-        stats.columns = reduce_column_names(stats, name_prefix)
-        return stats.reset_index()
-
-    def compute_features_for_lbwindow_and_version(
-        self, lookback_window: float, version_filter: Any, prefix: str
-    ) -> pd.DataFrame:
-        """
-        Computes features for installment payments based on a specified lookback window and version filter.
-
-        Args:
-            lookback_window (float): The lookback window for filtering the data.
             version_filter (Any): The filter for installment payment versions.
-            prefix (str): Prefix for the column names in the resultant DataFrame.
 
         Returns:
-            pd.DataFrame: A DataFrame with aggregated statistics based on the given filters.
-        """
-        # Filter based on lookback window
-        filtered = (
-            self.ip
-            if lookback_window == -np.inf
-            else self.ip[self.ip.DAYS_INSTALMENT > lookback_window]
-        )
-
-        # Apply version filters
-        if version_filter is not None:
-            if isinstance(version_filter, list):
-                filtered = filtered[
-                    filtered["NUM_INSTALMENT_VERSION"].isin(version_filter)
-                ]
-            elif version_filter.startswith(">="):
-                version = int(version_filter[2:])
-                filtered = filtered[filtered["NUM_INSTALMENT_VERSION"] >= version]
-            elif version_filter.startswith("<"):
-                version = int(version_filter[1:])
-                filtered = filtered[filtered["NUM_INSTALMENT_VERSION"] < version]
-            else:
-                version = int(version_filter)
-                filtered = filtered[filtered["NUM_INSTALMENT_VERSION"] == version]
-
-        # Compute features
-        return self.compute_features_for_group(filtered, prefix)
+            List[Tuple[str, str, Any]]: (column, operator, value) filters.
+        """
+        if version_filter is None:
+            return []
+        if isinstance(version_filter, list):
+            return [("NUM_INSTALMENT_VERSION", "isin", version_filter)]
+        if version_filter.startswith(">="):
+            return [("NUM_INSTALMENT_VERSION", ">=", int(version_filter[2:]))]
+        if version_filter.startswith("<"):
+            return [("NUM_INSTALMENT_VERSION", "<", int(version_filter[1:]))]
+        return [("NUM_INSTALMENT_VERSION", "==", int(version_filter))]
 
     def compute_features_concurrently(self) -> 'InstallmentsPaymentsData':
         """
-        Computes features concurrently for different combinations of lookback windows and version filters.
+        Computes features concurrently for the version filters on the shared worker pool, each task evaluating
+        all lookback windows at once.
 
         Returns:
             InstallmentsPaymentsData: The instance of InstallmentsPaymentsData with computed features.
         """
         futures = []
-        with concurrent.futures.ProcessPoolExecutor(
-            max_workers=self.n_proc
-        ) as executor:
-            for (
-                lookback_window,
-                lookback_window_prefix,
-            ) in self.lb_window_prefix_map.items():
-                for version_filter, version_prefix in self.version_filters.items():
-                    future = executor.submit(
-                        self.compute_features_for_lbwindow_and_version,
-                        lookback_window,
-                        version_filter,
-                        f"{self.dataset_name}_{lookback_window_prefix}_{version_prefix}",
-                    )
-                    futures.append(future)
+        pool = get_worker_pool(self.n_proc)
+        with pool.shared_frame(self.ip) as frame:
+            for version_filter, version_prefix in self.version_filters.items():
+                windows, agg_maps = {}, {}
+                for (
+                    lookback_window,
+                    lookback_window_prefix,
+                ) in self.lb_window_prefix_map.items():
+                    prefix = f"{self.dataset_name}_{lookback_window_prefix}_{version_prefix}"
+                    agg_map = plan_agg_map(self.agg_map, prefix, self.feature_plan)
+                    if not agg_map:
+                        continue
+                    windows[prefix] = None if lookback_window == -np.inf else lookback_window
+                    agg_maps[prefix] = agg_map
+                if not agg_maps:
+                    continue
+                future = pool.submit(
+                    "aggregate_windows",
+                    frame,
+                    filters=self.version_filter_conditions(version_filter),
+                    time_col="DAYS_INSTALMENT",
+                    windows=windows,
+                    agg_maps=agg_maps,
+                    name_prefixes={prefix: prefix for prefix in windows},
+                    backend=self.backend.name,
+                    order_by="DAYS_INSTALMENT",
+                )
+                futures.append(future)
 
             for future in concurrent.futures.as_completed(futures):
-                self.feature_dfs_to_merge_with_main_df.append(future.result())
+                self.feature_dfs_to_merge_with_main_df.extend(future.result())
 
         return self
 
@@ -1167,6 +1162,8 @@ class InstallmentsPaymentsData:
         Returns:
             List[pd.DataFrame]: A list of DataFrames with computed features for merging with the main DataFrame.
         """
+        if self.ip is None:
+            self.load_data()
         self.preprocess_data().compute_features_concurrently()
         gc.collect()
 
@@ -1180,23 +1177,28 @@ class POSCashBalanceData:
     Attributes:
         path_to_data (str): Path to the data directory.
         num_parallel_processes (int): Number of parallel processes for data processing.
-        sampling (float): Sampling rate for the data processing.
+        customer_ids (Optional[np.ndarray]): SK_ID_CURR to keep. If None, all customers are processed.
         pos_bal (pd.DataFrame): DataFrame containing POS cash balance data.
         feature_dfs_to_merge_with_main_df (list): List of feature DataFrames to be merged with the main DataFrame.
         dataset_name (str): Name of the dataset.
         agg_map (dict): Aggregation mapping for computing statistics.
         filter_conditions (set): Set of conditions for filtering the data.
+        feature_plan (Optional[FeaturePlan]): Plan used to skip aggregations of unselected features.
+        backend (Any): Aggregation backend running the recipes.
     """
-    def __init__(self, path_to_data: str, num_parallel_processes: int, sampling: float = 1) -> None:
+    def __init__(self, path_to_data: str, num_parallel_processes: int, customer_ids: Optional[np.ndarray] = None, feature_plan: Optional[FeaturePlan] = None, backend: str = "pandas") -> None:
         """
-        Initializes the POSCashBalanceData object with data path, number of parallel processes, and sampling rate.
+        Initializes the POSCashBalanceData object with data path, number of parallel processes, and customers to keep.
 
         Args:
             path_to_data (str): Path to the data directory.
             num_parallel_processes (int): Number of parallel processes to use for data processing.
-            sampling (float): Sampling rate for the data processing.
+            customer_ids (Optional[np.ndarray]): SK_ID_CURR to keep. If None, all customers are processed.
+            feature_plan (Optional[FeaturePlan]): Plan used to skip aggregations of unselected features.
+            backend (str): Aggregation backend running the recipes ('pandas' or 'polars').
         """
-        self.pos_bal = pd.read_csv(path_to_data + "POS_CASH_balance.csv")
+        self.path_to_data = path_to_data
+        self.pos_bal = None
         self.feature_dfs_to_merge_with_main_df = []
         self.dataset_name = "pos_bal"
         self.agg_map = aggregation_recipes[self.dataset_name]
@@ -1209,74 +1211,94 @@ class POSCashBalanceData:
             "recent_6",
             "recent_12",
         }
-        self.sampling = sampling
+        self.customer_ids = customer_ids
         self.n_proc = num_parallel_processes
+        self.feature_plan = feature_plan
+        self.backend = get_backend(backend)
+
+    def load_data(self) -> 'POSCashBalanceData':
+        """
+        Loads the POS cash balances of the selected customers. Kept out of __init__, so sources can be loaded lazily or prefetched.
+
+        Returns:
+            POSCashBalanceData: The instance of POSCashBalanceData with loaded data.
+        """
+        self.pos_bal = semi_join(pd.read_csv(self.path_to_data + "POS_CASH_balance.csv"), self.customer_ids)
+        return self
 
     def preprocess_data(self) -> 'POSCashBalanceData':
         """
-        Preprocesses the POS cash balance data by applying sampling and generating additional features.
+        Preprocesses the POS cash balance data by generating additional features.
 
         Returns:
             POSCashBalanceData: The instance of POSCashBalanceData with preprocessed data.
         """
-        if self.sampling < 1:
-            self.pos_bal = self.pos_bal.sample(frac=self.sampling)
 
         self.pos_bal["no_inst"] = (
             self.pos_bal["CNT_INSTALMENT"] - self.pos_bal["CNT_INSTALMENT_FUTURE"]
         )
         return self
 
-    def compute_features_for_group(self, group_df: pd.DataFrame, prefix: str) -> pd.DataFrame:
-        """
-        Computes features for a given group of POS cash balance data.
-
-        Args:
-            group_df (pd.DataFrame): The DataFrame representing a group of POS cash balance data.
-            prefix (str): Prefix for the column names in the resultant DataFrame.
-
-        Returns:
-            pd.DataFrame: A DataFrame with aggregated statistics for the given group.
-        """
-        stats = group_df.groupby("SK_ID_CURR").agg(self.agg_map)
-        stats.columns = reduce_column_names(stats, self.dataset_name + prefix)
-        return stats.reset_index()
-
     def compute_features_concurrently(self, filter_conditions: Set[str]) -> 'POSCashBalanceData':
         """
         Computes features concurrently for different filter conditions of POS cash balance data.
 
+        The recent_* windows (and all) are nested on MONTHS_BALANCE and the first_* windows on no_inst, so each
+        family is evaluated in one pass by a task of the shared worker pool.
+
         Args:
             filter_conditions (Set[str]): A set of conditions for filtering the data.
 
         Returns:
             POSCashBalanceData: The instance of POSCashBalanceData with computed features.
         """
-        with concurrent.futures.ProcessPoolExecutor(
-            max_workers=self.n_proc
-        ) as executor:
-            futures = []
-            for condition in self.filter_conditions:
-                if condition == "all":
-                    filtered = self.pos_bal
-                elif "recent" in condition:
-                    condition_val = -int(condition.replace("recent_", ""))
-                    filtered = self.pos_bal[
-                        self.pos_bal["MONTHS_BALANCE"] > condition_val
-                    ]
-                else:
-                    condition_val = int(condition.replace("first_", ""))
-                    filtered = self.pos_bal[self.pos_bal["no_inst"] < condition_val]
-
-                future = executor.submit(
-                    self.compute_features_for_group,
-                    filtered,
-                    f"{self.dataset_name}_{condition}",
+        families = {
+            ("MONTHS_BALANCE", False): ({}, {}),
+            ("no_inst", True): ({}, {}),
+        }
+        for condition in sorted(filter_conditions):
+            agg_map = plan_agg_map(
+                self.agg_map,
+                f"{self.dataset_name}{self.dataset_name}_{condition}",
+                self.feature_plan,
+            )
+            if not agg_map:
+                continue
+            if condition == "all":
+                family, bound = ("MONTHS_BALANCE", False), None
+            elif "recent" in condition:
+                family, bound = ("MONTHS_BALANCE", False), -int(condition.replace("recent_", ""))
+            else:
+                family, bound = ("no_inst", True), int(condition.replace("first_", ""))
+            windows, agg_maps = families[family]
+            windows[condition] = bound
+            agg_maps[condition] = agg_map
+
+        futures = []
+        pool = get_worker_pool(self.n_proc)
+        with pool.shared_frame(self.pos_bal) as frame:
+            for (time_col, below), (windows, agg_maps) in families.items():
+                if not agg_maps:
+                    continue
+                future = pool.submit(
+                    "aggregate_windows",
+                    frame,
+                    filters=[],
+                    time_col=time_col,
+                    windows=windows,
+                    agg_maps=agg_maps,
+                    name_prefixes={
+                        condition: self.dataset_name + f"{self.dataset_name}_{condition}"
+                        for condition in windows
+                    },
+                    backend=self.backend.name,
+                    below=below,
+                    float32=False,
                 )
                 futures.append(future)
 
             for future in concurrent.futures.as_completed(futures):
-                self.feature_dfs_to_merge_with_main_df.append(future.result())
+                self.feature_dfs_to_merge_with_main_df.extend(future.result())
 
         return self
 
@@ -1301,6 +1323,8 @@ class POSCashBalanceData:
         Returns:
             List[pd.DataFrame]: A list of DataFrames with computed features for merging with the main DataFrame.
         """
+        if self.pos_bal is None:
+            self.load_data()
         self.preprocess_data()
         self.compute_features_concurrently(self.filter_conditions)
         gc.collect()
@@ -1308,18 +1332,23 @@ class POSCashBalanceData:
         return self.feature_dfs_to_merge_with_main_df
 
 class CreditCardBalanceData:
-    def __init__(self, path_to_data, num_parallel_processes, sampling=1):
-        self.cc_bal = pd.read_csv(path_to_data + "credit_card_balance.csv")
+    def __init__(self, path_to_data, num_parallel_processes, customer_ids=None, feature_plan=None, backend="pandas"):
+        self.path_to_data = path_to_data
+        self.cc_bal = None
         self.feature_dfs_to_merge_with_main_df = []
         self.dataset_name = "cc_bal"
         self.agg_map = aggregation_recipes[self.dataset_name]
         self.filter_conditions = {"all", "recent_1", "recent_6", "recent_12"}
-        self.sampling = sampling
+        self.customer_ids = customer_ids
         self.n_proc = num_parallel_processes
+        self.feature_plan = feature_plan
+        self.backend = get_backend(backend)
+
+    def load_data(self):
+        self.cc_bal = semi_join(pd.read_csv(self.path_to_data + "credit_card_balance.csv"), self.customer_ids)
+        return self
 
     def preprocess_data(self):
-        if self.sampling < 1:
-            self.cc_bal = self.cc_bal.sample(frac=self.sampling)
 
         self.cc_bal["count_missing"] = self.cc_bal.isnull().sum(axis=1)
         self.cc_bal["bal_to_limit"] = light_divide(
@@ -1353,29 +1382,35 @@ class CreditCardBalanceData:
 
         return self
 
-    def compute_features_for_group(self, group_df, prefix):
-        stats = group_df.groupby("SK_ID_CURR").agg(self.agg_map).astype(np.float32)
-        stats.columns = reduce_column_names(stats, f"{self.dataset_name}_{prefix}")
-        return stats.reset_index()
+    def compute_features_for_windows(self, windows, agg_maps):
+        prefixed_agg_maps = {f"{self.dataset_name}_{condition}": agg_map for condition, agg_map in agg_maps.items()}
+        with get_cost_ledger().measure(prefixed_agg_maps):
+            engine = WindowEngine(self.cc_bal, "SK_ID_CURR", "MONTHS_BALANCE", self.backend)
+            window_stats = engine.aggregate_windows(windows, agg_maps)
+        feature_dfs = []
+        for condition, stats in window_stats.items():
+            stats = stats.astype(np.float32)
+            stats.columns = reduce_column_names(stats, f"{self.dataset_name}_{condition}")
+            feature_dfs.append(stats.reset_index())
+        return feature_dfs
 
     def compute_features_concurrently(self):
-        with concurrent.futures.ProcessPoolExecutor(
-            max_workers=self.n_proc
-        ) as executor:
-            futures = []
-            for condition in self.filter_conditions:
-                filtered = self.cc_bal
-                if "recent" in condition:
-                    months = int(condition.split("_")[1])
-                    filtered = self.cc_bal[self.cc_bal["MONTHS_BALANCE"] > -months]
-
-                future = executor.submit(
-                    self.compute_features_for_group, filtered, condition
-                )
-                futures.append(future)
-
-            for future in concurrent.futures.as_completed(futures):
-                self.feature_dfs_to_merge_with_main_df.append(future.result())
+        # the recent_* windows are nested, so they are all evaluated in one pass of the window engine
+        windows, agg_maps = {}, {}
+        for condition in sorted(self.filter_conditions):
+            agg_map = plan_agg_map(
+                self.agg_map, f"{self.dataset_name}_{condition}", self.feature_plan
+            )
+            if not agg_map:
+                continue
+            windows[condition] = (
+                -int(condition.split("_")[1]) if "recent" in condition else None
+            )
+            agg_maps[condition] = agg_map
+        if agg_maps:
+            self.feature_dfs_to_merge_with_main_df.extend(
+                self.compute_features_for_windows(windows, agg_maps)
+            )
 
         return self
 
@@ -1385,6 +1420,8 @@ class CreditCardBalanceData:
         return main_df
 
     def process(self):
+        if self.cc_bal is None:
+            self.load_data()
         self.preprocess_data().compute_features_concurrently()
         gc.collect()
         return self.feature_dfs_to_merge_with_main_df
@@ -1399,94 +1436,132 @@ class BureauBalanceData:
         path_to_data (str): Path to the data directory.
         bureau_id_map (pd.DataFrame): DataFrame mapping bureau IDs to current IDs.
         num_parallel_processes (int): Number of parallel processes for data processing.
-        sampling (float): Sampling rate for the data processing.
+        customer_ids (Optional[np.ndarray]): SK_ID_CURR to keep. If None, all customers are processed.
         buro_balance (pd.DataFrame): DataFrame containing bureau balance data.
         dataset_name (str): Name of the dataset.
         agg_map (dict): Aggregation mapping for computing statistics.
         feature_dfs_to_merge_with_main_df (list): List of feature DataFrames to be merged with the main DataFrame.
         time_windows (dict): Dictionary of time windows for filtering the data.
+        feature_plan (Optional[FeaturePlan]): Plan used to skip aggregations of unselected features.
+        backend (Any): Aggregation backend running the recipes.
     """
     
-    def __init__(self, path_to_data: str, bureau_id_map: pd.DataFrame, num_parallel_processes: int, sampling: float = 1) -> None:
+    def __init__(self, path_to_data: str, bureau_id_map: Optional[pd.DataFrame], num_parallel_processes: int, customer_ids: Optional[np.ndarray] = None, feature_plan: Optional[FeaturePlan] = None, backend: str = "pandas") -> None:
         """
-        Initializes the BureauBalanceData object with data path, bureau ID map, number of parallel processes, and sampling rate.
+        Initializes the BureauBalanceData object with data path, bureau ID map, number of parallel processes, and customers to keep.
 
         Args:
             path_to_data (str): Path to the data directory.
-            bureau_id_map (pd.DataFrame): DataFrame mapping bureau IDs to current IDs.
+            bureau_id_map (Optional[pd.DataFrame]): DataFrame mapping bureau IDs to current IDs. Can be set later
+                with set_id_mapping, e.g. when the bureau data is processed while this source is prefetched.
             num_parallel_processes (int): Number of parallel processes to use for data processing.
-            sampling (float): Sampling rate for the data processing.
+            customer_ids (Optional[np.ndarray]): SK_ID_CURR to keep. If None, all customers are processed.
+            feature_plan (Optional[FeaturePlan]): Plan used to skip aggregations of unselected features.
+            backend (str): Aggregation backend running the recipes ('pandas' or 'polars').
         """
-        self.buro_balance = pd.read_csv(path_to_data + "bureau_balance.csv")
-        self.bureau_id_map = bureau_id_map
+        self.path_to_data = path_to_data
+        self.bureau_id_map = None
+        self.buro_balance = None
         self.dataset_name = "buro_bal"
         self.agg_map = aggregation_recipes[self.dataset_name]
         self.feature_dfs_to_merge_with_main_df = []
         self.time_windows = {None: "all", -1: "first1", -7: "first6", -13: "first12"}
-        self.sampling = 1
+        self.customer_ids = customer_ids
         self.n_proc = num_parallel_processes
+        self.feature_plan = feature_plan
+        self.backend = get_backend(backend)
+        if bureau_id_map is not None:
+            self.set_id_mapping(bureau_id_map)
+
+    def set_id_mapping(self, bureau_id_map: pd.DataFrame) -> 'BureauBalanceData':
+        """
+        Sets the mapping between bureau IDs and current IDs, restricted to the selected customers.
+
+        Args:
+            bureau_id_map (pd.DataFrame): DataFrame mapping bureau IDs to current IDs.
+
+        Returns:
+            BureauBalanceData: The instance of BureauBalanceData with the mapping set.
+        """
+        self.bureau_id_map = semi_join(bureau_id_map, self.customer_ids)
+        return self
+
+    def load_data(self) -> 'BureauBalanceData':
+        """
+        Loads the bureau balances. Kept out of __init__, so sources can be loaded lazily or prefetched.
+
+        Returns:
+            BureauBalanceData: The instance of BureauBalanceData with loaded data.
+        """
+        self.buro_balance = pd.read_csv(self.path_to_data + "bureau_balance.csv")
+        return self
 
     def preprocess_data(self) -> 'BureauBalanceData':
         """
-        Preprocesses the bureau balance data by applying sampling and performing initial transformations.
+        Preprocesses the bureau balance data by performing initial transformations.
 
         Returns:
             BureauBalanceData: The instance of BureauBalanceData with preprocessed data.
         """
-        if self.sampling < 1:
-            self.buro_balance = self.buro_balance.sample(frac=self.sampling)
+        if self.customer_ids is not None:
+            self.buro_balance = semi_join(
+                self.buro_balance, self.bureau_id_map["SK_ID_BUREAU"].values, "SK_ID_BUREAU"
+            )
         self.buro_balance = self.buro_balance.merge(
             self.bureau_id_map, on="SK_ID_BUREAU", how="left"
         )
         self.buro_balance["SK_ID_CURR"] = (
             self.buro_balance["SK_ID_CURR"].fillna(0).astype(int)
         )
-        one_hot = pd.get_dummies(self.buro_balance["STATUS"])
+        # every status column of the recipe, so a subset of customers lacking some status still aggregates
+        statuses = [column[: -len("_col")] for column in self.agg_map if column.endswith("_col")]
+        one_hot = pd.get_dummies(self.buro_balance["STATUS"]).reindex(columns=statuses, fill_value=False)
         one_hot.columns = [f + "_col" for f in one_hot.columns.tolist()]
         self.buro_balance = pd.concat([self.buro_balance, one_hot], axis=1)
         return self
 
-    def compute_features_for_group(self, group_df: pd.DataFrame, prefix: str) -> pd.DataFrame:
+    def compute_features_for_windows(self, windows: Dict[str, Optional[float]], agg_maps: Dict[str, Dict]) -> List[pd.DataFrame]:
         """
-        Computes features for a given group of bureau balance data.
+        Computes features of the nested time windows of bureau balance data in a single pass.
 
         Args:
-            group_df (pd.DataFrame): The DataFrame representing a group of bureau balance data.
-            prefix (str): Prefix for the column names in the resultant DataFrame.
+            windows (Dict[str, Optional[float]]): MONTHS_BALANCE lower bound of every window, by feature prefix.
+                None means no bound.
+            agg_maps (Dict[str, Dict]): Aggregation mapping of every window, by feature prefix.
 
         Returns:
-            pd.DataFrame: A DataFrame with aggregated statistics for the given group.
-        """
-        stats = group_df.groupby("SK_ID_CURR").agg(self.agg_map).astype(np.float32)
-        stats.columns = reduce_column_names(stats, prefix)
-        return stats.reset_index()
+            List[pd.DataFrame]: One DataFrame with aggregated statistics per window.
+        """
+        with get_cost_ledger().measure(agg_maps):
+            engine = WindowEngine(self.buro_balance, "SK_ID_CURR", "MONTHS_BALANCE", self.backend)
+            window_stats = engine.aggregate_windows(windows, agg_maps)
+        feature_dfs = []
+        for prefix, stats in window_stats.items():
+            stats = stats.astype(np.float32)
+            stats.columns = reduce_column_names(stats, prefix)
+            feature_dfs.append(stats.reset_index())
+        return feature_dfs
 
     def compute_features_concurrently(self) -> 'BureauBalanceData':
         """
-        Computes features concurrently for different time windows of bureau balance data.
+        Computes features for the time windows of bureau balance data. The windows are nested, so they are
+        evaluated together by a WindowEngine.
 
         Returns:
             BureauBalanceData: The instance of BureauBalanceData with computed features.
         """
-        with concurrent.futures.ProcessPoolExecutor(
-            max_workers=self.n_proc
-        ) as executor:
-            futures = []
-            for window, prefix in self.time_windows.items():
-                filtered = (
-                    self.buro_balance
-                    if window is None
-                    else self.buro_balance[self.buro_balance["MONTHS_BALANCE"] > window]
-                )
-                future = executor.submit(
-                    self.compute_features_for_group,
-                    filtered,
-                    f"{self.dataset_name}_{prefix}",
-                )
-                futures.append(future)
-
-            for future in concurrent.futures.as_completed(futures):
-                self.feature_dfs_to_merge_with_main_df.append(future.result())
+        windows, agg_maps = {}, {}
+        for window, prefix in self.time_windows.items():
+            name_prefix = f"{self.dataset_name}_{prefix}"
+            agg_map = plan_agg_map(self.agg_map, name_prefix, self.feature_plan)
+            if not agg_map:
+                continue
+            windows[name_prefix] = window
+            agg_maps[name_prefix] = agg_map
+        if agg_maps:
+            self.feature_dfs_to_merge_with_main_df.extend(
+                self.compute_features_for_windows(windows, agg_maps)
+            )
 
         return self
 
@@ -1498,6 +1573,8 @@ class BureauBalanceData:
         Returns:
             List[pd.DataFrame]: A list of DataFrames with computed features for merging with the main DataFrame.
         """
+        if self.buro_balance is None:
+            self.load_data()
         self.preprocess_data().compute_features_concurrently()
         gc.collect()
         return self.feature_dfs_to_merge_with_main_df
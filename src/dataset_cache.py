@@ -0,0 +1,165 @@
+import os
+import json
+import hashlib
+from typing import List, Dict, Any, Optional
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+
+### parameters that change how LightGBM bins a Dataset; all other parameters only affect boosting
+dataset_params = [
+    "max_bin",
+    "max_bin_by_feature",
+    "min_data_in_bin",
+    "bin_construct_sample_cnt",
+    "data_random_seed",
+    "use_missing",
+    "zero_as_missing",
+    "max_cat_to_onehot",
+    "min_data_per_group",
+    "cat_smooth",
+    "cat_l2",
+]
+
+### fixed construction parameters; no feature pre-filtering, so one Dataset serves any min_data_in_leaf
+base_dataset_params = {"verbosity": -1, "feature_pre_filter": False}
+
+
+class DatasetCache:
+    """
+    An on-disk cache of constructed LightGBM Datasets.
+
+    Binning the feature matrix is the slowest part of building a Dataset, and it is the same for every fold, every
+    feature selection run and every Optuna trial on the same data. Constructed Datasets are saved in LightGBM's
+    binary format under a hash of the feature values, the target, the selected and categorical columns and the
+    binning parameters, so any later run on the same inputs loads the bins instead of recomputing them.
+
+    Attributes:
+        path (str): Directory of the cached binary Datasets.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Initializes the DatasetCache.
+
+        Args:
+            path (str): Directory of the cached binary Datasets, created if needed.
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def binning_params(params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Extracts the Dataset construction parameters from model parameters.
+
+        Args:
+            params (Optional[Dict[str, Any]]): Model parameters.
+
+        Returns:
+            Dict[str, Any]: The parameters used to construct the Dataset.
+        """
+        binning = {name: value for name, value in (params or {}).items() if name in dataset_params}
+        binning.update(base_dataset_params)
+        return binning
+
+    @staticmethod
+    def key(
+        data: pd.DataFrame,
+        label: np.ndarray,
+        categoricals: List[str],
+        binning: Dict[str, Any],
+    ) -> str:
+        """
+        Hashes everything the binned Dataset depends on.
+
+        Args:
+            data (pd.DataFrame): The feature columns, in order.
+            label (np.ndarray): The target values.
+            categoricals (List[str]): The categorical features.
+            binning (Dict[str, Any]): The construction parameters.
+
+        Returns:
+            str: The cache key.
+        """
+        digest = hashlib.sha1()
+        digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+        digest.update(np.ascontiguousarray(label, dtype=np.float64).tobytes())
+        description = {
+            "features": data.columns.tolist(),
+            "categoricals": sorted(categoricals),
+            "binning": binning,
+            "lightgbm": lgb.__version__,
+        }
+        digest.update(json.dumps(description, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def dataset_path(
+        self,
+        df: pd.DataFrame,
+        features: List[str],
+        label: np.ndarray,
+        categoricals: Optional[List[str]] = None,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        Returns the cache file of the binned Dataset of the data, building and saving it first if it is missing.
+
+        Categorical columns are passed to LightGBM as their raw integer codes, so boosters trained on the Dataset
+        predict from plain numeric matrices.
+
+        Args:
+            df (pd.DataFrame): The data.
+            features (List[str]): The feature columns, in order.
+            label (np.ndarray): The target values.
+            categoricals (Optional[List[str]]): The categorical features.
+            params (Optional[Dict[str, Any]]): Model parameters, of which the binning ones are used.
+
+        Returns:
+            str: Path of the binary Dataset, which other processes can load as well.
+        """
+        categoricals = [column for column in categoricals or [] if column in set(features)]
+        binning = self.binning_params(params)
+        # categoricals are hashed as codes too, so the key does not depend on whether they were cast to category
+        data = df[features].astype({column: np.float64 for column in categoricals})
+        path = os.path.join(self.path, f"{self.key(data, label, categoricals, binning)}.bin")
+        if os.path.exists(path):
+            print(f"Loading cached dataset {os.path.basename(path)}")
+            return path
+
+        dataset = lgb.Dataset(
+            data,
+            label=label,
+            categorical_feature=categoricals or "auto",
+            params=binning,
+            free_raw_data=False,
+        ).construct()
+        # written under a temporary name, so a concurrent or interrupted run never loads a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        dataset.save_binary(tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    def dataset(
+        self,
+        df: pd.DataFrame,
+        features: List[str],
+        label: np.ndarray,
+        categoricals: Optional[List[str]] = None,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> lgb.Dataset:
+        """
+        Returns the constructed Dataset of the data, loading it from the cache or building and saving it.
+
+        Args:
+            df (pd.DataFrame): The data.
+            features (List[str]): The feature columns, in order.
+            label (np.ndarray): The target values.
+            categoricals (Optional[List[str]]): The categorical features.
+            params (Optional[Dict[str, Any]]): Model parameters, of which the binning ones are used.
+
+        Returns:
+            lgb.Dataset: The constructed Dataset, whose subsets share its bins.
+        """
+        path = self.dataset_path(df, features, label, categoricals, params)
+        return lgb.Dataset(path, params=self.binning_params(params), free_raw_data=False).construct()
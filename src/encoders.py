@@ -0,0 +1,154 @@
+import json
+from typing import List, Dict, Optional
+import numpy as np
+import pandas as pd
+
+
+class CategoryEncoder:
+    """
+    Label encoding of categorical columns with a fixed, persisted vocabulary.
+
+    The vocabulary of a column is its sorted categories as strings (missing values are the category 'nan'), so the
+    codes are those a LabelEncoder fitted on astype(str) gives. Columns are encoded by factorizing them and looking
+    the few distinct values up in the vocabulary, instead of converting every row to a string. Categories missing
+    from the vocabulary get the code len(vocabulary), so fitted models can score new data without refitting.
+
+    Attributes:
+        vocab (Dict[str, List[str]]): Sorted categories of every column.
+    """
+
+    def __init__(self, vocab: Optional[Dict[str, List[str]]] = None) -> None:
+        """
+        Initializes the CategoryEncoder.
+
+        Args:
+            vocab (Optional[Dict[str, List[str]]]): Sorted categories (as strings) of every column. If None, the
+                encoder has to be fitted.
+        """
+        self.vocab = dict(vocab) if vocab is not None else {}
+        self._lookups = {}
+
+    @staticmethod
+    def categories(column: pd.Series) -> np.ndarray:
+        """
+        Returns the distinct values of a column as strings, as astype(str) would convert them.
+
+        Args:
+            column (pd.Series): The column.
+
+        Returns:
+            np.ndarray: The distinct values.
+        """
+        return pd.Series(pd.unique(column), dtype=object).astype(str).unique()
+
+    def fit(self, df: pd.DataFrame, columns: List[str]) -> "CategoryEncoder":
+        """
+        Fits the vocabulary of columns.
+
+        Args:
+            df (pd.DataFrame): The data.
+            columns (List[str]): The categorical columns.
+
+        Returns:
+            CategoryEncoder: The fitted encoder.
+        """
+        for col in columns:
+            self.vocab[col] = sorted(self.categories(df[col]))
+            self._lookups.pop(col, None)
+        return self
+
+    def unseen_code(self, col: str) -> int:
+        return len(self.vocab[col])
+
+    def lookup(self, col: str) -> Dict[str, int]:
+        if col not in self._lookups:
+            self._lookups[col] = {category: code for code, category in enumerate(self.vocab[col])}
+        return self._lookups[col]
+
+    def encode(self, column: pd.Series) -> np.ndarray:
+        """
+        Encodes a column.
+
+        Args:
+            column (pd.Series): The column, named as in the vocabulary.
+
+        Returns:
+            np.ndarray: The int32 code of every row.
+        """
+        lookup = self.lookup(column.name)
+        unseen = self.unseen_code(column.name)
+        codes, uniques = pd.factorize(column)
+        unique_codes = np.array(
+            [lookup.get(category, unseen) for category in pd.Series(uniques, dtype=object).astype(str)] + [lookup.get("nan", unseen)],
+            dtype=np.int32,
+        )
+        # factorize marks missing values with -1, which picks the last entry: the code of 'nan'
+        return unique_codes[codes]
+
+    def transform(self, df: pd.DataFrame, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Replaces categorical columns by their codes.
+
+        Args:
+            df (pd.DataFrame): The data, modified in place.
+            columns (Optional[List[str]]): The columns to encode. If None, all columns of the vocabulary.
+
+        Returns:
+            pd.DataFrame: The data with encoded columns.
+        """
+        for col in columns if columns is not None else list(self.vocab):
+            df[col] = self.encode(df[col])
+        return df
+
+    def one_hot_counts(self, df: pd.DataFrame, columns: List[str], key: str = "SK_ID_CURR") -> pd.DataFrame:
+        """
+        Counts the categories of encoded columns per key, as a one-hot encoding summed per key would.
+
+        Output columns are numbered over the categories of all columns in turn; unseen categories are not counted.
+
+        Args:
+            df (pd.DataFrame): The data, with columns already encoded.
+            columns (List[str]): The encoded categorical columns.
+            key (str): The grouping column.
+
+        Returns:
+            pd.DataFrame: The counts, one row per key sorted by key, with the key as a column.
+        """
+        keys, key_index = np.unique(df[key].values, return_inverse=True)
+        offsets = np.cumsum([0] + [len(self.vocab[col]) for col in columns])
+        cells = []
+        for col, offset in zip(columns, offsets[:-1]):
+            codes = df[col].values.astype(np.int64)
+            seen = (codes >= 0) & (codes < self.unseen_code(col))
+            cells.append(key_index[seen] * offsets[-1] + offset + codes[seen])
+        # one bincount over the flat (key, category) cells of all columns
+        counts = np.bincount(np.concatenate(cells), minlength=len(keys) * offsets[-1]).astype(np.float64)
+        counts = pd.DataFrame(counts.reshape(len(keys), offsets[-1]))
+        counts.insert(0, key, keys)
+        return counts
+
+
+def save_encoders(path: str, encoders: Dict[str, CategoryEncoder]) -> None:
+    """
+    Saves encoders as JSON, e.g. next to the models.
+
+    Args:
+        path (str): The output file.
+        encoders (Dict[str, CategoryEncoder]): The encoders, by table name.
+    """
+    with open(path, "w") as file:
+        json.dump({name: encoder.vocab for name, encoder in encoders.items()}, file, indent=1)
+
+
+def load_encoders(path: str) -> Dict[str, CategoryEncoder]:
+    """
+    Loads encoders saved by save_encoders.
+
+    Args:
+        path (str): The encoders file.
+
+    Returns:
+        Dict[str, CategoryEncoder]: The encoders, by table name.
+    """
+    with open(path, "r") as file:
+        return {name: CategoryEncoder(vocab) for name, vocab in json.load(file).items()}
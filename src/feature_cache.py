@@ -0,0 +1,441 @@
+import os
+import time
+import threading
+import collections
+from typing import List, Dict, Any, Optional, Callable, Iterable
+import numpy as np
+import pandas as pd
+from data_processors import (
+    BureauData,
+    BureauBalanceData,
+    PreviousApplicationData,
+    InstallmentsPaymentsData,
+    POSCashBalanceData,
+    CreditCardBalanceData,
+)
+from encoders import CategoryEncoder, load_encoders
+
+### source files of the child tables behind every processor, whose versions stamp the cached features
+source_tables = {
+    "BureauData": ["bureau.csv"],
+    "BureauBalanceData": ["bureau.csv", "bureau_balance.csv"],
+    "PreviousApplicationData": ["previous_application.csv"],
+    "InstallmentsPaymentsData": ["installments_payments.csv"],
+    "POSCashBalanceData": ["POS_CASH_balance.csv"],
+    "CreditCardBalanceData": ["credit_card_balance.csv"],
+}
+
+
+### how the processors computing single customers are fed from the resident tables: the attribute their
+### load_data fills, the source file and the columns load_data sorts it by
+processor_inputs = {
+    "BureauData": ("bureau_df", "bureau.csv", None),
+    "PreviousApplicationData": ("pr_app", "previous_application.csv", None),
+    "InstallmentsPaymentsData": ("ip", "installments_payments.csv", ["SK_ID_PREV", "DAYS_INSTALMENT"]),
+    "POSCashBalanceData": ("pos_bal", "POS_CASH_balance.csv", None),
+    "CreditCardBalanceData": ("cc_bal", "credit_card_balance.csv", None),
+}
+
+
+def file_version(path_to_data: str, file_name: str) -> str:
+    stat = os.stat(path_to_data + file_name)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def table_version(path_to_data: str, source: str) -> str:
+    """
+    Builds the data-version stamp of a processor's source tables from their modification times and sizes.
+
+    Args:
+        path_to_data (str): Path to the data directory.
+        source (str): Name of the processor class.
+
+    Returns:
+        str: The version stamp, which changes whenever one of the tables is rewritten.
+    """
+    return "/".join(file_version(path_to_data, file_name) for file_name in source_tables[source])
+
+
+class ResidentTable:
+    """
+    A source table parsed once and kept in memory, with its rows grouped by a key, so the rows of a few customers
+    are found by binary search instead of parsing and filtering the whole file on every cache miss.
+
+    The table is parsed again only when its file version changes.
+
+    Attributes:
+        path_to_data (str): Path to the data directory.
+        file_name (str): The source file.
+        key (str): The column the rows are looked up by.
+        version (Optional[str]): Version of the file the table was parsed from.
+        df (Optional[pd.DataFrame]): The table, in file order.
+    """
+
+    def __init__(self, path_to_data: str, file_name: str, key: str = "SK_ID_CURR") -> None:
+        """
+        Initializes the ResidentTable; the file is parsed on first use.
+
+        Args:
+            path_to_data (str): Path to the data directory.
+            file_name (str): The source file.
+            key (str): The column the rows are looked up by.
+        """
+        self.path_to_data = path_to_data
+        self.file_name = file_name
+        self.key = key
+        self.version = None
+        self.df = None
+        self._order = None
+        self._sorted_keys = None
+        self._lock = threading.Lock()
+
+    def refresh(self) -> None:
+        """
+        Parses the file again if it changed since it was parsed.
+        """
+        with self._lock:
+            version = file_version(self.path_to_data, self.file_name)
+            if version == self.version:
+                return
+            df = pd.read_csv(self.path_to_data + self.file_name)
+            keys = df[self.key].to_numpy()
+            order = np.argsort(keys, kind="stable")
+            self.df, self._order, self._sorted_keys, self.version = df, order, keys[order], version
+
+    def rows(self, ids: np.ndarray) -> pd.DataFrame:
+        """
+        Returns the rows of some keys, as the semi-join of the processors' load_data would.
+
+        Args:
+            ids (np.ndarray): The keys.
+
+        Returns:
+            pd.DataFrame: A copy of their rows, in file order.
+        """
+        self.refresh()
+        ids = np.unique(np.asarray(ids))
+        starts = np.searchsorted(self._sorted_keys, ids, side="left")
+        lengths = np.searchsorted(self._sorted_keys, ids, side="right") - starts
+        # positions of all rows of all keys: every key contributes its range of the key-sorted order
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        positions = np.sort(self._order[np.arange(lengths.sum()) + offsets])
+        return self.df.iloc[positions].copy()
+
+
+class ResidentTables:
+    """
+    The resident source tables, created on first use and shared by all processor factories.
+
+    Attributes:
+        path_to_data (str): Path to the data directory.
+        tables (Dict[Tuple[str, str], ResidentTable]): The tables, by file and key.
+    """
+
+    def __init__(self, path_to_data: str) -> None:
+        self.path_to_data = path_to_data
+        self.tables = {}
+        self._lock = threading.Lock()
+
+    def rows(self, file_name: str, ids: np.ndarray, key: str = "SK_ID_CURR") -> pd.DataFrame:
+        """
+        Returns the rows of some keys of a source table.
+
+        Args:
+            file_name (str): The source file.
+            ids (np.ndarray): The keys.
+            key (str): The column the rows are looked up by.
+
+        Returns:
+            pd.DataFrame: A copy of their rows, in file order.
+        """
+        with self._lock:
+            if (file_name, key) not in self.tables:
+                self.tables[(file_name, key)] = ResidentTable(self.path_to_data, file_name, key)
+            table = self.tables[(file_name, key)]
+        return table.rows(ids)
+
+
+def processor_features(processor_factory: Callable[[np.ndarray], Any], customer_ids: np.ndarray) -> pd.DataFrame:
+    """
+    Computes the features of a processor for some customers only.
+
+    Args:
+        processor_factory (Callable[[np.ndarray], Any]): Builds the processor restricted to the given SK_ID_CURR,
+            e.g. lambda ids: BureauData(path_to_data, 1, customer_ids=ids).
+        customer_ids (np.ndarray): The customers.
+
+    Returns:
+        pd.DataFrame: The features indexed by SK_ID_CURR, one row per customer (NaN without child rows).
+    """
+    features = pd.DataFrame(index=pd.Index(customer_ids, name="SK_ID_CURR"))
+    for feat_df in processor_factory(customer_ids).process():
+        features = features.join(feat_df.set_index("SK_ID_CURR"), how="left")
+    return features
+
+
+class FeatureVectorCache:
+    """
+    A size-bounded LRU cache of per-customer feature vectors, in front of the processor feature computation.
+
+    Entries are keyed by SK_ID_CURR and source processor and stamped with the data version of the source tables;
+    an entry is served only while its stamp matches the current version and it is younger than the TTL. New child
+    rows of a customer invalidate their entries. Lookups and insertions are thread-safe.
+
+    Attributes:
+        max_entries (int): Number of entries above which the least recently used ones are evicted.
+        ttl_seconds (Optional[float]): Age after which an entry expires. None means entries never expire.
+        entries (collections.OrderedDict): (SK_ID_CURR, source) -> (version, insertion time, feature Series), least
+            recently used first.
+        stats (Dict[str, int]): Hits, misses, evictions, expirations and invalidations.
+    """
+
+    def __init__(self, max_entries: int = 100000, ttl_seconds: Optional[float] = 3600) -> None:
+        """
+        Initializes the FeatureVectorCache.
+
+        Args:
+            max_entries (int): Number of entries above which the least recently used ones are evicted.
+            ttl_seconds (Optional[float]): Age after which an entry expires. None means entries never expire.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = collections.OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+        self._lock = threading.Lock()
+
+    def get(self, customer_id: int, source: str, version: str) -> Optional[pd.Series]:
+        """
+        Looks up the features of a customer.
+
+        Args:
+            customer_id (int): SK_ID_CURR of the customer.
+            source (str): Name of the processor.
+            version (str): Current data version of the source tables.
+
+        Returns:
+            Optional[pd.Series]: The cached features, or None on a miss.
+        """
+        key = (customer_id, source)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry_version, inserted, features = entry
+                if self.ttl_seconds is not None and time.monotonic() - inserted > self.ttl_seconds:
+                    del self.entries[key]
+                    self.stats["expirations"] += 1
+                elif entry_version != version:
+                    del self.entries[key]
+                    self.stats["invalidations"] += 1
+                else:
+                    self.entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return features
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, customer_id: int, source: str, version: str, features: pd.Series) -> None:
+        """
+        Stores the features of a customer, evicting the least recently used entries above the size bound.
+
+        Args:
+            customer_id (int): SK_ID_CURR of the customer.
+            source (str): Name of the processor.
+            version (str): Data version of the source tables the features were computed from.
+            features (pd.Series): The features.
+        """
+        key = (customer_id, source)
+        with self._lock:
+            self.entries[key] = (version, time.monotonic(), features)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def invalidate(self, customer_ids: Iterable[int], sources: Optional[List[str]] = None) -> int:
+        """
+        Drops the entries of customers with new child rows.
+
+        Args:
+            customer_ids (Iterable[int]): SK_ID_CURR of the customers.
+            sources (Optional[List[str]]): The processors whose tables received the rows. If None, all of them.
+
+        Returns:
+            int: Number of entries dropped.
+        """
+        dropped = 0
+        with self._lock:
+            sources = sources if sources is not None else {source for _, source in self.entries}
+            for customer_id in customer_ids:
+                for source in sources:
+                    if self.entries.pop((customer_id, source), None) is not None:
+                        dropped += 1
+            self.stats["invalidations"] += dropped
+        return dropped
+
+    def get_or_compute(
+        self,
+        customer_ids: np.ndarray,
+        source: str,
+        version: str,
+        compute: Callable[[np.ndarray], pd.DataFrame],
+    ) -> pd.DataFrame:
+        """
+        Returns the features of customers, computing only the missing ones, in a single call.
+
+        Args:
+            customer_ids (np.ndarray): SK_ID_CURR of the customers.
+            source (str): Name of the processor.
+            version (str): Current data version of the source tables.
+            compute (Callable[[np.ndarray], pd.DataFrame]): Computes the features of customers, indexed by
+                SK_ID_CURR, e.g. a partial of processor_features.
+
+        Returns:
+            pd.DataFrame: The features indexed by SK_ID_CURR, in the order of customer_ids.
+        """
+        cached, missing = {}, []
+        for customer_id in customer_ids:
+            features = self.get(customer_id, source, version)
+            if features is None:
+                missing.append(customer_id)
+            else:
+                cached[customer_id] = features
+        if missing:
+            computed = compute(np.asarray(missing))
+            for customer_id in missing:
+                features = computed.loc[customer_id] if customer_id in computed.index else pd.Series(index=computed.columns, dtype=np.float32)
+                self.put(customer_id, source, version, features)
+                cached[customer_id] = features
+        return pd.DataFrame([cached[customer_id] for customer_id in customer_ids], index=pd.Index(customer_ids, name="SK_ID_CURR"))
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Summarizes the cache activity.
+
+        Returns:
+            Dict[str, Any]: The counters, the number of entries and the hit rate.
+        """
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {**self.stats, "entries": len(self.entries), "hit_rate": self.stats["hits"] / lookups if lookups else 0.0}
+
+
+def processor_factories(
+    path_to_data: str,
+    backend: str = "pandas",
+    encoders: Optional[Dict[str, CategoryEncoder]] = None,
+    tables: Optional[ResidentTables] = None,
+) -> Dict[str, Callable[[np.ndarray], Any]]:
+    """
+    Builds the factories of the processors computing the features of single customers. Every processor is fed the
+    rows of its customers from the resident tables, so a cache miss never parses a source file.
+
+    PreviousApplicationData numbers its one-hot count columns by its categories, so it is only included with the
+    persisted vocabulary of training: categories fitted on the requested customers alone would renumber them on
+    every batch.
+
+    Args:
+        path_to_data (str): Path to the data directory.
+        backend (str): Aggregation backend of the processor recipes.
+        encoders (Optional[Dict[str, CategoryEncoder]]): The encoders saved by the pipeline (encoders.json).
+        tables (Optional[ResidentTables]): The resident source tables. Defaults to new ones.
+
+    Returns:
+        Dict[str, Callable[[np.ndarray], Any]]: Factory of every processor restricted to given SK_ID_CURR, by name.
+    """
+    tables = tables if tables is not None else ResidentTables(path_to_data)
+
+    def fed(processor: Any) -> Any:
+        attribute, file_name, sort_by = processor_inputs[type(processor).__name__]
+        rows = tables.rows(file_name, processor.customer_ids)
+        setattr(processor, attribute, rows.sort_values(sort_by) if sort_by else rows)
+        return processor
+
+    def bureau_balance(ids: np.ndarray) -> BureauBalanceData:
+        bureau_id_map = tables.rows("bureau.csv", ids)[["SK_ID_BUREAU", "SK_ID_CURR"]]
+        processor = BureauBalanceData(path_to_data, bureau_id_map, 1, customer_ids=ids, backend=backend)
+        processor.buro_balance = tables.rows("bureau_balance.csv", bureau_id_map["SK_ID_BUREAU"].values, "SK_ID_BUREAU")
+        return processor
+
+    processors = [BureauData, InstallmentsPaymentsData, POSCashBalanceData, CreditCardBalanceData]
+    factories = {
+        processor.__name__: (lambda ids, processor=processor: fed(processor(path_to_data, 1, customer_ids=ids, backend=backend)))
+        for processor in processors
+    }
+    factories["BureauBalanceData"] = bureau_balance
+    if encoders is not None and "previous_app" in encoders:
+        vocab = encoders["previous_app"].vocab
+        factories["PreviousApplicationData"] = lambda ids: fed(
+            PreviousApplicationData(path_to_data, 1, customer_ids=ids, category_vocab=vocab, backend=backend)
+        )
+    return factories
+
+
+class CachedFeatureBuilder:
+    """
+    Builds the child-table features of scored customers through a FeatureVectorCache.
+
+    Attributes:
+        path_to_data (str): Path to the data directory.
+        factories (Dict[str, Callable[[np.ndarray], Any]]): Factory of every processor, by name.
+        cache (FeatureVectorCache): The cache.
+    """
+
+    def __init__(
+        self,
+        path_to_data: str,
+        factories: Optional[Dict[str, Callable[[np.ndarray], Any]]] = None,
+        cache: Optional[FeatureVectorCache] = None,
+        encoders_path: Optional[str] = None,
+    ) -> None:
+        """
+        Initializes the CachedFeatureBuilder.
+
+        Args:
+            path_to_data (str): Path to the data directory.
+            factories (Optional[Dict[str, Callable[[np.ndarray], Any]]]): Factory of every processor, by name.
+                Defaults to processor_factories.
+            cache (Optional[FeatureVectorCache]): The cache. Defaults to a new one.
+            encoders_path (Optional[str]): The encoders.json of training, without which the default factories leave
+                out PreviousApplicationData.
+        """
+        self.path_to_data = path_to_data
+        encoders = load_encoders(encoders_path) if encoders_path is not None else None
+        self.factories = factories if factories is not None else processor_factories(path_to_data, encoders=encoders)
+        self.cache = cache if cache is not None else FeatureVectorCache()
+
+    def features(self, customer_ids: np.ndarray) -> pd.DataFrame:
+        """
+        Returns the features of customers from every processor, computing only those missing from the cache.
+
+        Args:
+            customer_ids (np.ndarray): SK_ID_CURR of the customers.
+
+        Returns:
+            pd.DataFrame: The features indexed by SK_ID_CURR, in the order of customer_ids.
+        """
+        return pd.concat(
+            [
+                self.cache.get_or_compute(
+                    customer_ids,
+                    source,
+                    table_version(self.path_to_data, source),
+                    lambda ids, factory=factory: processor_features(factory, ids),
+                )
+                for source, factory in self.factories.items()
+            ],
+            axis=1,
+        )
+
+    def new_rows(self, table: str, customer_ids: Iterable[int]) -> int:
+        """
+        Invalidates the cached features built from a table which received rows of some customers.
+
+        Args:
+            table (str): File name of the table, e.g. 'bureau.csv'.
+            customer_ids (Iterable[int]): SK_ID_CURR of the rows.
+
+        Returns:
+            int: Number of entries dropped.
+        """
+        sources = [source for source, tables in source_tables.items() if table in tables]
+        return self.cache.invalidate(customer_ids, sources)
@@ -0,0 +1,194 @@
+import ast
+from typing import Dict, Any, Mapping, Tuple, Union
+import numpy as np
+import pandas as pd
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+### arithmetic allowed in feature expressions, by AST node and by symbol
+binary_operators = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/"}
+numpy_operators = {"+": np.add, "-": np.subtract, "*": np.multiply, "/": np.divide}
+
+
+class FeatureExpressions:
+    """
+    A declarative spec of arithmetic features compiled into one evaluation plan.
+
+    Every expression (e.g. 'AMT_CREDIT / (AMT_INCOME_TOTAL / CNT_FAM_MEMBERS)') is parsed into a tree, and identical
+    subtrees across all expressions become a single step, so a shared subexpression is computed once. Steps are
+    evaluated in float64, as light_divide did, and every output is written straight into one float32 block. With
+    numexpr installed, the subtrees between shared steps are fused into single numexpr passes; otherwise each step
+    is one NumPy operation, freed after its last use.
+
+    The same plan evaluates a whole table in batch or a single applicant online.
+
+    Attributes:
+        spec (Dict[str, str]): Expression of every feature, by name.
+        names (List[str]): The features, in output order.
+        inputs (List[str]): The columns the expressions read.
+        steps (List[Tuple[str, Any, Any]]): (operator, left, right) of every distinct subtree, in evaluation order.
+            Operands are ('column', name), ('constant', value) or ('step', index).
+        outputs (List[Tuple[str, Any]]): The operand of every feature.
+    """
+
+    def __init__(self, spec: Dict[str, str]) -> None:
+        """
+        Compiles a spec.
+
+        Args:
+            spec (Dict[str, str]): Expression of every feature, by name, over column names, numbers, parentheses and
+                + - * /.
+        """
+        self.spec = dict(spec)
+        self.names = list(spec)
+        self.inputs = []
+        self.steps = []
+        self._step_index = {}
+        self.outputs = [self.compile(ast.parse(expression, mode="eval").body) for expression in spec.values()]
+        self._last_use = self.last_uses()
+
+    def compile(self, node: ast.AST) -> Tuple[str, Any]:
+        """
+        Compiles a subtree into steps, reusing the step of an identical subtree.
+
+        Args:
+            node (ast.AST): The subtree.
+
+        Returns:
+            Tuple[str, Any]: The operand the subtree evaluates to.
+        """
+        if isinstance(node, ast.Name):
+            if node.id not in self.inputs:
+                self.inputs.append(node.id)
+            return ("column", node.id)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return ("constant", float(node.value))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return self.add_step("-", ("constant", 0.0), self.compile(node.operand))
+        if isinstance(node, ast.BinOp) and type(node.op) in binary_operators:
+            return self.add_step(binary_operators[type(node.op)], self.compile(node.left), self.compile(node.right))
+        raise ValueError(f"Unsupported feature expression: {ast.unparse(node)}")
+
+    def add_step(self, symbol: str, left: Tuple[str, Any], right: Tuple[str, Any]) -> Tuple[str, Any]:
+        key = (symbol, left, right)
+        if key not in self._step_index:
+            self._step_index[key] = len(self.steps)
+            self.steps.append(key)
+        return ("step", self._step_index[key])
+
+    def last_uses(self) -> Dict[int, int]:
+        """
+        Finds the last step reading every step, so intermediate arrays can be freed early.
+
+        Returns:
+            Dict[int, int]: Index of the last reader of every step; outputs are never freed.
+        """
+        last_use = {}
+        for index, (_, left, right) in enumerate(self.steps):
+            for kind, value in [left, right]:
+                if kind == "step":
+                    last_use[value] = index
+        for kind, value in self.outputs:
+            if kind == "step":
+                last_use[value] = len(self.steps)
+        return last_use
+
+    def shared_steps(self) -> set:
+        """
+        Finds the steps read by more than one step or output, which are materialized once.
+
+        Returns:
+            set: Their indexes.
+        """
+        readers = {}
+        for _, left, right in self.steps:
+            for kind, value in [left, right]:
+                if kind == "step":
+                    readers[value] = readers.get(value, 0) + 1
+        for kind, value in self.outputs:
+            if kind == "step":
+                readers[value] = readers.get(value, 0) + 1
+        return {step for step, count in readers.items() if count > 1}
+
+    def columns(self, data: Union[pd.DataFrame, Mapping[str, Any]]) -> Dict[str, np.ndarray]:
+        return {column: np.asarray(data[column], dtype=np.float64) for column in self.inputs}
+
+    def evaluate(self, data: Union[pd.DataFrame, Mapping[str, Any]]) -> np.ndarray:
+        """
+        Evaluates the features.
+
+        Args:
+            data (Union[pd.DataFrame, Mapping[str, Any]]): The input columns, e.g. a DataFrame in batch, or a dict of
+                one-element lists online.
+
+        Returns:
+            np.ndarray: The (n_rows, n_features) float32 block, one column per feature.
+        """
+        columns = self.columns(data)
+        n_rows = len(next(iter(columns.values()))) if columns else 0
+        # Fortran order, so every feature is a contiguous column written in place
+        block = np.empty((n_rows, len(self.names)), dtype=np.float32, order="F")
+        if numexpr is not None:
+            self.evaluate_numexpr(columns, block)
+        else:
+            self.evaluate_numpy(columns, block)
+        return block
+
+    def evaluate_numpy(self, columns: Dict[str, np.ndarray], block: np.ndarray) -> None:
+        values = {}
+
+        def operand(kind: str, value: Any) -> Any:
+            if kind == "column":
+                return columns[value]
+            if kind == "constant":
+                return value
+            return values[value]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for index, (symbol, left, right) in enumerate(self.steps):
+                values[index] = numpy_operators[symbol](operand(*left), operand(*right))
+                for kind, value in [left, right]:
+                    if kind == "step" and self._last_use.get(value) == index:
+                        del values[value]
+            for column, (kind, value) in enumerate(self.outputs):
+                block[:, column] = operand(kind, value)
+
+    def evaluate_numexpr(self, columns: Dict[str, np.ndarray], block: np.ndarray) -> None:
+        shared = self.shared_steps()
+        local_dict = {f"c{position}": columns[column] for position, column in enumerate(self.inputs)}
+
+        def inline(kind: str, value: Any, root: bool = False) -> str:
+            if kind == "column":
+                return f"c{self.inputs.index(value)}"
+            if kind == "constant":
+                return repr(value)
+            if value in shared and not root:
+                return f"s{value}"
+            symbol, left, right = self.steps[value]
+            return f"({inline(*left)} {symbol} {inline(*right)})"
+
+        for step in sorted(shared):
+            local_dict[f"s{step}"] = numexpr.evaluate(inline("step", step, root=True), local_dict=local_dict)
+        for column, (kind, value) in enumerate(self.outputs):
+            if kind == "step" and value not in shared:
+                block[:, column] = numexpr.evaluate(inline(kind, value, root=True), local_dict=local_dict)
+            elif kind == "constant":
+                block[:, column] = value
+            else:
+                block[:, column] = local_dict[inline(kind, value)]
+
+    def to_frame(self, data: Union[pd.DataFrame, Mapping[str, Any]]) -> pd.DataFrame:
+        """
+        Evaluates the features as a DataFrame.
+
+        Args:
+            data (Union[pd.DataFrame, Mapping[str, Any]]): The input columns.
+
+        Returns:
+            pd.DataFrame: The float32 features, with the index of data if it is a DataFrame.
+        """
+        index = data.index if isinstance(data, pd.DataFrame) else None
+        return pd.DataFrame(self.evaluate(data), columns=self.names, index=index)
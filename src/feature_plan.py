@@ -0,0 +1,104 @@
+from typing import List, Dict, Any, Optional, Iterable
+from utils import recipe_feature_name
+
+
+class FeaturePlan:
+    """
+    A FeaturePlan decides which recipe entries a processor has to compute, given the feature selection.
+
+    The processors name every aggregated feature as prefix_column_aggregation (see reduce_column_names),
+    so the plan can map each (segment, column, aggregation) job to its output feature before anything is
+    computed, and prune the jobs whose features would be dropped anyway.
+
+    Attributes:
+        selected_features (Optional[Set[str]]): Features to keep. If None, every feature is kept unless unimportant.
+        unimportant_features (Set[str]): Features to drop.
+        skipped_segments (List[str]): Prefixes of segments pruned entirely, for reporting.
+        n_jobs_planned (int): Number of (segment, column, aggregation) jobs kept.
+        n_jobs_pruned (int): Number of (segment, column, aggregation) jobs pruned.
+    """
+
+    def __init__(
+        self,
+        selected_features: Optional[Iterable[str]] = None,
+        unimportant_features: Optional[Iterable[str]] = None,
+    ) -> None:
+        """
+        Initializes the FeaturePlan with the selected and/or unimportant features.
+
+        Args:
+            selected_features (Optional[Iterable[str]]): Features used by the model. If None, all features are candidates.
+            unimportant_features (Optional[Iterable[str]]): Features removed by feature selection.
+        """
+        self.selected_features = set(selected_features) if selected_features is not None else None
+        self.unimportant_features = set(unimportant_features or [])
+        self.skipped_segments = []
+        self.n_jobs_planned = 0
+        self.n_jobs_pruned = 0
+
+    def keeps(self, feature: str) -> bool:
+        """
+        Checks whether a feature survives feature selection.
+
+        Args:
+            feature (str): The feature name.
+
+        Returns:
+            bool: True if the feature has to be computed.
+        """
+        if feature in self.unimportant_features:
+            return False
+        return self.selected_features is None or feature in self.selected_features
+
+    def prune(self, agg_map: Dict[str, List[Any]], name_prefix: str) -> Dict[str, List[Any]]:
+        """
+        Derives the minimal aggregation map for one segment.
+
+        Args:
+            agg_map (Dict[str, List[Any]]): The full aggregation recipe of the segment.
+            name_prefix (str): The prefix the segment passes to reduce_column_names.
+
+        Returns:
+            Dict[str, List[Any]]: The recipe restricted to surviving features. Empty if the segment can be skipped.
+        """
+        pruned = {}
+        for column, aggs in agg_map.items():
+            kept = [agg for agg in aggs if self.keeps(recipe_feature_name(name_prefix, column, agg))]
+            self.n_jobs_planned += len(kept)
+            self.n_jobs_pruned += len(aggs) - len(kept)
+            if kept:
+                pruned[column] = kept
+        if not pruned:
+            self.skipped_segments.append(name_prefix)
+        return pruned
+
+    def summary(self) -> str:
+        """
+        Summarizes the plan for logging.
+
+        Returns:
+            str: A one-line summary of kept and pruned jobs.
+        """
+        return (
+            f"Feature plan: {self.n_jobs_planned} aggregation jobs kept, {self.n_jobs_pruned} pruned, "
+            f"{len(self.skipped_segments)} segments skipped"
+        )
+
+
+def plan_agg_map(
+    agg_map: Dict[str, List[Any]], name_prefix: str, feature_plan: Optional[FeaturePlan]
+) -> Dict[str, List[Any]]:
+    """
+    Returns the aggregation map a segment has to compute, or the full recipe when there is no plan.
+
+    Args:
+        agg_map (Dict[str, List[Any]]): The full aggregation recipe of the segment.
+        name_prefix (str): The prefix the segment passes to reduce_column_names.
+        feature_plan (Optional[FeaturePlan]): The plan, if feature selection is known upfront.
+
+    Returns:
+        Dict[str, List[Any]]: The aggregation map to compute.
+    """
+    if feature_plan is None:
+        return agg_map
+    return feature_plan.prune(agg_map, name_prefix)
@@ -0,0 +1,259 @@
+import os
+import tempfile
+import multiprocessing
+import concurrent.futures
+from typing import List, Dict, Any, Optional, Tuple, Callable
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+from sklearn.metrics import roc_auc_score, log_loss, mean_squared_error, mean_absolute_error
+from dataset_cache import DatasetCache
+
+### short, subsampled models: screening only ranks features, and null importance trains dozens of them
+screening_model_params = {
+    "n_estimators": 200,
+    "learning_rate": 0.1,
+    "num_leaves": 31,
+    "subsample": 0.8,
+    "subsample_freq": 1,
+    "colsample_bytree": 0.8,
+}
+
+### recursive feature elimination rounds: a high learning rate, a small round budget and early stopping keep every
+### round short
+rfe_model_params = {
+    "n_estimators": 150,
+    "learning_rate": 0.1,
+    "num_leaves": 31,
+    "subsample": 0.8,
+    "subsample_freq": 1,
+    "colsample_bytree": 0.8,
+}
+
+### metrics of the permutation importance: scoring function and whether higher is better
+permutation_metrics = {
+    "auc": (roc_auc_score, True),
+    "binary_logloss": (log_loss, False),
+    "l2": (mean_squared_error, False),
+    "l1": (mean_absolute_error, False),
+    "rmse": (lambda y, preds: np.sqrt(mean_squared_error(y, preds)), False),
+}
+
+
+### worker side
+_datasets = {}
+
+
+def load_dataset(path: str, binning: Dict[str, Any]) -> lgb.Dataset:
+    """
+    Loads a binary Dataset, keeping it cached as a worker trains many models on it.
+
+    Args:
+        path (str): Path of the binary Dataset.
+        binning (Dict[str, Any]): Its construction parameters.
+
+    Returns:
+        lgb.Dataset: The constructed Dataset.
+    """
+    if path not in _datasets:
+        _datasets.clear()
+        _datasets[path] = lgb.Dataset(path, params=binning, free_raw_data=False).construct()
+    return _datasets[path]
+
+
+def importance_run(
+    path: str, binning: Dict[str, Any], params: Dict[str, Any], label: np.ndarray, seed: int, shuffle: bool
+) -> np.ndarray:
+    """
+    Trains one model on a binary Dataset and returns its gain importances.
+
+    Args:
+        path (str): Path of the binary Dataset.
+        binning (Dict[str, Any]): Its construction parameters.
+        params (Dict[str, Any]): lgb.train parameters.
+        label (np.ndarray): The target values.
+        seed (int): Seed of the model and of the shuffle.
+        shuffle (bool): Whether to train on a shuffled target, for the null distribution.
+
+    Returns:
+        np.ndarray: Gain of every feature, in Dataset order.
+    """
+    dataset = load_dataset(path, binning)
+    dataset.set_label(np.random.default_rng(seed).permutation(label) if shuffle else label)
+    booster = lgb.train({**params, "seed": seed}, dataset)
+    return booster.feature_importance(importance_type="gain")
+
+
+class FeatureScreen:
+    """
+    Ranks features by how much the model relies on them, beyond what a gain == 0 filter can tell.
+
+    Two modes are available:
+    - null importance: the gain of every feature under the real target is compared with its gain under shuffled
+      targets. The models are trained in parallel processes that all load the same binary Dataset, so the data is
+      binned once, and each model only costs its boosting.
+    - permutation importance: the drop of the out-of-fold metric when a feature is shuffled. The validation rows of
+      a batch of features are stacked, one copy per feature with that feature permuted, and scored by one predict
+      call per fold.
+
+    Attributes:
+        task_type (str): The type of task ('classification' or 'regression').
+        eval_metric (str): The evaluation metric.
+        params (Dict[str, Any]): lgb.train parameters of the screening models.
+        n_workers (int): Number of processes training null importance models.
+        seed (int): Random seed.
+    """
+
+    def __init__(
+        self,
+        task_type: str,
+        eval_metric: str,
+        params: Dict[str, Any],
+        n_workers: int = 4,
+        seed: int = 7,
+    ) -> None:
+        """
+        Initializes the FeatureScreen.
+
+        Args:
+            task_type (str): The type of task ('classification' or 'regression').
+            eval_metric (str): The evaluation metric.
+            params (Dict[str, Any]): lgb.train parameters of the screening models, e.g. from TrainerLGBM.train_params.
+            n_workers (int): Number of processes training null importance models.
+            seed (int): Random seed.
+        """
+        self.task_type = task_type
+        self.eval_metric = eval_metric
+        self.params = params
+        self.n_workers = n_workers
+        self.seed = seed
+
+    def null_importances(
+        self,
+        dataset_path: str,
+        features: List[str],
+        label: np.ndarray,
+        n_null_runs: int = 40,
+        n_actual_runs: int = 4,
+    ) -> pd.Series:
+        """
+        Scores features by their gain under the real target against their gain under shuffled targets.
+
+        The score of a feature is log(actual gain / (1 + 75th percentile of its null gains)): features scoring
+        at most 0 are no more useful than noise.
+
+        Args:
+            dataset_path (str): Path of the binary Dataset of the features, shared by the workers.
+            features (List[str]): The features, in Dataset order.
+            label (np.ndarray): The target values.
+            n_null_runs (int): Number of models trained on shuffled targets.
+            n_actual_runs (int): Number of models trained on the real target, averaged.
+
+        Returns:
+            pd.Series: The score of every feature, in decreasing order.
+        """
+        binning = DatasetCache.binning_params(self.params)
+        # each worker boosts one model at a time on its share of the cores
+        params = {**self.params, "num_threads": max(1, (os.cpu_count() or 1) // self.n_workers)}
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.n_workers, mp_context=multiprocessing.get_context(start_method)
+        ) as executor:
+            actual = [
+                executor.submit(importance_run, dataset_path, binning, params, label, self.seed + run, False)
+                for run in range(n_actual_runs)
+            ]
+            null = [
+                executor.submit(importance_run, dataset_path, binning, params, label, self.seed + n_actual_runs + run, True)
+                for run in range(n_null_runs)
+            ]
+            actual_gain = np.mean([future.result() for future in actual], axis=0)
+            null_gain = np.stack([future.result() for future in null])
+        scores = np.log(1e-10 + actual_gain / (1 + np.percentile(null_gain, 75, axis=0)))
+        return pd.Series(scores, index=features).sort_values(ascending=False)
+
+    def permutation_importances(
+        self,
+        models: List[lgb.Booster],
+        tr_val_idx: List[Tuple[np.ndarray, np.ndarray]],
+        data: np.ndarray,
+        label: np.ndarray,
+        features: List[str],
+        max_rows: int = 20000,
+        max_cells: int = 50_000_000,
+    ) -> pd.Series:
+        """
+        Scores features by the drop of the out-of-fold metric when their values are shuffled.
+
+        Args:
+            models (List[lgb.Booster]): The fold models.
+            tr_val_idx (List[Tuple[np.ndarray, np.ndarray]]): Train and validation rows of every fold.
+            data (np.ndarray): The feature matrix of the labelled rows, columns in the order of features.
+            label (np.ndarray): The target values.
+            features (List[str]): The features.
+            max_rows (int): Number of validation rows sampled per fold.
+            max_cells (int): Size of the stacked matrix scored at once, which bounds the features per batch.
+
+        Returns:
+            pd.Series: The mean metric drop of every feature, in decreasing order.
+        """
+        if self.eval_metric not in permutation_metrics:
+            raise ValueError(f"Unsupported permutation metric: {self.eval_metric}")
+        score, higher_is_better = permutation_metrics[self.eval_metric]
+        rng = np.random.default_rng(self.seed)
+        drops = np.zeros(len(features))
+        for booster, (_, val_idx) in zip(models, tr_val_idx):
+            rows = np.sort(rng.choice(val_idx, min(max_rows, len(val_idx)), replace=False))
+            values, y = data[rows], label[rows]
+            baseline = score(y, booster.predict(values, num_iteration=booster.best_iteration))
+            batch_size = max(1, max_cells // values.size)
+            for start in range(0, len(features), batch_size):
+                columns = np.arange(start, min(start + batch_size, len(features)))
+                stacked = np.tile(values, (len(columns), 1))
+                for copy, column in enumerate(columns):
+                    stacked[copy * len(rows) : (copy + 1) * len(rows), column] = rng.permutation(values[:, column])
+                preds = booster.predict(stacked, num_iteration=booster.best_iteration).reshape(len(columns), len(rows))
+                permuted = np.array([score(y, copy_preds) for copy_preds in preds])
+                drops[columns] += (baseline - permuted if higher_is_better else permuted - baseline) / len(models)
+        return pd.Series(drops, index=features).sort_values(ascending=False)
+
+
+def screen_features(
+    screen: FeatureScreen,
+    mode: str,
+    full_df: pd.DataFrame,
+    features: List[str],
+    target: str,
+    categoricals: Optional[List[str]],
+    dataset_cache: Optional[DatasetCache],
+    fit_folds: Callable[[lgb.Dataset], Tuple[List[lgb.Booster], List[Tuple[np.ndarray, np.ndarray]]]],
+) -> pd.Series:
+    """
+    Ranks features with one of the modes of a FeatureScreen, binning the data once.
+
+    Args:
+        screen (FeatureScreen): The screen.
+        mode (str): 'null' or 'permutation'.
+        full_df (pd.DataFrame): The full dataset.
+        features (List[str]): The features.
+        target (str): The target column.
+        categoricals (Optional[List[str]]): The categorical features.
+        dataset_cache (Optional[DatasetCache]): Cache of binned datasets. If None, the Dataset is binned into a
+            temporary directory.
+        fit_folds (Callable): Trains the fold models on a constructed Dataset and returns them with their folds.
+
+    Returns:
+        pd.Series: The score of every feature, in decreasing order.
+    """
+    label = full_df[target].to_numpy(dtype=np.float64)
+    with tempfile.TemporaryDirectory(prefix="homecredit_screening_") as tmp_dir:
+        cache = dataset_cache if dataset_cache is not None else DatasetCache(tmp_dir)
+        path = cache.dataset_path(full_df, features, label, categoricals, screen.params)
+        if mode == "null":
+            return screen.null_importances(path, features, label)
+        if mode == "permutation":
+            full_set = lgb.Dataset(path, params=DatasetCache.binning_params(screen.params), free_raw_data=False).construct()
+            models, tr_val_idx = fit_folds(full_set)
+            data = full_df[features].to_numpy(dtype=np.float64)
+            return screen.permutation_importances(models, tr_val_idx, data, label, features)
+    raise ValueError(f"Unsupported screening mode: {mode}")
@@ -0,0 +1,247 @@
+import os
+import copy
+import json
+from typing import List, Optional, Union
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+
+
+class FeatureStore:
+    """
+    A disk-backed float32 feature matrix with a JSON column manifest.
+
+    The matrix is stored column-major, so the features of a processor can be appended as a block of columns at the
+    end of the file, and read back through np.memmap without ever holding the full matrix in memory.
+
+    Attributes:
+        path (str): Directory of the store.
+        manifest (dict): Number of rows, column names and categorical columns of the stored matrix.
+        selected (Optional[List[str]]): Columns exposed by this view of the store. If None, all stored columns.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Opens the feature store in a directory, reading its manifest if the store exists.
+
+        Args:
+            path (str): Directory of the store.
+        """
+        self.path = path
+        self.manifest = {"n_rows": 0, "columns": [], "categoricals": []}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as file:
+                self.manifest = json.load(file)
+        self.selected = None
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.path, "manifest.json")
+
+    @property
+    def matrix_path(self) -> str:
+        return os.path.join(self.path, "features.f32")
+
+    @property
+    def n_rows(self) -> int:
+        return self.manifest["n_rows"]
+
+    @property
+    def columns(self) -> List[str]:
+        return self.selected if self.selected is not None else self.manifest["columns"]
+
+    @property
+    def categoricals(self) -> List[str]:
+        return [column for column in self.manifest["categoricals"] if column in set(self.columns)]
+
+    def create(self, ids: np.ndarray, categoricals: Optional[List[str]] = None) -> "FeatureStore":
+        """
+        Creates an empty store for the given customers, replacing any previous content.
+
+        Args:
+            ids (np.ndarray): SK_ID_CURR of the rows, in row order.
+            categoricals (Optional[List[str]]): Categorical columns, for model training.
+
+        Returns:
+            FeatureStore: The empty store.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        if os.path.exists(self.matrix_path):
+            os.remove(self.matrix_path)
+        np.save(os.path.join(self.path, "ids.npy"), np.asarray(ids))
+        self.manifest = {"n_rows": len(ids), "columns": [], "categoricals": list(categoricals or [])}
+        self.save_manifest()
+        return self
+
+    def save_manifest(self) -> None:
+        """
+        Writes the manifest next to the matrix.
+        """
+        with open(self.manifest_path, "w") as file:
+            json.dump(self.manifest, file)
+
+    def ids(self) -> np.ndarray:
+        """
+        Returns the SK_ID_CURR of the rows.
+
+        Returns:
+            np.ndarray: The ids, in row order.
+        """
+        return np.load(os.path.join(self.path, "ids.npy"))
+
+    def append(self, block: pd.DataFrame) -> "FeatureStore":
+        """
+        Appends a block of columns, whose rows are in store order.
+
+        Args:
+            block (pd.DataFrame): The new columns.
+
+        Returns:
+            FeatureStore: The store with the new columns.
+        """
+        if len(block) != self.n_rows:
+            raise ValueError(f"Block has {len(block)} rows, the store has {self.n_rows}")
+        # names are stored as strings, as LightGBM needs them (e.g. the integer-named one-hot count columns)
+        columns = [str(column) for column in block.columns]
+        duplicated = set(columns) & set(self.manifest["columns"])
+        if duplicated:
+            raise ValueError(f"Columns already stored: {sorted(duplicated)[:10]}")
+        with open(self.matrix_path, "ab") as file:
+            # the transpose in C order is the block in column-major order
+            np.ascontiguousarray(block.to_numpy(dtype=np.float32).T).tofile(file)
+        self.manifest["columns"] += columns
+        self.save_manifest()
+        return self
+
+    def append_aligned(self, feat_df: pd.DataFrame, key: str = "SK_ID_CURR") -> "FeatureStore":
+        """
+        Appends per-customer features, aligned to the store rows as a left merge on the key would.
+
+        Args:
+            feat_df (pd.DataFrame): Features with one row per customer and the key as a column.
+            key (str): The customer key.
+
+        Returns:
+            FeatureStore: The store with the new columns.
+        """
+        return self.append(feat_df.set_index(key).reindex(self.ids()).reset_index(drop=True))
+
+    def matrix(self) -> np.memmap:
+        """
+        Maps the full stored matrix read-only.
+
+        Returns:
+            np.memmap: The (n_rows, n_stored_columns) column-major matrix.
+        """
+        return np.memmap(
+            self.matrix_path,
+            dtype=np.float32,
+            mode="r",
+            shape=(self.n_rows, len(self.manifest["columns"])),
+            order="F",
+        )
+
+    def select(self, columns: List[str]) -> "FeatureStore":
+        """
+        Returns a view of the store restricted to some columns, without copying data.
+
+        Args:
+            columns (List[str]): The columns to expose, in order.
+
+        Returns:
+            FeatureStore: The view.
+        """
+        view = copy.copy(self)
+        view.selected = list(columns)
+        return view
+
+    def drop(self, columns: List[str]) -> "FeatureStore":
+        """
+        Returns a view of the store without some columns.
+
+        Args:
+            columns (List[str]): The columns to hide. Missing columns are ignored.
+
+        Returns:
+            FeatureStore: The view.
+        """
+        dropped = set(columns)
+        return self.select([column for column in self.columns if column not in dropped])
+
+    def read_rows(self, rows: Union[np.ndarray, slice], span_rows: int = 8192) -> np.ndarray:
+        """
+        Reads some rows of the exposed columns into memory.
+
+        Scattered rows (e.g. a validation fold) are sorted and read window by window: every window of span_rows
+        consecutive rows is one sequential read per column, instead of one random read per row and column.
+
+        Args:
+            rows (Union[np.ndarray, slice]): Row positions.
+            span_rows (int): Number of consecutive rows read at once per column, which bounds the memory of a read to
+                span_rows x n_columns values.
+
+        Returns:
+            np.ndarray: The (n_selected_rows, n_columns) float32 values, in the order of rows.
+        """
+        matrix = self.matrix()
+        position = {column: i for i, column in enumerate(self.manifest["columns"])}
+        indexes = np.array([position[column] for column in self.columns], dtype=np.int64)
+        rows = np.arange(self.n_rows)[rows] if isinstance(rows, slice) else np.asarray(rows)
+        values = np.empty((len(rows), len(indexes)), dtype=np.float32)
+        if not len(rows) or not len(indexes):
+            return values
+        order = np.argsort(rows, kind="stable")
+        sorted_rows = rows[order]
+        windows = sorted_rows // span_rows
+        bounds = np.r_[0, np.flatnonzero(windows[1:] != windows[:-1]) + 1, len(sorted_rows)]
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            first, last = sorted_rows[start], sorted_rows[end - 1] + 1
+            window = matrix[first:last][:, indexes]
+            values[order[start:end]] = window[sorted_rows[start:end] - first]
+        return values
+
+    def to_frame(self, rows: Optional[Union[np.ndarray, slice]] = None) -> pd.DataFrame:
+        """
+        Loads rows of the exposed columns as a DataFrame.
+
+        Args:
+            rows (Optional[Union[np.ndarray, slice]]): Row positions. If None, all rows.
+
+        Returns:
+            pd.DataFrame: The features.
+        """
+        rows = slice(None) if rows is None else rows
+        return pd.DataFrame(self.read_rows(rows), columns=self.columns)
+
+
+class FeatureSequence(lgb.Sequence):
+    """
+    Exposes rows of a FeatureStore to LightGBM, which then builds its Dataset in chunks of batch_size rows.
+
+    Attributes:
+        store (FeatureStore): The feature store.
+        rows (np.ndarray): The store rows exposed by the sequence.
+        batch_size (int): Number of rows LightGBM reads at once.
+    """
+
+    def __init__(self, store: FeatureStore, rows: np.ndarray, batch_size: int = 8192) -> None:
+        """
+        Initializes the FeatureSequence.
+
+        Args:
+            store (FeatureStore): The feature store.
+            rows (np.ndarray): The store rows exposed by the sequence.
+            batch_size (int): Number of rows LightGBM reads at once.
+        """
+        self.store = store
+        self.rows = np.asarray(rows)
+        self.batch_size = batch_size
+
+    def __getitem__(self, idx: Union[int, slice]) -> np.ndarray:
+        # LightGBM samples Sequence rows as float64 only; the cast is per batch, so memory stays chunked
+        if isinstance(idx, slice):
+            return self.store.read_rows(self.rows[idx]).astype(np.float64)
+        return self.store.read_rows(self.rows[[idx]])[0].astype(np.float64)
+
+    def __len__(self) -> int:
+        return len(self.rows)
@@ -0,0 +1,268 @@
+from typing import List, Dict, Any, Callable, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def _reduce_segments(kernel: Callable, values: np.ndarray, offsets: np.ndarray, out: np.ndarray) -> None:
+    """
+    Applies a kernel to every contiguous segment of every column.
+
+    Args:
+        kernel (Callable): Reduction of a 1-d float64 segment to a float.
+        values (np.ndarray): Column-major (n_rows, n_columns) float64 values, sorted by group.
+        offsets (np.ndarray): Segment boundaries, segment g spans rows offsets[g]:offsets[g + 1].
+        out (np.ndarray): The (n_groups, n_columns) output, filled in place.
+    """
+    n_groups = offsets.shape[0] - 1
+    for j in range(values.shape[1]):
+        column = values[:, j]
+        for g in range(n_groups):
+            out[g, j] = kernel(column[offsets[g] : offsets[g + 1]])
+
+
+_reduce_segments_compiled = numba.njit(_reduce_segments) if numba is not None else None
+
+
+class SegmentKernel:
+    """
+    A reduction written against one sorted, contiguous segment of a column, usable in aggregation_recipes.
+
+    Inside a recipe it behaves like any other callable (it is labelled with its __name__), but the aggregation
+    backends route it to kernel_groupby_agg, which compiles it with Numba and runs it over all groups and all
+    recipe columns in one call instead of pandas' per-group apply. Kernels pickle by name, so recipes can be
+    shipped to worker processes.
+
+    Attributes:
+        fn (Callable): The reduction, taking a 1-d float64 array (NaN for missing values) and returning a float.
+        __name__ (str): The name used in feature names.
+    """
+
+    def __init__(self, fn: Callable) -> None:
+        """
+        Initializes the SegmentKernel.
+
+        Args:
+            fn (Callable): The reduction. It must be compilable in Numba nopython mode.
+        """
+        self.fn = fn
+        self.__name__ = fn.__name__
+        self._compiled = None
+
+    def compiled(self) -> Callable:
+        """
+        Returns the Numba-compiled reduction, compiling it on first use.
+
+        Returns:
+            Callable: The compiled reduction, or the Python one if Numba is not installed.
+        """
+        if numba is None:
+            return self.fn
+        if self._compiled is None:
+            self._compiled = numba.njit(cache=True)(self.fn)
+        return self._compiled
+
+    def reduce(self, values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """
+        Reduces every segment of every column.
+
+        Args:
+            values (np.ndarray): Column-major (n_rows, n_columns) float64 values, sorted by group.
+            offsets (np.ndarray): Segment boundaries, of length n_groups + 1.
+
+        Returns:
+            np.ndarray: The (n_groups, n_columns) reductions.
+        """
+        out = np.empty((len(offsets) - 1, values.shape[1]), dtype=np.float64)
+        if numba is None:
+            _reduce_segments(self.fn, values, offsets, out)
+        else:
+            _reduce_segments_compiled(self.compiled(), values, offsets, out)
+        return out
+
+    def __call__(self, x: Any) -> float:
+        return float(self.fn(np.asarray(x, dtype=np.float64)))
+
+    def __reduce__(self) -> Tuple[Callable, Tuple[str]]:
+        return get_kernel, (self.__name__,)
+
+    def __repr__(self) -> str:
+        return f"SegmentKernel({self.__name__})"
+
+
+registered_kernels = {}
+
+
+def segment_kernel(fn: Callable) -> SegmentKernel:
+    """
+    Decorator registering a segment reduction as a kernel.
+
+    Kernels are looked up by name when unpickled, so they have to be registered at import time of a module
+    the worker processes import as well.
+
+    Args:
+        fn (Callable): The reduction of a 1-d float64 segment, in Numba-compatible Python.
+
+    Returns:
+        SegmentKernel: The kernel, to be used in aggregation recipes.
+    """
+    kernel = SegmentKernel(fn)
+    registered_kernels[kernel.__name__] = kernel
+    return kernel
+
+
+def get_kernel(name: str) -> SegmentKernel:
+    """
+    Looks up a registered kernel by name.
+
+    Args:
+        name (str): The kernel name.
+
+    Returns:
+        SegmentKernel: The kernel.
+    """
+    if name not in registered_kernels:
+        raise ValueError(f"Unknown segment kernel: {name}")
+    return registered_kernels[name]
+
+
+@segment_kernel
+def skew(x: np.ndarray) -> float:
+    """
+    Sample skewness with the bias adjustment of pandas, ignoring NaN values. NaN for fewer than 3 values.
+    """
+    n = 0
+    total = 0.0
+    for v in x:
+        if not np.isnan(v):
+            n += 1
+            total += v
+    if n < 3:
+        return np.nan
+    mean = total / n
+    m2 = 0.0
+    m3 = 0.0
+    for v in x:
+        if not np.isnan(v):
+            d = v - mean
+            m2 += d * d
+            m3 += d * d * d
+    if m2 == 0:
+        return 0.0
+    return (n * (n - 1) ** 0.5 / (n - 2)) * (m3 / m2**1.5)
+
+
+@segment_kernel
+def last_value(x: np.ndarray) -> float:
+    """
+    The last non-missing value of the segment, in the order of the rows.
+    """
+    for i in range(len(x) - 1, -1, -1):
+        if not np.isnan(x[i]):
+            return x[i]
+    return np.nan
+
+
+@segment_kernel
+def trend_slope(x: np.ndarray) -> float:
+    """
+    Least-squares slope of the values against their position in the segment, ignoring NaN values.
+    """
+    n = 0
+    sum_t = 0.0
+    sum_v = 0.0
+    for i in range(len(x)):
+        if not np.isnan(x[i]):
+            n += 1
+            sum_t += i
+            sum_v += x[i]
+    if n < 2:
+        return np.nan
+    mean_t = sum_t / n
+    mean_v = sum_v / n
+    cov = 0.0
+    var = 0.0
+    for i in range(len(x)):
+        if not np.isnan(x[i]):
+            cov += (i - mean_t) * (x[i] - mean_v)
+            var += (i - mean_t) * (i - mean_t)
+    return cov / var
+
+
+@segment_kernel
+def longest_positive_streak(x: np.ndarray) -> float:
+    """
+    Length of the longest run of consecutive positive values (e.g. late payments). Missing values break a run.
+    """
+    longest = 0
+    current = 0
+    for v in x:
+        if v > 0:
+            current += 1
+            if current > longest:
+                longest = current
+        else:
+            current = 0
+    return float(longest)
+
+
+def split_kernel_entries(agg_map: Dict[str, List[Any]]) -> Tuple[Dict[str, List[Any]], Dict[str, List[Any]]]:
+    """
+    Splits a recipe into its segment kernels and the remaining aggregations.
+
+    Args:
+        agg_map (Dict[str, List[Any]]): Aggregations per column, as in aggregation_recipes.
+
+    Returns:
+        Tuple[Dict[str, List[Any]], Dict[str, List[Any]]]: The kernel entries and the other entries.
+    """
+    kernel_map, other_map = {}, {}
+    for column, aggs in agg_map.items():
+        for agg in aggs:
+            target = kernel_map if isinstance(agg, SegmentKernel) else other_map
+            target.setdefault(column, []).append(agg)
+    return kernel_map, other_map
+
+
+def kernel_groupby_agg(
+    df: pd.DataFrame, key: str, agg_map: Dict[str, List[SegmentKernel]], order_by: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    Runs segment kernels per key: the rows are sorted once, and every kernel reduces all groups of all its columns
+    in a single compiled call.
+
+    Args:
+        df (pd.DataFrame): The rows to aggregate.
+        key (str): The grouping column.
+        agg_map (Dict[str, List[SegmentKernel]]): Kernels per column.
+        order_by (Optional[str]): Column ordering the rows within a group (e.g. a date), for order-dependent kernels
+            such as last_value or trend_slope. If None, the original row order is kept.
+
+    Returns:
+        pd.DataFrame: One row per key (sorted, as index) and (column, kernel) multi-level columns.
+    """
+    sort_columns = [key] if order_by is None else [key, order_by]
+    ordered = df.sort_values(sort_columns, kind="mergesort")
+    keys = ordered[key].to_numpy()
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=np.int64)
+    offsets = np.append(starts, len(keys)).astype(np.int64)
+
+    columns_per_kernel = {}
+    for column, kernels in agg_map.items():
+        for kernel in kernels:
+            columns_per_kernel.setdefault(kernel.__name__, (kernel, []))[1].append(column)
+
+    results = {}
+    for name, (kernel, columns) in columns_per_kernel.items():
+        values = np.asfortranarray(ordered[columns].to_numpy(dtype=np.float64))
+        reduced = kernel.reduce(values, offsets)
+        for j, column in enumerate(columns):
+            results[(column, name)] = reduced[:, j]
+
+    stats = pd.DataFrame(results, index=pd.Index(keys[starts], name=key))
+    stats.columns = pd.MultiIndex.from_tuples(list(results))
+    return stats
@@ -0,0 +1,199 @@
+from typing import List
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+from data_processors import BureauData, PreviousApplicationData
+from models import TrainerLGBM
+from dataset_cache import DatasetCache
+from nested_models import predict_batched
+
+### inputs shared by past loans and current applications
+loan_term_features = ["AMT_CREDIT", "AMT_ANNUITY", "AMT_GOODS_PRICE", "credit_to_annuity", "goods_to_credit", "is_bureau"]
+
+### loans with an implausible rate or duration are left out of the training rows
+interest_range = (0.0, 1.0)
+duration_range = (1, 120)
+
+loan_terms_model_params = {
+    "n_estimators": 400,
+    "learning_rate": 0.05,
+    "num_leaves": 63,
+    "min_child_samples": 50,
+}
+
+
+def loan_term_matrix(
+    credit: np.ndarray, annuity: np.ndarray, goods_price: np.ndarray, is_bureau: bool
+) -> np.ndarray:
+    """
+    Builds the model inputs of a set of loans.
+
+    Args:
+        credit (np.ndarray): The credit amounts.
+        annuity (np.ndarray): The annuity amounts.
+        goods_price (np.ndarray): The goods prices, NaN when unknown.
+        is_bureau (bool): Whether the loans come from the credit bureau.
+
+    Returns:
+        np.ndarray: The (n_loans, len(loan_term_features)) float32 inputs.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        columns = [
+            credit,
+            annuity,
+            goods_price,
+            credit / annuity,
+            goods_price / credit,
+            np.full(len(credit), float(is_bureau)),
+        ]
+    matrix = np.column_stack(columns).astype(np.float32)
+    matrix[~np.isfinite(matrix)] = np.nan
+    return matrix
+
+
+class LoanTermsModel:
+    """
+    The interest rate model of the README (THE TRICK): the duration and interest rate of current loans are not
+    disclosed, so regressors learn them from past loans, whose terms are known, and predict them for every
+    application.
+
+    Past Home Credit loans contribute their CNT_PAYMENT and the rate implied by the annuity formula, bureau loans
+    the credit_duration and interest derived in BureauData.preprocess_data. Rows are collected from the processors
+    as the pipeline runs, so no table is read twice.
+
+    Attributes:
+        seed (int): Random seed of the models.
+        n_threads (int): Number of prediction threads.
+        inputs (List[np.ndarray]): Input matrices of the collected loans.
+        durations (List[np.ndarray]): Durations in months of the collected loans.
+        interests (List[np.ndarray]): Annual interest rates of the collected loans.
+        models (Dict[str, lgb.Booster]): The fitted regressors, by target.
+    """
+
+    def __init__(self, seed: int, n_threads: int = 4) -> None:
+        """
+        Initializes the LoanTermsModel.
+
+        Args:
+            seed (int): Random seed of the models.
+            n_threads (int): Number of prediction threads.
+        """
+        self.seed = seed
+        self.n_threads = n_threads
+        self.inputs = []
+        self.durations = []
+        self.interests = []
+        self.models = {}
+
+    def add_loans(self, inputs: np.ndarray, duration: np.ndarray, interest: np.ndarray) -> "LoanTermsModel":
+        """
+        Collects training loans, keeping those with plausible terms.
+
+        Args:
+            inputs (np.ndarray): Input matrix of the loans.
+            duration (np.ndarray): Durations in months.
+            interest (np.ndarray): Annual interest rates.
+
+        Returns:
+            LoanTermsModel: The model with the new loans.
+        """
+        with np.errstate(invalid="ignore"):
+            plausible = (
+                (interest >= interest_range[0])
+                & (interest <= interest_range[1])
+                & (duration >= duration_range[0])
+                & (duration <= duration_range[1])
+            )
+        self.inputs.append(inputs[plausible])
+        self.durations.append(duration[plausible])
+        self.interests.append(interest[plausible])
+        return self
+
+    def add_processor(self, processor: object) -> "LoanTermsModel":
+        """
+        Collects the loans of a processed bureau or previous application processor.
+
+        Args:
+            processor (object): A BureauData or PreviousApplicationData processor after processing.
+
+        Returns:
+            LoanTermsModel: The model with the new loans.
+        """
+        if isinstance(processor, BureauData):
+            bureau = processor.bureau_df
+            inputs = loan_term_matrix(
+                bureau["AMT_CREDIT_SUM"].to_numpy(dtype=np.float64),
+                bureau["AMT_ANNUITY"].to_numpy(dtype=np.float64),
+                np.full(len(bureau), np.nan),
+                True,
+            )
+            return self.add_loans(
+                inputs,
+                bureau["credit_duration"].to_numpy(dtype=np.float64),
+                bureau["interest"].to_numpy(dtype=np.float64),
+            )
+        if isinstance(processor, PreviousApplicationData):
+            pr_app = processor.pr_app
+            credit = pr_app["AMT_CREDIT"].to_numpy(dtype=np.float64)
+            annuity = pr_app["AMT_ANNUITY"].to_numpy(dtype=np.float64)
+            duration = pr_app["CNT_PAYMENT"].to_numpy(dtype=np.float64)
+            with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+                interest = np.power(annuity * duration / credit, 12 / duration) - 1
+            inputs = loan_term_matrix(credit, annuity, pr_app["AMT_GOODS_PRICE"].to_numpy(dtype=np.float64), False)
+            return self.add_loans(inputs, duration, interest)
+        return self
+
+    def fit(self) -> "LoanTermsModel":
+        """
+        Fits the duration and interest rate regressors on the collected loans.
+
+        Returns:
+            LoanTermsModel: The fitted model.
+        """
+        inputs = np.concatenate(self.inputs)
+        trainer = TrainerLGBM(seed=self.seed)
+        params = trainer.train_params("regression", loan_terms_model_params, "l2")
+        for target, values in [("duration", self.durations), ("interest", self.interests)]:
+            train_set = lgb.Dataset(
+                inputs,
+                label=np.concatenate(values),
+                feature_name=loan_term_features,
+                params=DatasetCache.binning_params(params),
+            )
+            self.models[target] = lgb.train(params, train_set)
+            print(f"Loan terms model: {target} fitted on {len(inputs)} loans")
+        self.inputs, self.durations, self.interests = [], [], []
+        return self
+
+    def process(self, applications: pd.DataFrame) -> List[pd.DataFrame]:
+        """
+        Predicts the terms of the current applications and derives features from them.
+
+        Args:
+            applications (pd.DataFrame): SK_ID_CURR, AMT_CREDIT, AMT_ANNUITY and AMT_GOODS_PRICE of the applications.
+
+        Returns:
+            List[pd.DataFrame]: The predicted terms, for merging with the main DataFrame.
+        """
+        credit = applications["AMT_CREDIT"].to_numpy(dtype=np.float64)
+        annuity = applications["AMT_ANNUITY"].to_numpy(dtype=np.float64)
+        inputs = loan_term_matrix(credit, annuity, applications["AMT_GOODS_PRICE"].to_numpy(dtype=np.float64), False)
+        rows = np.arange(len(inputs))
+        duration = predict_batched([self.models["duration"]], inputs, rows, n_threads=self.n_threads)
+        interest = predict_batched([self.models["interest"]], inputs, rows, n_threads=self.n_threads)
+        duration = np.clip(duration, *duration_range)
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            # the rate the annuity formula implies at the predicted duration, next to the predicted rate
+            implied_interest = np.power(annuity * duration / credit, 12 / duration) - 1
+            total_repaid_to_credit = annuity * duration / credit
+        features = pd.DataFrame(
+            {
+                "SK_ID_CURR": applications["SK_ID_CURR"].to_numpy(),
+                "pred_duration": duration,
+                "pred_interest": interest,
+                "pred_implied_interest": implied_interest,
+                "pred_total_repaid_to_credit": total_repaid_to_credit,
+                "pred_interest_to_duration": interest / duration,
+            }
+        )
+        return [features.astype({column: np.float32 for column in features.columns[1:]})]
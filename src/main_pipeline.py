@@ -1,4 +1,5 @@
 import gc
+import os
 import json
 import argparse
 from models import TrainerLGBM
@@ -12,7 +13,18 @@ from data_processors import (
     BureauBalanceData,
 )
 from utils import load_features_and_params
-from typing import Tuple, List, Any
+from feature_plan import FeaturePlan
+from sharded_pipeline import sharded_feature_engineering
+from worker_pool import shutdown_worker_pool
+from prefetcher import Prefetcher
+from feature_store import FeatureStore
+from redundancy import RedundancyFilter
+from oof_store import OOFStore
+from encoders import CategoryEncoder, save_encoders, load_encoders
+from nested_models import NestedInstallmentsModel
+from loan_terms import LoanTermsModel
+from cost_ledger import CostLedger, get_cost_ledger
+from typing import Tuple, List, Any, Optional, Union, Dict
 import warnings
 import pandas as pd
 import numpy as np
@@ -56,6 +68,100 @@ def parse_args() -> argparse.Namespace:
         default=4,
         help="Number of parallel processes",
     )
+    parser.add_argument(
+        "--n_shards",
+        type=int,
+        default=1,
+        help="Number of SK_ID_CURR hash partitions of the child tables. 1 disables sharded execution",
+    )
+    parser.add_argument(
+        "--n_nodes",
+        type=int,
+        default=1,
+        help="Number of concurrently running worker nodes in sharded execution",
+    )
+    parser.add_argument(
+        "--shard_dir",
+        type=str,
+        default="shards",
+        help="Working directory for shards in sharded execution",
+    )
+    parser.add_argument(
+        "--max_resident_tables",
+        type=int,
+        default=2,
+        help="Maximal number of raw child tables in memory; the next ones are prefetched while one is processed",
+    )
+    parser.add_argument(
+        "--nested_models",
+        action="store_true",
+        help="Add the aggregated predictions of a nested model trained on individual installment payments",
+    )
+    parser.add_argument(
+        "--loan_terms_model",
+        action="store_true",
+        help="Add the duration and interest rate of current loans, as predicted by models fitted on past loans",
+    )
+    parser.add_argument(
+        "--feature_budget_seconds",
+        type=float,
+        default=None,
+        help="If set, feature selection keeps the most important features per second of aggregation within this budget",
+    )
+    parser.add_argument(
+        "--feature_screening",
+        type=str,
+        default=None,
+        choices=["null", "permutation", "rfe"],
+        help="If set, feature selection drops features no more important than noise by null or permutation importance, or by recursive feature elimination",
+    )
+    parser.add_argument(
+        "--drop_redundant_features",
+        action="store_true",
+        help="Whether to drop constant, duplicated and nearly duplicated features before training",
+    )
+    parser.add_argument(
+        "--encoders_path",
+        type=str,
+        default=None,
+        help="If the file exists, categorical encoders are loaded from it instead of being fitted; otherwise the fitted encoders are saved to it",
+    )
+    parser.add_argument(
+        "--model_dir",
+        type=str,
+        default=None,
+        help="If set, the fold models are saved to this directory, e.g. for the scoring server",
+    )
+    parser.add_argument(
+        "--reason_codes",
+        type=int,
+        default=0,
+        help="If positive, the top reasons of every test prediction are saved to reason_codes.csv",
+    )
+    parser.add_argument(
+        "--oof_store_dir",
+        type=str,
+        default=None,
+        help="If set, out-of-fold and test predictions are stored in this directory, and stored models are not retrained",
+    )
+    parser.add_argument(
+        "--dataset_cache_dir",
+        type=str,
+        default=None,
+        help="If set, binned LightGBM datasets are cached in this directory and reused by later folds, trials and runs",
+    )
+    parser.add_argument(
+        "--feature_store_dir",
+        type=str,
+        default=None,
+        help="If set, features are written to a disk-backed matrix in this directory and models train out of core",
+    )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        default="pandas",
+        help="Aggregation backend of the processor recipes: pandas or polars",
+    )
     parser.add_argument(
         "--use_precomputed_optimal_settings",
         type=bool,
@@ -66,6 +172,18 @@ def parse_args() -> argparse.Namespace:
         "--n_fold", type=int, default=5, help="Number of folds for cross-validation"
     )
     parser.add_argument("--seed", type=int, default=7, help="Random seed")
+    parser.add_argument(
+        "--n_seeds",
+        type=int,
+        default=1,
+        help="Number of seeds the final model is bagged over (seed, seed + 1, ...), trained concurrently",
+    )
+    parser.add_argument(
+        "--n_concurrent",
+        type=int,
+        default=4,
+        help="Number of bagged models trained at once, each on an equal share of the cores",
+    )
     parser.add_argument("--metric", type=str, default="auc", help="Evaluation metric")
     parser.add_argument(
         "--task_type",
@@ -74,56 +192,144 @@ def parse_args() -> argparse.Namespace:
         help="classification or regression",
     )
     args = parser.parse_args()
+    if args.n_shards > 1:
+        # the sharded feature engineering builds the base features only
+        unsupported = ["nested_models", "loan_terms_model", "feature_store_dir", "encoders_path"]
+        used = [f"--{name}" for name in unsupported if getattr(args, name) not in (None, False)]
+        if used:
+            parser.error(f"--n_shards > 1 does not support {', '.join(used)}")
     return args
 
-def feature_engineering(path_to_data: str, num_parallel_processes: int, sample_rate: float) -> Tuple[pd.DataFrame, np.array, List[str]]:
+def merge_features(df: Optional[pd.DataFrame], store: Optional[FeatureStore], feature: List[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    """
+    Adds feature frames keyed by SK_ID_CURR to the main DataFrame, or to the feature store if there is one.
+
+    Args:
+        df: The main DataFrame, None when features go to the store.
+        store: The feature store, if any.
+        feature: The feature frames.
+
+    Returns:
+        The main DataFrame with the new features (None when features go to the store).
+    """
+    for feat_df in feature:
+        if store is not None:
+            store.append_aligned(feat_df)
+        else:
+            df = df.merge(feat_df, on="SK_ID_CURR", how="left")
+    return df
+
+def feature_engineering(path_to_data: str, num_parallel_processes: int, sample_rate: float, feature_plan: Optional[FeaturePlan] = None, backend: str = "pandas", max_resident_tables: int = 2, feature_store_dir: Optional[str] = None, nested_models: bool = False, loan_terms_model: bool = False, seed: int = 7, encoders: Optional[Dict[str, CategoryEncoder]] = None, cost_ledger_path: str = "feature_costs.json") -> Tuple[Union[pd.DataFrame, FeatureStore], np.array, List[str]]:
     """
     Performs feature engineering on the dataset.
 
     Args:
         path_to_data: The path to the data directory.
         num_parallel_processes: Number of parallel processes for data processing.
-        sample_rate: The sampling rate for data processing.
+        sample_rate: The sampling rate of training customers. The sampled ids are pushed down into every child table.
+        feature_plan: Optional plan of selected features. Aggregations of unselected features are not computed.
+        backend: Aggregation backend of the processor recipes ('pandas' or 'polars').
+        max_resident_tables: Maximal number of raw child tables in memory. The sources are loaded in a background
+            thread, so the next table is parsed while the current one is aggregated.
+        feature_store_dir: If set, the features are appended block by block to a FeatureStore in this directory
+            instead of being merged in memory, and the store is returned in place of the DataFrame.
+        nested_models: Whether to add the aggregated predictions of the nested installments model.
+        loan_terms_model: Whether to add the loan terms predicted by models fitted on bureau and previous loans.
+        seed: Random seed of the customer sampling and of the nested and loan terms models.
+        encoders: Persisted categorical encoders by table ('main', 'previous_app'). Missing ones are fitted on the
+            data and added to the dict, so they can be saved.
+        cost_ledger_path: File the measured compute cost of every aggregated feature is saved to.
 
     Returns:
-        Tuple containing the processed DataFrame, target values array, and a list of categorical features.
+        Tuple containing the processed DataFrame (or FeatureStore), target values array, and a list of categorical features.
     """
-    main_data_processor = MainData(path_to_data, sampling=0.1)
+    encoders = encoders if encoders is not None else {}
+    main_data_processor = MainData(path_to_data, sampling=sample_rate, random_state=seed, encoder=encoders.get("main"))
     df, target_col, y, categorical_feats = main_data_processor.process()
+    customer_ids = main_data_processor.get_customer_ids() if sample_rate < 1 else None
+    encoders["main"] = main_data_processor.encoder
     del main_data_processor
     gc.collect()
+    train_ids = df["SK_ID_CURR"].values[: y.shape[0]]
+    loan_terms = LoanTermsModel(seed, num_parallel_processes) if loan_terms_model else None
+    if loan_terms is not None:
+        applications = df[["SK_ID_CURR", "AMT_CREDIT", "AMT_ANNUITY", "AMT_GOODS_PRICE"]].copy()
+    store = None
+    if feature_store_dir is not None:
+        store = FeatureStore(feature_store_dir).create(df["SK_ID_CURR"].values, categorical_feats).append(df)
+        df = None
 
-    bureau_processor = BureauData(path_to_data, num_parallel_processes, sample_rate)
-    bureau_features = bureau_processor.process()
-    bureau_id_map = bureau_processor.get_id_mapping()
-    for feat_df in bureau_features:
-        df = df.merge(feat_df, on="SK_ID_CURR", how="left")
-    del bureau_processor, bureau_features
-    gc.collect()
-
-    processors = [
-        PreviousApplicationData(path_to_data, num_parallel_processes, sample_rate),
-        InstallmentsPaymentsData(path_to_data, num_parallel_processes, sample_rate),
-        POSCashBalanceData(path_to_data, num_parallel_processes, sample_rate),
-        CreditCardBalanceData(path_to_data, num_parallel_processes, sample_rate),
-        BureauBalanceData(path_to_data, bureau_id_map, num_parallel_processes, sample_rate)
-    ]
+    # the bureau id mapping is only known once the bureau data is processed, but the balances can be loaded before
+    bureau_balance_processor = BureauBalanceData(path_to_data, None, num_parallel_processes, customer_ids, feature_plan, backend=backend)
+    processors = Prefetcher(
+        [
+            BureauData(path_to_data, num_parallel_processes, customer_ids, feature_plan, backend=backend),
+            PreviousApplicationData(
+                path_to_data,
+                num_parallel_processes,
+                customer_ids,
+                feature_plan,
+                encoders["previous_app"].vocab if "previous_app" in encoders else None,
+                backend=backend,
+            ),
+            InstallmentsPaymentsData(path_to_data, num_parallel_processes, customer_ids, feature_plan, backend=backend),
+            POSCashBalanceData(path_to_data, num_parallel_processes, customer_ids, feature_plan, backend=backend),
+            CreditCardBalanceData(path_to_data, num_parallel_processes, customer_ids, feature_plan, backend=backend),
+            bureau_balance_processor,
+        ],
+        max_resident_tables,
+    )
 
     for processor in processors:
         feature = processor.process()
-        for feat_df in feature:
-            df = df.merge(feat_df, on="SK_ID_CURR", how="left")
+        if isinstance(processor, PreviousApplicationData):
+            encoders["previous_app"] = processor.encoder
+        if isinstance(processor, BureauData):
+            bureau_balance_processor.set_id_mapping(processor.get_id_mapping())
+        if loan_terms is not None:
+            loan_terms.add_processor(processor)
+        if nested_models and isinstance(processor, InstallmentsPaymentsData):
+            feature += NestedInstallmentsModel(
+                processor, train_ids, y, seed, n_threads=num_parallel_processes, feature_plan=feature_plan
+            ).process()
+        df = merge_features(df, store, feature)
         del processor, feature
         gc.collect()
+    del bureau_balance_processor
+    shutdown_worker_pool()
+    if loan_terms is not None:
+        df = merge_features(df, store, loan_terms.fit().process(applications))
+        del loan_terms, applications
+    # measured compute cost of every aggregated feature, for budgeted feature selection
+    os.makedirs(os.path.dirname(cost_ledger_path) or ".", exist_ok=True)
+    get_cost_ledger().save(cost_ledger_path)
+
+    if feature_plan is not None:
+        print(feature_plan.summary())
+    return (store if store is not None else df), y, categorical_feats
+
+def load_feature_costs(args: argparse.Namespace) -> Dict[str, float]:
+    """
+    Loads the compute cost of every aggregated feature from the ledger saved next to the optimization settings, or
+    takes it from the ledger of this run if none was saved.
+
+    Args:
+        args: Parsed arguments.
 
-    return df, y, categorical_feats
+    Returns:
+        Estimated compute seconds by feature name.
+    """
+    cost_ledger_path = os.path.join(args.path_to_opt_settings, "feature_costs.json")
+    if os.path.exists(cost_ledger_path):
+        return CostLedger.load(cost_ledger_path).feature_costs()
+    return get_cost_ledger().feature_costs()
 
-def feature_selection_and_hyperparameter_optimization(df: pd.DataFrame, y: np.array, categorical_feats: List[str], args: argparse.Namespace) -> Tuple[pd.DataFrame, dict]:
+def feature_selection_and_hyperparameter_optimization(df: Union[pd.DataFrame, FeatureStore], y: np.array, categorical_feats: List[str], args: argparse.Namespace) -> Tuple[Union[pd.DataFrame, FeatureStore], dict]:
     """
     Performs feature selection and hyperparameter optimization.
 
     Args:
-        df: DataFrame containing the features.
+        df: DataFrame (or FeatureStore) containing the features.
         y: Array containing the target values.
         categorical_feats: List of categorical feature names.
         args: Parsed arguments.
@@ -131,12 +337,30 @@ def feature_selection_and_hyperparameter_optimization(df: pd.DataFrame, y: np.ar
     Returns:
         Tuple containing the DataFrame with selected features and the optimal hyperparameters.
     """
+    if args.drop_redundant_features:
+        redundant_features_path = f"{args.path_to_opt_settings}/redundant_features.json"
+        if args.use_precomputed_optimal_settings and os.path.exists(redundant_features_path):
+            # the features were already pruned through the FeaturePlan; refitting would find none and lose the mapping
+            redundancy_filter = RedundancyFilter.load(redundant_features_path)
+        else:
+            # categoricals are kept, so the categorical feature list stays valid for training
+            features = [column for column in df.columns if column != "SK_ID_CURR" and column not in set(categorical_feats)]
+            redundancy_filter = RedundancyFilter(seed=args.seed).fit(df, features, np.arange(y.shape[0]))
+            # the mapping goes next to the optimal settings, so later runs never compute the dropped features
+            os.makedirs(args.path_to_opt_settings, exist_ok=True)
+            redundancy_filter.save(redundant_features_path)
+        df = redundancy_filter.transform(df)
     if args.use_precomputed_optimal_settings:
         unimportant_features, optimal_lgb_params = load_features_and_params(args.path_to_opt_settings)
+        if isinstance(df, FeatureStore):
+            return df.drop(unimportant_features), optimal_lgb_params
     else:
+        # the search runs in memory
+        if isinstance(df, FeatureStore):
+            df = df.to_frame()
         full_df = df.iloc[: y.shape[0], :].copy()
         full_df["TARGET"] = y
-        trainer_lgb = TrainerLGBM(seed=args.seed)
+        trainer_lgb = TrainerLGBM(seed=args.seed, dataset_cache_dir=args.dataset_cache_dir)
         unimportant_features, optimal_lgb_params = trainer_lgb.optimize_features_params(
             full_df,
             args.task_type,
@@ -148,28 +372,39 @@ def feature_selection_and_hyperparameter_optimization(df: pd.DataFrame, y: np.ar
             1,
             3600,
             categoricals=categorical_feats,
+            feature_costs=load_feature_costs(args) if args.feature_budget_seconds is not None else None,
+            budget_seconds=args.feature_budget_seconds,
+            screening=args.feature_screening,
+            output_dir=args.path_to_opt_settings,
         )
-    df.drop(columns=unimportant_features, inplace=True)
+    # features pruned by the feature plan were never computed
+    df.drop(columns=unimportant_features, inplace=True, errors="ignore")
     return df, optimal_lgb_params
 
-def train_model(df: pd.DataFrame, y: np.array, categorical_feats: List[str], args: argparse.Namespace, optimal_lgb_params: dict) -> List[lgb.LGBMModel]:
+def train_model(df: Union[pd.DataFrame, FeatureStore], y: np.array, categorical_feats: List[str], args: argparse.Namespace, optimal_lgb_params: dict) -> Tuple[List[Union[lgb.LGBMModel, lgb.Booster]], np.ndarray, float]:
     """
     Trains the model using the given dataset.
 
     Args:
-        df: DataFrame containing the features.
+        df: DataFrame (or FeatureStore, for out-of-core training) containing the features.
         y: Array containing the target values.
         categorical_feats: List of categorical feature names.
         args: Parsed arguments.
         optimal_lgb_params: Optimal hyperparameters for the model.
 
     Returns:
-        Trained models.
+        Trained models, their out-of-fold predictions and validation score.
     """
+    if isinstance(df, FeatureStore):
+        models, val_preds, val_metric = TrainerLGBM(seed=args.seed).fit_kfold_store(
+            df, y, args.task_type, optimal_lgb_params, args.metric, args.n_fold, False
+        )
+        print(f"CV {args.metric}: {val_metric}")
+        return models, val_preds, val_metric
     full_df = df.iloc[: y.shape[0], :].copy()
     full_df["TARGET"] = y
-    trainer_lgb = TrainerLGBM(seed=args.seed)
-    models, _, val_metric = trainer_lgb.fit_kfold(
+    trainer_lgb = TrainerLGBM(seed=args.seed, dataset_cache_dir=args.dataset_cache_dir)
+    models, val_preds, val_metric = trainer_lgb.fit_kfold(
         full_df,
         args.task_type,
         optimal_lgb_params,
@@ -181,16 +416,54 @@ def train_model(df: pd.DataFrame, y: np.array, categorical_feats: List[str], arg
         categorical_feats,
     )
     print(f"CV {args.metric}: {val_metric}")
-    return models
+    return models, val_preds, val_metric
 
 
-def build_submission(df: pd.DataFrame, y: np.array, models: List[lgb.LGBMModel], args: argparse.Namespace, categorical_feats: List[str]) -> pd.DataFrame:
+def train_bagged_models(df: pd.DataFrame, y: np.array, categorical_feats: List[str], args: argparse.Namespace, optimal_lgb_params: dict) -> Tuple[List[lgb.Booster], pd.DataFrame, np.ndarray, float]:
     """
-    Builds the submission file from the trained models.
+    Trains the model over several seeds and folds concurrently and averages the predictions.
 
     Args:
         df: DataFrame containing the features.
         y: Array containing the target values.
+        categorical_feats: List of categorical feature names.
+        args: Parsed arguments.
+        optimal_lgb_params: Optimal hyperparameters for the model.
+
+    Returns:
+        The boosters of all seeds and folds, DataFrame for submission, the averaged out-of-fold predictions and the
+        mean validation score of the seeds.
+    """
+    full_df = df.iloc[: y.shape[0], :].copy()
+    full_df["TARGET"] = y
+    seeds = [args.seed + offset for offset in range(args.n_seeds)]
+    trainer_lgb = TrainerLGBM(seed=args.seed, dataset_cache_dir=args.dataset_cache_dir)
+    models, val_preds, test_preds, seed_scores = trainer_lgb.fit_bagged(
+        full_df,
+        args.task_type,
+        optimal_lgb_params,
+        full_df.columns.drop("TARGET"),
+        "TARGET",
+        args.metric,
+        args.n_fold,
+        seeds,
+        df.iloc[y.shape[0]:, :],
+        categorical_feats,
+        n_concurrent=args.n_concurrent,
+    )
+    val_metric = float(np.mean(list(seed_scores.values())))
+    print(f"CV {args.metric} over {len(seeds)} seeds: {val_metric}")
+    submission_df = pd.DataFrame({"SK_ID_CURR": df.iloc[y.shape[0]:, :]["SK_ID_CURR"].values, "TARGET": test_preds})
+    return models, submission_df, val_preds, val_metric
+
+
+def build_submission(df: Union[pd.DataFrame, FeatureStore], y: np.array, models: List[Union[lgb.LGBMModel, lgb.Booster]], args: argparse.Namespace, categorical_feats: List[str]) -> pd.DataFrame:
+    """
+    Builds the submission file from the trained models.
+
+    Args:
+        df: DataFrame (or FeatureStore) containing the features.
+        y: Array containing the target values.
         models: Trained models.
         args: Parsed arguments.
         categorical_feats: List of categorical feature names.
@@ -198,6 +471,11 @@ def build_submission(df: pd.DataFrame, y: np.array, models: List[lgb.LGBMModel],
     Returns:
         DataFrame for submission.
     """
+    if isinstance(df, FeatureStore):
+        trainer_lgb = TrainerLGBM(seed=args.seed)
+        rows = np.arange(y.shape[0], df.n_rows)
+        preds = np.mean([trainer_lgb.predict_store(model, df, rows, args.task_type) for model in models], axis=0)
+        return pd.DataFrame({"SK_ID_CURR": df.ids()[y.shape[0]:], "TARGET": preds})
     pred_df = df.iloc[y.shape[0]:, :]
     id_ = df.iloc[y.shape[0]:, :]["SK_ID_CURR"]
     trainer_lgb = TrainerLGBM(seed=args.seed)
@@ -206,6 +484,35 @@ def build_submission(df: pd.DataFrame, y: np.array, models: List[lgb.LGBMModel],
     return submission_df
 
 
+def build_reason_codes(df: Union[pd.DataFrame, FeatureStore], y: np.array, models: List[Union[lgb.LGBMModel, lgb.Booster]], args: argparse.Namespace, categorical_feats: List[str], chunk_rows: int = 50000) -> pd.DataFrame:
+    """
+    Computes the reason codes of the test predictions, in batches of rows.
+
+    Args:
+        df: DataFrame (or FeatureStore) containing the features.
+        y: Array containing the target values.
+        models: Trained models.
+        args: Parsed arguments.
+        categorical_feats: List of categorical feature names.
+        chunk_rows: Number of rows explained at once.
+
+    Returns:
+        DataFrame of the top reasons of every test row.
+    """
+    trainer_lgb = TrainerLGBM(seed=args.seed)
+    n_rows = df.n_rows if isinstance(df, FeatureStore) else df.shape[0]
+    rows = np.arange(y.shape[0], n_rows)
+    reasons = []
+    for start in range(0, len(rows), chunk_rows):
+        batch = rows[start : start + chunk_rows]
+        data = df.read_rows(batch) if isinstance(df, FeatureStore) else df.iloc[batch]
+        reasons.append(trainer_lgb.explain(models, data, args.reason_codes, categoricals=categorical_feats))
+    reasons = pd.concat(reasons, ignore_index=True)
+    ids = df.ids() if isinstance(df, FeatureStore) else df["SK_ID_CURR"].values
+    reasons.insert(0, "SK_ID_CURR", ids[rows])
+    return reasons
+
+
 def main_pipeline(args: argparse.Namespace) -> None:
     """
     Main pipeline for feature engineering, model training, and submission file generation. Creates and saves submission.csv file required in the competition.
@@ -213,10 +520,89 @@ def main_pipeline(args: argparse.Namespace) -> None:
     Args:
         args: Parsed arguments.
     """
-    df, y, categorical_feats = feature_engineering(args.path_to_data, args.num_parallel_processes, args.sample_rate)
+    feature_plan = None
+    if args.use_precomputed_optimal_settings:
+        unimportant_features, _ = load_features_and_params(args.path_to_opt_settings)
+        redundant_features_path = f"{args.path_to_opt_settings}/redundant_features.json"
+        if args.drop_redundant_features and os.path.exists(redundant_features_path):
+            unimportant_features += RedundancyFilter.load(redundant_features_path).dropped_features
+        feature_plan = FeaturePlan(unimportant_features=unimportant_features)
+    encoders = {}
+    if args.encoders_path is not None and os.path.exists(args.encoders_path):
+        encoders = load_encoders(args.encoders_path)
+    if args.n_shards > 1:
+        df, y, categorical_feats = sharded_feature_engineering(
+            args.path_to_data,
+            args.shard_dir,
+            args.n_shards,
+            args.n_nodes,
+            args.num_parallel_processes,
+            args.sample_rate,
+            feature_plan,
+            args.backend,
+            args.max_resident_tables,
+            args.seed,
+        )
+    else:
+        df, y, categorical_feats = feature_engineering(
+            args.path_to_data,
+            args.num_parallel_processes,
+            args.sample_rate,
+            feature_plan,
+            args.backend,
+            args.max_resident_tables,
+            args.feature_store_dir,
+            args.nested_models,
+            args.loan_terms_model,
+            args.seed,
+            encoders,
+            os.path.join(args.path_to_opt_settings, "feature_costs.json"),
+        )
+        if args.encoders_path is not None and not os.path.exists(args.encoders_path):
+            save_encoders(args.encoders_path, encoders)
     df, optimal_lgb_params = feature_selection_and_hyperparameter_optimization(df, y, categorical_feats, args)
-    models = train_model(df, y, categorical_feats, args, optimal_lgb_params)
-    submission_df = build_submission(df, y, models, args, categorical_feats)
+    # bagging trains from an in-memory DataFrame
+    bagged = args.n_seeds > 1 and not isinstance(df, FeatureStore)
+    seeds = [args.seed + offset for offset in range(args.n_seeds)] if bagged else args.seed
+    oof_store = OOFStore(args.oof_store_dir) if args.oof_store_dir else None
+    if oof_store is not None:
+        ids = df.ids() if isinstance(df, FeatureStore) else df["SK_ID_CURR"].values
+        config = OOFStore.model_config(
+            optimal_lgb_params, list(df.columns), args.task_type, args.metric, args.n_fold, seeds, ids, y
+        )
+        # the stored predictions replace training only when no trained models are needed
+        if oof_store.exists(config) and args.model_dir is None and args.reason_codes == 0:
+            key = OOFStore.key(config)
+            print(f"Loading stored predictions {key}, CV {args.metric}: {oof_store.meta(key)['val_score']}")
+            _, test_preds, _ = oof_store.load(key)
+            pd.DataFrame({"SK_ID_CURR": ids[y.shape[0]:], "TARGET": test_preds}).to_csv("submission.csv", index=False)
+            return
+    if bagged:
+        models, submission_df, val_preds, val_metric = train_bagged_models(df, y, categorical_feats, args, optimal_lgb_params)
+    else:
+        models, val_preds, val_metric = train_model(df, y, categorical_feats, args, optimal_lgb_params)
+        submission_df = build_submission(df, y, models, args, categorical_feats)
+    if args.model_dir is not None:
+        os.makedirs(args.model_dir, exist_ok=True)
+        # the fold models of all seeds; the server averages them as the bagged submission does
+        for fold, model in enumerate(models):
+            # saved at the best iteration
+            TrainerLGBM.get_booster(model).save_model(os.path.join(args.model_dir, f"fold_{fold}.txt"))
+        # the server maps these features through the category codes stored in the model files
+        with open(os.path.join(args.model_dir, "categorical_features.json"), "w") as file:
+            json.dump(categorical_feats, file)
+        # the models are only valid with the category codes they were trained on
+        if encoders:
+            save_encoders(os.path.join(args.model_dir, "encoders.json"), encoders)
+    if args.reason_codes > 0:
+        build_reason_codes(df, y, models, args, categorical_feats).to_csv("reason_codes.csv", index=False)
+    if oof_store is not None:
+        # the folds of every seed, as fit_bagged draws them
+        fold_plans = [
+            TrainerLGBM(seed=seed).set_tr_val_indexes(np.arange(y.shape[0]), args.n_fold)
+            for seed in (seeds if bagged else [seeds])
+        ]
+        oof_store.save(config, val_preds, submission_df["TARGET"].values, fold_plans, val_metric)
     submission_df.to_csv("submission.csv", index=False)
 
 
@@ -1,4 +1,4 @@
-from typing import List, Tuple, Set, Optional, Dict, Any
+from typing import List, Tuple, Set, Optional, Dict, Any, Union, Callable
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import KFold
@@ -7,6 +7,23 @@ from matplotlib import pyplot as plt
 import seaborn as sns
 from collections import defaultdict
 import gc
+import os
+import json
+import time
+import warnings
+import concurrent.futures
+from feature_store import FeatureStore, FeatureSequence
+from dataset_cache import DatasetCache
+from utils import feature_source
+from feature_screening import FeatureScreen, screen_features, screening_model_params, rfe_model_params
+
+### sklearn-style and other LightGBM aliases of the default parameters of TrainerLGBM
+default_param_aliases = {
+    "n_estimators": ["num_iterations", "num_iteration", "n_iter", "num_tree", "num_trees", "num_round", "num_rounds", "num_boost_round"],
+    "learning_rate": ["eta", "shrinkage_rate"],
+    "num_leaves": ["num_leaf", "max_leaves", "max_leaf", "max_leaf_nodes"],
+    "feature_fraction": ["colsample_bytree", "sub_feature"],
+}
 
 
 class TrainerLGBM:
@@ -17,15 +34,19 @@ class TrainerLGBM:
     Attributes:
         seed (int): Random seed for reproducibility.
         default_params (dict): Default hyperparameters for the models.
+        dataset_cache (Optional[DatasetCache]): Cache of binned datasets. If set, fit_kfold bins the data once
+            (or loads the bins from a previous run) and trains every fold on subsets of it.
     """
 
-    def __init__(self, seed: int) -> None:
+    def __init__(self, seed: int, dataset_cache_dir: Optional[str] = None) -> None:
         """
         Initializes the TrainerLGBM class with a seed and default parameters.
         Args:
             seed (int): The seed for random number generation to ensure reproducibility.
+            dataset_cache_dir (Optional[str]): Directory of the binned dataset cache. If None, datasets are not cached.
         """
         self.seed = seed
+        self.dataset_cache = DatasetCache(dataset_cache_dir) if dataset_cache_dir else None
         self.default_params = {
             "n_estimators": 100,
             "learning_rate": 0.1,
@@ -59,6 +80,24 @@ class TrainerLGBM:
         kf = KFold(n_splits=n_fold, shuffle=True, random_state=self.seed)
         return list(kf.split(full_df))
 
+    def merge_params(self, params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Override the default parameters with a caller's. A caller's alias of a default parameter (e.g. the sklearn
+        colsample_bytree for feature_fraction) replaces the default, which LightGBM would otherwise keep, as it
+        prefers the main name of a parameter over its aliases.
+        Args:
+            params (Optional[Dict[str, Any]]): The caller's parameters. If None, default parameters are used.
+        Returns:
+            Dict[str, Any]: The parameters.
+        """
+        effective_params = self.default_params.copy()
+        if params:
+            for name, aliases in default_param_aliases.items():
+                if any(alias in params for alias in aliases):
+                    effective_params.pop(name, None)
+            effective_params.update(params)
+        return effective_params
+
     def init_model(
         self, task_type: str, params: Optional[Dict[str, Any]] = None
     ) -> lgb.LGBMModel:
@@ -70,10 +109,7 @@ class TrainerLGBM:
         Returns:
             lgb.LGBMModel: The initialized LightGBM model.
         """
-        # If no parameters are provided, use the defaults
-        effective_params = self.default_params.copy()
-        if params:
-            effective_params.update(params)
+        effective_params = self.merge_params(params)
 
         if task_type == "regression":
             lgb_model = lgb.LGBMRegressor(**effective_params)
@@ -123,7 +159,7 @@ class TrainerLGBM:
 
     def predict(
         self,
-        model: lgb.LGBMModel,
+        model: Union[lgb.LGBMModel, lgb.Booster],
         data: pd.DataFrame,
         task_type: str,
         categoricals: List[str] = None,
@@ -131,7 +167,7 @@ class TrainerLGBM:
         """
         Make predictions using the trained LightGBM model.
         Args:
-            model (lgb.LGBMModel): The trained LightGBM model.
+            model (Union[lgb.LGBMModel, lgb.Booster]): The trained LightGBM model, or a booster trained with lgb.train.
             data (pd.DataFrame): The data on which to make predictions.
             task_type (str): The type of task ('classification' or 'regression').
             categoricals (List[str], optional): List of categorical feature names.
@@ -140,6 +176,13 @@ class TrainerLGBM:
         """
         if categoricals:
             data = self.validate_categoricals(data, categoricals)
+        if isinstance(model, lgb.Booster):
+            if task_type not in ["regression", "classification"]:
+                raise ValueError(f"Unsupported task type: {task_type}")
+            if isinstance(data, pd.DataFrame):
+                data = self.booster_matrix(model, data, categoricals)
+            # binary boosters already predict the probability of the positive class
+            return model.predict(data, num_iteration=model.best_iteration)
         if task_type == "regression":
             return model.predict(data)
         elif task_type == "classification":
@@ -174,24 +217,134 @@ class TrainerLGBM:
         sub_preds = np.mean(sub_preds, axis=0)
         return pd.DataFrame({"id": id, "preds": sub_preds})
 
+    def booster_matrix(
+        self,
+        booster: lgb.Booster,
+        data: pd.DataFrame,
+        categoricals: Optional[List[str]] = None,
+        dtype: type = np.float64,
+    ) -> np.ndarray:
+        """
+        Convert a frame to the numeric matrix a booster predicts from.
+
+        Boosters trained on raw categorical codes take the values as they are. Boosters trained on pandas category
+        columns (the sklearn models of fit_kfold) split on the positions of the values in their training categories,
+        stored in booster.pandas_categorical, so those columns are mapped to positions, with unseen and missing
+        values as NaN, as LightGBM does for pandas input.
+        Args:
+            booster (lgb.Booster): The booster.
+            data (pd.DataFrame): The rows, with at least the booster's features.
+            categoricals (Optional[List[str]]): The categorical features. If None, the category-dtype columns.
+            dtype (type): The matrix dtype.
+        Returns:
+            np.ndarray: The contiguous (n_rows, n_features) matrix, in booster feature order.
+        """
+        features = booster.feature_name()
+        frame = data[features]
+        categories = booster.pandas_categorical or []
+        if categories:
+            if categoricals is None:
+                categoricals = [column for column in features if isinstance(frame[column].dtype, pd.CategoricalDtype)]
+            cat_features = [column for column in features if column in set(categoricals)]
+            if len(cat_features) != len(categories):
+                raise ValueError(
+                    f"The booster was trained on {len(categories)} categorical features, got {len(cat_features)}"
+                )
+            frame = frame.copy()
+            for column, column_categories in zip(cat_features, categories):
+                codes = pd.Categorical(frame[column], categories=column_categories).codes.astype(np.float64)
+                codes[codes < 0] = np.nan
+                frame[column] = codes
+        return np.ascontiguousarray(frame.to_numpy(dtype=dtype))
+
+    def explain(
+        self,
+        models: List[Union[lgb.LGBMModel, lgb.Booster]],
+        data: Union[pd.DataFrame, np.ndarray],
+        top_n: int = 5,
+        n_threads: Optional[int] = None,
+        latency_ms: Optional[float] = None,
+        categoricals: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Compute reason codes: the features pushing the prediction of every row up the most, by their SHAP values
+        averaged over the fold models.
+
+        The batch is converted once to a contiguous float32 matrix (with categoricals mapped as in booster_matrix),
+        every model adds its contributions to one buffer, and the top features are found with a partial sort, so the
+        cost is dominated by the tree traversals. Contributions are on the raw score (log-odds for classification),
+        where averaging the fold models is exact.
+        Args:
+            models (List[Union[lgb.LGBMModel, lgb.Booster]]): The fold models.
+            data (Union[pd.DataFrame, np.ndarray]): The rows to explain; an array must have the models' features in
+                order, with categoricals already as the boosters expect them.
+            top_n (int): Number of reasons per row.
+            n_threads (Optional[int]): Number of LightGBM threads. Defaults to LightGBM's default.
+            latency_ms (Optional[float]): Latency target of the batch; a warning is raised when it is exceeded.
+            categoricals (Optional[List[str]]): The categorical features of a DataFrame. If None, its category-dtype
+                columns.
+        Returns:
+            pd.DataFrame: Per row, the base value, the raw score and, for every reason, the feature, its source
+            processor, its value and its contribution.
+        """
+        start = time.perf_counter()
+        boosters = [self.get_booster(model) for model in models]
+        features = boosters[0].feature_name()
+        # reported values are the raw ones; the matrices fed to the boosters are built once per category mapping
+        matrices = {}
+        if isinstance(data, pd.DataFrame):
+            values = data[features].to_numpy(dtype=np.float32)
+            for booster in boosters:
+                key = json.dumps(booster.pandas_categorical)
+                if key not in matrices:
+                    matrices[key] = self.booster_matrix(booster, data, categoricals, np.float32)
+        else:
+            values = np.ascontiguousarray(data, dtype=np.float32)
+        predict_params = {"num_threads": n_threads} if n_threads else {}
+        contribs = np.zeros((len(values), len(features) + 1))
+        for booster in boosters:
+            matrix = matrices.get(json.dumps(booster.pandas_categorical), values)
+            contribs += booster.predict(matrix, pred_contrib=True, **predict_params)
+        contribs /= len(boosters)
+
+        top_n = min(top_n, len(features))
+        feature_contribs = contribs[:, :-1]
+        top = np.argpartition(-feature_contribs, top_n - 1, axis=1)[:, :top_n]
+        order = np.argsort(-np.take_along_axis(feature_contribs, top, axis=1), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        names = np.array(features, dtype=object)
+        sources = np.array([feature_source(feature) for feature in features], dtype=object)
+        reasons = {"base_value": contribs[:, -1], "raw_score": contribs.sum(axis=1)}
+        for rank in range(top_n):
+            column = top[:, rank]
+            reasons[f"reason_{rank + 1}"] = names[column]
+            reasons[f"reason_{rank + 1}_source"] = sources[column]
+            reasons[f"reason_{rank + 1}_value"] = values[np.arange(len(values)), column]
+            reasons[f"reason_{rank + 1}_contribution"] = feature_contribs[np.arange(len(values)), column]
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if latency_ms is not None and elapsed_ms > latency_ms:
+            warnings.warn(f"Explaining {len(values)} rows took {elapsed_ms:.1f} ms, above the {latency_ms} ms target")
+        return pd.DataFrame(reasons)
+
     def plot_importances(
         self,
-        model: lgb.LGBMModel,
+        model: Union[lgb.LGBMModel, lgb.Booster],
         n_top_feats: int = 25,
         figsize: Tuple[int, int] = (10, 5),
     ) -> None:
         """
         Plot the feature importances of the trained model.
         Args:
-            model (lgb.LGBMModel): The trained LightGBM model.
+            model (Union[lgb.LGBMModel, lgb.Booster]): The trained LightGBM model.
             n_top_feats (int): Number of top features to display in the plot. Defaults to 25.
             figsize (Tuple[int, int]): The size of the plot. Defaults to (10, 5).
         """
+        booster = self.get_booster(model)
         feature_imp = pd.DataFrame(
             sorted(
                 zip(
-                    model.booster_.feature_importance(importance_type="gain"),
-                    model.booster_.feature_name(),
+                    booster.feature_importance(importance_type="gain"),
+                    booster.feature_name(),
                 )
             ),
             columns=["Value", "Feature"],
@@ -208,6 +361,17 @@ class TrainerLGBM:
         plt.tight_layout()
         plt.show()
 
+    @staticmethod
+    def get_booster(model: Union[lgb.LGBMModel, lgb.Booster]) -> lgb.Booster:
+        """
+        Returns the booster of a model trained either through the sklearn API or with lgb.train.
+        Args:
+            model (Union[lgb.LGBMModel, lgb.Booster]): The trained model.
+        Returns:
+            lgb.Booster: The booster.
+        """
+        return model if isinstance(model, lgb.Booster) else model.booster_
+
     def validate_categoricals(
         self, full_df: pd.DataFrame, categoricals: List[str]
     ) -> pd.DataFrame:
@@ -251,6 +415,17 @@ class TrainerLGBM:
         Returns:
             Tuple[List[lgb.LGBMModel], np.ndarray, float]: A tuple containing the list of trained models, out-of-fold predictions, and validation score.
         """
+        if self.dataset_cache is not None:
+            full_set = self.dataset_cache.dataset(full_df, features, full_df[target].values, categoricals, params)
+            return self.fit_kfold_dataset(
+                full_set,
+                lambda booster, val_idx: self.predict(booster, full_df.iloc[val_idx][features], task_type),
+                task_type,
+                params,
+                eval_metric,
+                n_fold,
+                print_results,
+            )
         if categoricals:
             full_df = self.validate_categoricals(full_df, categoricals)
         tr_val_idx = self.set_tr_val_indexes(full_df, n_fold)
@@ -274,6 +449,150 @@ class TrainerLGBM:
             print(f"Overall {eval_metric}", val_score)
         return models, val_preds, val_score
 
+    def train_params(self, task_type: str, params: Optional[Dict[str, Any]], eval_metric: str) -> Dict[str, Any]:
+        """
+        Build lgb.train parameters equivalent to the sklearn models of init_model.
+        Args:
+            task_type (str): The type of task ('classification' or 'regression').
+            params (Optional[Dict[str, Any]]): Additional parameters for the model. If None, default parameters are used.
+            eval_metric (str): The evaluation metric to use.
+        Returns:
+            Dict[str, Any]: The parameters.
+        """
+        objectives = {"classification": "binary", "regression": "regression"}
+        if task_type not in objectives:
+            raise ValueError(f"Unsupported task type: {task_type}")
+        effective_params = self.merge_params(params)
+        effective_params.update(
+            {"objective": objectives[task_type], "metric": eval_metric, "seed": self.seed, "verbosity": -1}
+        )
+        return effective_params
+
+    def predict_store(
+        self,
+        model: Union[lgb.LGBMModel, lgb.Booster],
+        store: FeatureStore,
+        rows: np.ndarray,
+        task_type: str,
+        chunk_size: int = 50000,
+    ) -> np.ndarray:
+        """
+        Make predictions for rows of a feature store, reading them in chunks.
+        Args:
+            model (Union[lgb.LGBMModel, lgb.Booster]): The trained model.
+            store (FeatureStore): The feature store.
+            rows (np.ndarray): The rows to predict.
+            task_type (str): The type of task ('classification' or 'regression').
+            chunk_size (int): Number of rows read at once.
+        Returns:
+            np.ndarray: The predicted values.
+        """
+        return np.concatenate(
+            [
+                self.predict(model, store.read_rows(rows[start : start + chunk_size]), task_type)
+                for start in range(0, len(rows), chunk_size)
+            ]
+        )
+
+    def fit_kfold_store(
+        self,
+        store: FeatureStore,
+        y: np.ndarray,
+        task_type: str,
+        params: dict,
+        eval_metric: str,
+        n_fold: int,
+        print_results: bool = True,
+    ) -> Tuple[List[lgb.Booster], np.ndarray, np.float64]:
+        """
+        Perform K-fold cross-validation on a disk-backed feature store, for datasets that do not fit in memory.
+
+        The LightGBM Dataset of all labelled rows is built once, in chunks, from the memory-mapped matrix; the folds
+        are subsets of it sharing its bins, so the raw features are never fully loaded.
+        Args:
+            store (FeatureStore): The feature store, whose first len(y) rows are labelled.
+            y (np.ndarray): The target values.
+            task_type (str): The type of task ('classification' or 'regression').
+            params (Dict[str, Any]): Parameters for the LightGBM model.
+            eval_metric (str): The evaluation metric to use.
+            n_fold (int): The number of folds for cross-validation.
+            print_results (bool): Whether to print results and plot feature importances. Defaults to True.
+        Returns:
+            Tuple[List[lgb.Booster], np.ndarray, float]: A tuple containing the list of trained boosters, out-of-fold predictions, and validation score.
+        """
+        full_set = lgb.Dataset(
+            FeatureSequence(store, np.arange(y.shape[0])),
+            label=y,
+            feature_name=[str(column) for column in store.columns],
+            categorical_feature=store.categoricals or "auto",
+            params=DatasetCache.binning_params(params),
+            free_raw_data=False,
+        ).construct()
+        return self.fit_kfold_dataset(
+            full_set,
+            lambda booster, val_idx: self.predict_store(booster, store, val_idx, task_type),
+            task_type,
+            params,
+            eval_metric,
+            n_fold,
+            print_results,
+        )
+
+    def fit_kfold_dataset(
+        self,
+        full_set: lgb.Dataset,
+        predict_rows: Callable[[lgb.Booster, np.ndarray], np.ndarray],
+        task_type: str,
+        params: dict,
+        eval_metric: str,
+        n_fold: int,
+        print_results: bool = True,
+        tr_val_idx: Optional[List[Tuple[np.ndarray, np.ndarray]]] = None,
+    ) -> Tuple[List[lgb.Booster], np.ndarray, np.float64]:
+        """
+        Perform K-fold cross-validation on a constructed Dataset, training every fold on subsets sharing its bins.
+        Args:
+            full_set (lgb.Dataset): The constructed Dataset of all labelled rows.
+            predict_rows (Callable[[lgb.Booster, np.ndarray], np.ndarray]): Predicts rows of the data with a booster.
+            task_type (str): The type of task ('classification' or 'regression').
+            params (Dict[str, Any]): Parameters for the LightGBM model.
+            eval_metric (str): The evaluation metric to use.
+            n_fold (int): The number of folds for cross-validation.
+            print_results (bool): Whether to print results and plot feature importances. Defaults to True.
+            tr_val_idx (Optional[List[Tuple[np.ndarray, np.ndarray]]]): Train and validation rows of every fold, e.g.
+                grouped by customer. If None, rows are split with set_tr_val_indexes.
+        Returns:
+            Tuple[List[lgb.Booster], np.ndarray, float]: A tuple containing the list of trained boosters, out-of-fold predictions, and validation score.
+        """
+        rows = np.arange(full_set.num_data())
+        if tr_val_idx is None:
+            tr_val_idx = self.set_tr_val_indexes(rows, n_fold)
+        train_params = self.train_params(task_type, params, eval_metric)
+        val_preds = np.zeros(len(rows))
+        models = []
+        val_score = 0
+        for i, (tr_idx, val_idx) in enumerate(tr_val_idx):
+            print("FOLD", i)
+            train_set, val_set = full_set.subset(tr_idx), full_set.subset(val_idx)
+            booster = lgb.train(
+                train_params,
+                train_set,
+                valid_sets=[train_set, val_set],
+                valid_names=["valid_0", "valid_1"],
+                callbacks=[lgb.early_stopping(20), lgb.log_evaluation(20)],
+            )
+            if print_results:
+                self.plot_importances(booster)
+            models.append(booster)
+            val_preds[val_idx] = predict_rows(booster, val_idx)
+            cur_score = booster.best_score["valid_1"][eval_metric]
+            val_score += cur_score / n_fold
+            del train_set, val_set
+            gc.collect()
+        if print_results:
+            print(f"Overall {eval_metric}", val_score)
+        return models, val_preds, val_score
+
     def find_unimportant_features(
         self,
         full_df: pd.DataFrame,
@@ -313,10 +632,11 @@ class TrainerLGBM:
         )
         unimportant_features = set()
         for model in models:
+            booster = self.get_booster(model)
             feat_imp_df = pd.DataFrame(
                 {
-                    "Feature": model.booster_.feature_name(),
-                    "Value": model.booster_.feature_importance(importance_type="gain"),
+                    "Feature": booster.feature_name(),
+                    "Value": booster.feature_importance(importance_type="gain"),
                 }
             )
             zero_importance_features = feat_imp_df[feat_imp_df["Value"] == 0][
@@ -328,6 +648,417 @@ class TrainerLGBM:
                 file.write(item)
         return list(unimportant_features)
 
+    def feature_importances(self, models: List[Union[lgb.LGBMModel, lgb.Booster]]) -> pd.Series:
+        """
+        Average the gain importance of every feature over the fold models.
+        Args:
+            models (List[Union[lgb.LGBMModel, lgb.Booster]]): The fold models.
+        Returns:
+            pd.Series: Mean gain by feature name.
+        """
+        importances = [
+            pd.Series(self.get_booster(model).feature_importance(importance_type="gain"), index=self.get_booster(model).feature_name())
+            for model in models
+        ]
+        return pd.concat(importances, axis=1).fillna(0).mean(axis=1)
+
+    @staticmethod
+    def select_features_under_budget(
+        importances: pd.Series, feature_costs: Dict[str, float], budget_seconds: float
+    ) -> Tuple[List[str], List[str], float]:
+        """
+        Select the features with the most importance per second of feature engineering, within a compute budget.
+
+        Features without a recorded cost (e.g. from the main table) are free; zero-gain features are always dropped.
+        The costed features are taken greedily by decreasing gain per second while the budget allows.
+        Args:
+            importances (pd.Series): Gain by feature name.
+            feature_costs (Dict[str, float]): Estimated compute seconds by feature name, from the cost ledger.
+            budget_seconds (float): The compute budget of the costed features.
+        Returns:
+            Tuple[List[str], List[str], float]: The selected features, the dropped features and the expected compute seconds of the selection.
+        """
+        useful = importances[importances > 0]
+        selected = [feature for feature in useful.index if feature not in feature_costs]
+        costed = useful[[feature for feature in useful.index if feature in feature_costs]]
+        costs = pd.Series({feature: feature_costs[feature] for feature in costed.index}, dtype=np.float64)
+        ratio = costed / costs.clip(lower=1e-9)
+        expected_seconds = 0.0
+        for feature in ratio.sort_values(ascending=False).index:
+            if expected_seconds + costs[feature] <= budget_seconds:
+                selected.append(feature)
+                expected_seconds += costs[feature]
+        kept = set(selected)
+        dropped = [feature for feature in importances.index if feature not in kept]
+        return selected, dropped, expected_seconds
+
+    def find_features_under_budget(
+        self,
+        full_df: pd.DataFrame,
+        task_type: str,
+        params: dict,
+        features: List[str],
+        target: str,
+        eval_metric: str,
+        n_fold: int,
+        feature_costs: Dict[str, float],
+        budget_seconds: float,
+        categoricals: List[str] = None,
+        output_dir: str = ".",
+    ) -> List[str]:
+        """
+        Find the features to drop so that feature engineering fits a compute budget, keeping the most important
+        features per second of compute. The dropped features are saved to unimportant_features.txt, and the selection
+        and its expected compute time to feature_budget.json.
+        Args:
+            full_df (pd.DataFrame): The full dataset.
+            task_type (str): The type of task ('classification' or 'regression').
+            params (Dict[str, Any]): Parameters for the LightGBM model.
+            features (List[str]): List of feature names used for training.
+            target (str): The target variable name.
+            eval_metric (str): The evaluation metric to use.
+            n_fold (int): The number of folds for cross-validation.
+            feature_costs (Dict[str, float]): Estimated compute seconds by feature name, from the cost ledger.
+            budget_seconds (float): The compute budget of the costed features.
+            categoricals (List[str], optional): List of categorical feature names.
+            output_dir (str): Directory of the saved files, e.g. the optimization settings directory.
+        Returns:
+            List[str]: The features to drop.
+        """
+        models, _, _ = self.fit_kfold(
+            full_df, task_type, params, features, target, eval_metric, n_fold, False, categoricals
+        )
+        importances = self.feature_importances(models).reindex(features, fill_value=0)
+        selected, dropped, expected_seconds = self.select_features_under_budget(
+            importances, feature_costs, budget_seconds
+        )
+        total_seconds = sum(feature_costs.get(feature, 0.0) for feature in features)
+        print(
+            f"Budgeted selection: {len(selected)} features kept, {len(dropped)} dropped, "
+            f"expected aggregation time {expected_seconds:.1f}s of {total_seconds:.1f}s"
+        )
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, "unimportant_features.txt"), "w") as file:
+            file.write("\n".join(dropped))
+        with open(os.path.join(output_dir, "feature_budget.json"), "w") as file:
+            json.dump(
+                {
+                    "budget_seconds": budget_seconds,
+                    "expected_seconds": expected_seconds,
+                    "selected_features": selected,
+                    "unimportant_features": dropped,
+                },
+                file,
+                indent=1,
+            )
+        return dropped
+
+    def find_screened_features(
+        self,
+        full_df: pd.DataFrame,
+        task_type: str,
+        params: dict,
+        features: List[str],
+        target: str,
+        eval_metric: str,
+        n_fold: int,
+        screening: str,
+        categoricals: List[str] = None,
+    ) -> List[str]:
+        """
+        Find features that are no more important than noise, by null importance or permutation importance.
+        The ranking is saved to feature_ranking.csv.
+        Args:
+            full_df (pd.DataFrame): The full dataset.
+            task_type (str): The type of task ('classification' or 'regression').
+            params (Dict[str, Any]): Parameters overriding the screening models' defaults.
+            features (List[str]): List of feature names used for training.
+            target (str): The target variable name.
+            eval_metric (str): The evaluation metric to use.
+            n_fold (int): The number of folds of the permutation importance.
+            screening (str): 'null' or 'permutation'.
+            categoricals (List[str], optional): List of categorical feature names.
+        Returns:
+            List[str]: The features scoring at most 0.
+        """
+        screen_params = {**screening_model_params, **(params or {})}
+        screen = FeatureScreen(task_type, eval_metric, self.train_params(task_type, screen_params, eval_metric), seed=self.seed)
+
+        def fit_folds(full_set: lgb.Dataset) -> Tuple[List[lgb.Booster], List[Tuple[np.ndarray, np.ndarray]]]:
+            tr_val_idx = self.set_tr_val_indexes(np.arange(full_set.num_data()), n_fold)
+            # the out-of-fold predictions are not needed, only the fold models
+            models, _, _ = self.fit_kfold_dataset(
+                full_set,
+                lambda booster, val_idx: np.zeros(len(val_idx)),
+                task_type,
+                screen_params,
+                eval_metric,
+                n_fold,
+                False,
+                tr_val_idx,
+            )
+            return models, tr_val_idx
+
+        ranking = screen_features(
+            screen, screening, full_df, list(features), target, categoricals, self.dataset_cache, fit_folds
+        )
+        ranking.rename("score").to_frame().to_csv("feature_ranking.csv", index_label="feature")
+        unimportant_features = ranking[ranking <= 0].index.tolist()
+        print(f"{screening} importance screening: {len(unimportant_features)} of {len(ranking)} features dropped")
+        with open("unimportant_features.txt", "w") as file:
+            file.write("\n".join(unimportant_features))
+        return unimportant_features
+
+    def binned_dataset(
+        self,
+        full_df: pd.DataFrame,
+        features: List[str],
+        label: np.ndarray,
+        categoricals: Optional[List[str]],
+        params: Optional[Dict[str, Any]],
+    ) -> lgb.Dataset:
+        """
+        Bin the data into a constructed Dataset, through the dataset cache if there is one.
+        Categoricals are passed as their integer codes, so boosters trained on it predict from numeric matrices.
+        Args:
+            full_df (pd.DataFrame): The data.
+            features (List[str]): The feature columns, in order.
+            label (np.ndarray): The target values.
+            categoricals (Optional[List[str]]): The categorical features.
+            params (Optional[Dict[str, Any]]): Model parameters, of which the binning ones are used.
+        Returns:
+            lgb.Dataset: The constructed Dataset, whose subsets share its bins.
+        """
+        if self.dataset_cache is not None:
+            return self.dataset_cache.dataset(full_df, features, label, categoricals, params)
+        cats = [column for column in categoricals or [] if column in set(features)]
+        return lgb.Dataset(
+            full_df[features].astype({column: np.float64 for column in cats}),
+            label=label,
+            categorical_feature=cats or "auto",
+            params=DatasetCache.binning_params(params),
+            free_raw_data=False,
+        ).construct()
+
+    def fit_bagged(
+        self,
+        full_df: pd.DataFrame,
+        task_type: str,
+        params: dict,
+        features: List[str],
+        target: str,
+        eval_metric: str,
+        n_fold: int,
+        seeds: List[int],
+        test_df: Optional[pd.DataFrame] = None,
+        categoricals: List[str] = None,
+        n_threads: Optional[int] = None,
+        n_concurrent: int = 4,
+        chunk_size: int = 50000,
+    ) -> Tuple[List[lgb.Booster], np.ndarray, Optional[np.ndarray], Dict[int, float]]:
+        """
+        Average K-fold cross-validations over several seeds, training all seeds x folds models concurrently.
+
+        The data is binned once; every seed has its own fold plan, whose subsets share the bins. LightGBM releases
+        the GIL while boosting, so the models train in threads, each on an equal share of the thread budget. No
+        dense copy of the data is kept: every model predicts its validation rows and the test rows from chunks of
+        the frames.
+        Args:
+            full_df (pd.DataFrame): The full dataset.
+            task_type (str): The type of task ('classification' or 'regression').
+            params (Dict[str, Any]): Parameters for the LightGBM model.
+            features (List[str]): List of feature names used for training.
+            target (str): The target variable name.
+            eval_metric (str): The evaluation metric to use.
+            n_fold (int): The number of folds for cross-validation.
+            seeds (List[int]): The seeds of the folds and models.
+            test_df (Optional[pd.DataFrame]): Rows to predict with every model, if any.
+            categoricals (List[str], optional): List of categorical feature names.
+            n_threads (Optional[int]): Total number of threads. Defaults to the number of cores.
+            n_concurrent (int): Number of models trained at once.
+            chunk_size (int): Number of rows predicted at once.
+        Returns:
+            Tuple[List[lgb.Booster], np.ndarray, Optional[np.ndarray], Dict[int, float]]: The boosters of all seeds x
+            folds (trained on raw categorical codes), the out-of-fold predictions averaged over the seeds, the test
+            predictions averaged over all models, and the validation score of every seed.
+        """
+        features = list(features)
+        full_set = self.binned_dataset(full_df, features, full_df[target].values, categoricals, params)
+        threads_per_model = max(1, (n_threads or os.cpu_count() or 1) // n_concurrent)
+
+        base_seed = self.seed
+        jobs = []
+        for seed in seeds:
+            for tr_idx, val_idx in self.set_seed(seed).set_tr_val_indexes(np.arange(full_set.num_data()), n_fold):
+                train_params = {**self.train_params(task_type, params, eval_metric), "num_threads": threads_per_model}
+                jobs.append((seed, tr_idx, val_idx, train_params))
+        self.set_seed(base_seed)
+
+        def train_fold(job: Tuple[int, np.ndarray, np.ndarray, Dict[str, Any]]) -> Tuple[int, lgb.Booster, np.ndarray, np.ndarray, Optional[np.ndarray], float]:
+            seed, tr_idx, val_idx, train_params = job
+            # subsets only read the shared bins, and are freed with the thread's model
+            train_set, val_set = full_set.subset(tr_idx), full_set.subset(val_idx)
+            booster = lgb.train(
+                train_params,
+                train_set,
+                valid_sets=[train_set, val_set],
+                valid_names=["valid_0", "valid_1"],
+                callbacks=[lgb.early_stopping(20, verbose=False)],
+            )
+
+            def predict(frame: pd.DataFrame, rows: np.ndarray) -> np.ndarray:
+                return np.concatenate(
+                    [
+                        booster.predict(
+                            self.booster_matrix(booster, frame.iloc[rows[start : start + chunk_size]], categoricals),
+                            num_iteration=booster.best_iteration,
+                            num_threads=threads_per_model,
+                        )
+                        for start in range(0, len(rows), chunk_size)
+                    ]
+                    or [np.zeros(0)]
+                )
+
+            test_preds = predict(test_df, np.arange(len(test_df))) if test_df is not None else None
+            val_preds = predict(full_df, val_idx)
+            return seed, booster, val_idx, val_preds, test_preds, booster.best_score["valid_1"][eval_metric]
+
+        seed_preds = {seed: np.zeros(len(full_df)) for seed in seeds}
+        seed_scores = {seed: 0.0 for seed in seeds}
+        test_preds = np.zeros(len(test_df)) if test_df is not None else None
+        boosters = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=n_concurrent) as executor:
+            for seed, booster, val_idx, val_preds, fold_test_preds, score in executor.map(train_fold, jobs):
+                boosters.append(booster)
+                seed_preds[seed][val_idx] = val_preds
+                seed_scores[seed] += score / n_fold
+                if test_preds is not None:
+                    test_preds += fold_test_preds / len(jobs)
+                print(f"Seed {seed} fold {eval_metric}: {score}")
+        gc.collect()
+        print(f"Bagged {eval_metric} by seed", seed_scores)
+        return boosters, np.mean([seed_preds[seed] for seed in seeds], axis=0), test_preds, seed_scores
+
+    def fit_rfe(
+        self,
+        full_df: pd.DataFrame,
+        task_type: str,
+        params: dict,
+        features: List[str],
+        target: str,
+        eval_metric: str,
+        n_fold: int,
+        step: int = 100,
+        min_features: int = 50,
+        categoricals: List[str] = None,
+        rebin_fraction: float = 0.5,
+    ) -> Tuple[pd.DataFrame, List[str]]:
+        """
+        Recursive feature elimination: every round trains the folds on the kept features and removes the step
+        features with the lowest mean gain.
+
+        Rounds train on one binned Dataset and its fold subsets, and restrict the boosters to the kept columns with
+        a single interaction constraint group: features outside every group are never split on. LightGBM still builds
+        histograms of the excluded columns, so once the kept features fall below rebin_fraction of the binned ones,
+        the Dataset is binned again on the kept columns only.
+        Args:
+            full_df (pd.DataFrame): The full dataset.
+            task_type (str): The type of task ('classification' or 'regression').
+            params (Dict[str, Any]): Parameters overriding the elimination models' defaults.
+            features (List[str]): List of feature names used for training.
+            target (str): The target variable name.
+            eval_metric (str): The evaluation metric to use.
+            n_fold (int): The number of folds for cross-validation.
+            step (int): Number of features removed per round.
+            min_features (int): Number of features below which elimination stops.
+            categoricals (List[str], optional): List of categorical feature names.
+            rebin_fraction (float): Share of the binned features below which the kept ones are binned again.
+        Returns:
+            Tuple[pd.DataFrame, List[str]]: The score and mean best iteration by number of features, and the
+            features of the best scoring round.
+        """
+        features = list(features)
+        rfe_params = {**rfe_model_params, **(params or {})}
+        label = full_df[target].values
+        tr_val_idx = self.set_tr_val_indexes(np.arange(len(full_df)), n_fold)
+        train_params = self.train_params(task_type, rfe_params, eval_metric)
+        higher_is_better = eval_metric in ["accuracy", "f1", "auc"]
+
+        kept = np.arange(len(features))
+        binned = np.array([], dtype=int)
+        curve, rounds = [], []
+        while True:
+            if len(binned) == 0 or len(kept) < rebin_fraction * len(binned):
+                binned = kept
+                full_set = self.binned_dataset(
+                    full_df, [features[column] for column in binned], label, categoricals, rfe_params
+                )
+                fold_sets = [(full_set.subset(tr_idx), full_set.subset(val_idx)) for tr_idx, val_idx in tr_val_idx]
+            round_params = dict(train_params)
+            if len(kept) < len(binned):
+                # both are sorted, so the kept features are found at these positions of the binned columns
+                round_params["interaction_constraints"] = [np.searchsorted(binned, kept).tolist()]
+            gains, score, iterations = np.zeros(len(features)), 0.0, 0.0
+            for train_set, val_set in fold_sets:
+                booster = lgb.train(
+                    round_params,
+                    train_set,
+                    valid_sets=[train_set, val_set],
+                    valid_names=["valid_0", "valid_1"],
+                    callbacks=[lgb.early_stopping(20, verbose=False)],
+                )
+                gains[binned] += booster.feature_importance(importance_type="gain") / n_fold
+                score += booster.best_score["valid_1"][eval_metric] / n_fold
+                iterations += booster.best_iteration / n_fold
+            print(f"RFE: {len(kept)} features, {eval_metric} {score:.5f}")
+            curve.append({"n_features": len(kept), "score": score, "best_iteration": iterations})
+            rounds.append(kept)
+            if len(kept) <= min_features:
+                break
+            n_removed = min(step, len(kept) - min_features)
+            kept = np.sort(kept[np.argsort(gains[kept], kind="stable")[n_removed:]])
+            gc.collect()
+
+        curve = pd.DataFrame(curve)
+        best = int(curve["score"].idxmax() if higher_is_better else curve["score"].idxmin())
+        return curve, [features[column] for column in rounds[best]]
+
+    def find_features_rfe(
+        self,
+        full_df: pd.DataFrame,
+        task_type: str,
+        params: dict,
+        features: List[str],
+        target: str,
+        eval_metric: str,
+        n_fold: int,
+        categoricals: List[str] = None,
+    ) -> List[str]:
+        """
+        Find the features eliminated before the best round of recursive feature elimination.
+        The score-versus-feature-count curve is saved to rfe_curve.csv.
+        Args:
+            full_df (pd.DataFrame): The full dataset.
+            task_type (str): The type of task ('classification' or 'regression').
+            params (Dict[str, Any]): Parameters overriding the elimination models' defaults.
+            features (List[str]): List of feature names used for training.
+            target (str): The target variable name.
+            eval_metric (str): The evaluation metric to use.
+            n_fold (int): The number of folds for cross-validation.
+            categoricals (List[str], optional): List of categorical feature names.
+        Returns:
+            List[str]: The eliminated features.
+        """
+        curve, selected = self.fit_rfe(
+            full_df, task_type, params, features, target, eval_metric, n_fold, categoricals=categoricals
+        )
+        curve.to_csv("rfe_curve.csv", index=False)
+        kept = set(selected)
+        unimportant_features = [feature for feature in features if feature not in kept]
+        with open("unimportant_features.txt", "w") as file:
+            file.write("\n".join(unimportant_features))
+        return unimportant_features
+
     def optimize_hyperparameters(
         self,
         full_df: pd.DataFrame,
@@ -401,6 +1132,10 @@ class TrainerLGBM:
         n_trials: int,
         timeout: Optional[int],
         categoricals: List[str] = None,
+        feature_costs: Optional[Dict[str, float]] = None,
+        budget_seconds: Optional[float] = None,
+        screening: Optional[str] = None,
+        output_dir: str = ".",
     ) -> Tuple[List, dict]:
         """
         Find unimportant features and search for the best hyperparameters sequentially
@@ -414,20 +1149,64 @@ class TrainerLGBM:
             n_trials (int): Number of trials for optimization.
             timeout (int): Time in seconds to timeout the optimization.
             categoricals (List[str], optional): List of categorical feature names.
+            feature_costs (Optional[Dict[str, float]]): Estimated compute seconds by feature name. If given with
+                budget_seconds, features are selected by importance per second within the budget.
+            budget_seconds (Optional[float]): The compute budget of the costed features.
+            screening (Optional[str]): 'null' or 'permutation' to screen features by null or permutation importance,
+                or 'rfe' to keep the best round of recursive feature elimination, instead of dropping zero-gain features.
+            output_dir (str): Directory of the files saved by the budgeted selection.
 
         Returns:
             Tuple[List, dict]: A tuple containing unimportant features and the best hyperparameters found
         """
-        unimportant_features = self.find_unimportant_features(
-            full_df,
-            task_type,
-            params,
-            features,
-            target,
-            eval_metric,
-            n_fold,
-            categoricals,
-        )
+        if feature_costs is not None and budget_seconds is not None:
+            unimportant_features = self.find_features_under_budget(
+                full_df,
+                task_type,
+                params,
+                features,
+                target,
+                eval_metric,
+                n_fold,
+                feature_costs,
+                budget_seconds,
+                categoricals,
+                output_dir,
+            )
+        elif screening == "rfe":
+            unimportant_features = self.find_features_rfe(
+                full_df,
+                task_type,
+                params,
+                features,
+                target,
+                eval_metric,
+                n_fold,
+                categoricals,
+            )
+        elif screening is not None:
+            unimportant_features = self.find_screened_features(
+                full_df,
+                task_type,
+                params,
+                features,
+                target,
+                eval_metric,
+                n_fold,
+                screening,
+                categoricals,
+            )
+        else:
+            unimportant_features = self.find_unimportant_features(
+                full_df,
+                task_type,
+                params,
+                features,
+                target,
+                eval_metric,
+                n_fold,
+                categoricals,
+            )
         full_df.drop(columns=unimportant_features, inplace=True)
         best_params = self.optimize_hyperparameters(
             full_df,
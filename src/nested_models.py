@@ -0,0 +1,207 @@
+import gc
+import concurrent.futures
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+from sklearn.model_selection import KFold
+from utils import reduce_column_names
+from feature_plan import FeaturePlan, plan_agg_map
+from data_processors import aggregation_recipes, InstallmentsPaymentsData
+from models import TrainerLGBM
+from dataset_cache import DatasetCache
+
+### row-level features of the nested installments model, as derived by InstallmentsPaymentsData.preprocess_data
+nested_features = {
+    "installments_payments": [
+        "NUM_INSTALMENT_VERSION",
+        "NUM_INSTALMENT_NUMBER",
+        "DAYS_INSTALMENT",
+        "DAYS_ENTRY_PAYMENT",
+        "AMT_INSTALMENT",
+        "AMT_PAYMENT",
+        "delay",
+        "lacking_money",
+        "surplus_money",
+        "lacking_money_ratio",
+        "surplus_money_ratio",
+        "delay_money",
+        "advance_money",
+    ],
+}
+
+### the row-level signal is weak and noisy, so leaves are kept large
+nested_model_params = {
+    "n_estimators": 300,
+    "learning_rate": 0.05,
+    "num_leaves": 31,
+    "min_child_samples": 500,
+    "subsample": 0.8,
+    "subsample_freq": 1,
+    "colsample_bytree": 0.8,
+}
+
+
+def predict_batched(
+    models: List[lgb.Booster],
+    data: np.ndarray,
+    rows: np.ndarray,
+    chunk_rows: int = 500_000,
+    n_threads: int = 4,
+) -> np.ndarray:
+    """
+    Averages the predictions of boosters over rows of a matrix, predicting chunks of rows in parallel threads.
+
+    LightGBM releases the GIL while predicting, so every thread runs a single-threaded prediction of its own chunk
+    and the rows are never copied all at once.
+
+    Args:
+        models (List[lgb.Booster]): The boosters to average.
+        data (np.ndarray): The row-level feature matrix.
+        rows (np.ndarray): The rows to predict.
+        chunk_rows (int): Number of rows per chunk.
+        n_threads (int): Number of prediction threads.
+
+    Returns:
+        np.ndarray: The average prediction of every row.
+    """
+
+    def predict_chunk(start: int) -> Tuple[int, np.ndarray]:
+        chunk = data[rows[start : start + chunk_rows]]
+        preds = [model.predict(chunk, num_iteration=model.best_iteration, num_threads=1) for model in models]
+        return start, np.mean(preds, axis=0)
+
+    preds = np.zeros(len(rows))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_threads) as executor:
+        for start, chunk_preds in executor.map(predict_chunk, range(0, len(rows), chunk_rows)):
+            preds[start : start + chunk_rows] = chunk_preds
+    return preds
+
+
+class NestedInstallmentsModel:
+    """
+    The nested model stage of the README: a model trained on individual installment payments, each labelled with the
+    TARGET of its customer, whose row-level predictions are aggregated per customer into features.
+
+    Folds are grouped by customer, so the out-of-fold prediction of a payment never comes from a model that saw
+    other payments of the same customer. Payments of test customers are scored by the average of the fold models.
+
+    Attributes:
+        processor (InstallmentsPaymentsData): The processor holding the preprocessed installment payments.
+        train_ids (np.ndarray): SK_ID_CURR of the labelled customers.
+        y (np.ndarray): TARGET of the labelled customers.
+        trainer (TrainerLGBM): Trainer running the cross-validation.
+        n_fold (int): Number of folds.
+        n_threads (int): Number of prediction threads.
+        feature_plan (Optional[FeaturePlan]): Plan used to skip aggregations of unselected features.
+        dataset_name (str): Name of the stage, prefix of its features.
+        agg_map (dict): Aggregation mapping of the row-level predictions.
+    """
+
+    def __init__(
+        self,
+        processor: InstallmentsPaymentsData,
+        train_ids: np.ndarray,
+        y: np.ndarray,
+        seed: int,
+        n_fold: int = 5,
+        n_threads: int = 4,
+        feature_plan: Optional[FeaturePlan] = None,
+    ) -> None:
+        """
+        Initializes the NestedInstallmentsModel.
+
+        Args:
+            processor (InstallmentsPaymentsData): A processor whose installment payments are loaded and preprocessed.
+            train_ids (np.ndarray): SK_ID_CURR of the labelled customers.
+            y (np.ndarray): TARGET of the labelled customers, in the order of train_ids.
+            seed (int): Random seed of the folds and models.
+            n_fold (int): Number of folds.
+            n_threads (int): Number of prediction threads.
+            feature_plan (Optional[FeaturePlan]): Plan used to skip aggregations of unselected features.
+        """
+        self.processor = processor
+        self.train_ids = np.asarray(train_ids)
+        self.y = np.asarray(y)
+        self.trainer = TrainerLGBM(seed=seed)
+        self.n_fold = n_fold
+        self.n_threads = n_threads
+        self.feature_plan = feature_plan
+        self.dataset_name = "installments_payments_nested"
+        self.agg_map = aggregation_recipes[self.dataset_name]
+
+    def customer_folds(self, row_customers: np.ndarray) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Splits labelled rows into folds of whole customers.
+
+        Args:
+            row_customers (np.ndarray): Position in train_ids of the customer of every labelled row.
+
+        Returns:
+            List[Tuple[np.ndarray, np.ndarray]]: Train and validation rows of every fold.
+        """
+        kf = KFold(n_splits=self.n_fold, shuffle=True, random_state=self.trainer.seed)
+        customer_fold = np.empty(len(self.train_ids), dtype=np.int64)
+        for fold, (_, val_customers) in enumerate(kf.split(self.train_ids)):
+            customer_fold[val_customers] = fold
+        row_fold = customer_fold[row_customers]
+        return [(np.flatnonzero(row_fold != fold), np.flatnonzero(row_fold == fold)) for fold in range(self.n_fold)]
+
+    def predict_rows(self) -> np.ndarray:
+        """
+        Computes the out-of-fold prediction of every labelled payment and the averaged prediction of the others.
+
+        Returns:
+            np.ndarray: The prediction of every row of the processor frame.
+        """
+        ip = self.processor.ip
+        data = ip[nested_features[self.processor.dataset_name]].to_numpy(dtype=np.float32)
+        order = np.argsort(self.train_ids, kind="stable")
+        positions = np.minimum(np.searchsorted(self.train_ids[order], ip["SK_ID_CURR"].to_numpy()), len(order) - 1)
+        labelled = self.train_ids[order][positions] == ip["SK_ID_CURR"].to_numpy()
+        labelled_rows = np.flatnonzero(labelled)
+        row_customers = order[positions[labelled]]
+
+        full_set = lgb.Dataset(
+            data[labelled_rows],
+            label=self.y[row_customers],
+            feature_name=nested_features[self.processor.dataset_name],
+            params=DatasetCache.binning_params(nested_model_params),
+        ).construct()
+        models, oof_preds, val_score = self.trainer.fit_kfold_dataset(
+            full_set,
+            lambda booster, val_idx: predict_batched([booster], data, labelled_rows[val_idx], n_threads=self.n_threads),
+            "classification",
+            nested_model_params,
+            "auc",
+            self.n_fold,
+            False,
+            self.customer_folds(row_customers),
+        )
+        print(f"Nested {self.processor.dataset_name} model, row-level auc: {val_score}")
+        del full_set
+        gc.collect()
+
+        preds = np.empty(len(ip))
+        preds[labelled_rows] = oof_preds
+        unlabelled_rows = np.flatnonzero(~labelled)
+        if len(unlabelled_rows):
+            preds[unlabelled_rows] = predict_batched(models, data, unlabelled_rows, n_threads=self.n_threads)
+        return preds
+
+    def process(self) -> List[pd.DataFrame]:
+        """
+        Trains the nested model and aggregates its row-level predictions per customer.
+
+        Returns:
+            List[pd.DataFrame]: The aggregated predictions, for merging with the main DataFrame.
+        """
+        agg_map = plan_agg_map(self.agg_map, self.dataset_name, self.feature_plan)
+        if not agg_map:
+            return []
+        rows = self.processor.ip[["SK_ID_CURR", "DAYS_INSTALMENT"]].copy()
+        rows["nested_pred"] = self.predict_rows()
+        stats = self.processor.backend.groupby_agg(rows, "SK_ID_CURR", agg_map, order_by="DAYS_INSTALMENT")
+        stats = stats.astype(np.float32)
+        stats.columns = reduce_column_names(stats, self.dataset_name)
+        return [stats.reset_index()]
@@ -0,0 +1,225 @@
+import os
+import json
+import hashlib
+from typing import List, Dict, Any, Tuple, Union
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression, LinearRegression
+
+
+class OOFStore:
+    """
+    A directory of out-of-fold and test predictions, one entry per model configuration.
+
+    An entry is keyed by a hash of everything its predictions depend on (parameters, features, task, metric, number
+    of folds, seed and the rows of the data) and holds float32 column files of the out-of-fold and test predictions,
+    the fold of every labelled row under every seed and a JSON description with the validation score. Reruns of a stored configuration can load its
+    predictions instead of training, and a stacking stage can blend stored models without retraining any of them.
+
+    Attributes:
+        path (str): Directory of the store.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Initializes the OOFStore.
+
+        Args:
+            path (str): Directory of the store, created if needed.
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def model_config(
+        params: Dict[str, Any],
+        features: List[str],
+        task_type: str,
+        eval_metric: str,
+        n_fold: int,
+        seed: Union[int, List[int]],
+        ids: np.ndarray,
+        y: np.ndarray,
+    ) -> Dict[str, Any]:
+        """
+        Describes a model configuration, including the data it is trained on, so a run on another sample of customers
+        never reuses predictions that do not line up with its rows.
+
+        Args:
+            params (Dict[str, Any]): Parameters of the model.
+            features (List[str]): The features, in order.
+            task_type (str): The type of task ('classification' or 'regression').
+            eval_metric (str): The evaluation metric.
+            n_fold (int): The number of folds.
+            seed (Union[int, List[int]]): The seed of the folds and of the model, or the seeds of a bagged model.
+            ids (np.ndarray): SK_ID_CURR of all rows, the labelled ones first.
+            y (np.ndarray): The target values of the labelled rows.
+
+        Returns:
+            Dict[str, Any]: The configuration.
+        """
+        return {
+            "params": params or {},
+            "features": list(features),
+            "task_type": task_type,
+            "eval_metric": eval_metric,
+            "n_fold": n_fold,
+            "seed": seed,
+            "data": OOFStore.data_hash(ids, y),
+        }
+
+    @staticmethod
+    def data_hash(ids: np.ndarray, y: np.ndarray) -> str:
+        """
+        Hashes the rows of a dataset: its customers, in order, and the target of the labelled ones.
+
+        Args:
+            ids (np.ndarray): SK_ID_CURR of all rows, the labelled ones first.
+            y (np.ndarray): The target values of the labelled rows.
+
+        Returns:
+            str: The hash.
+        """
+        digest = hashlib.sha1(np.ascontiguousarray(ids, dtype=np.int64).tobytes())
+        digest.update(np.ascontiguousarray(y, dtype=np.float64).tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(config: Dict[str, Any]) -> str:
+        """
+        Hashes a model configuration.
+
+        Args:
+            config (Dict[str, Any]): The configuration, from model_config.
+
+        Returns:
+            str: The key of the entry.
+        """
+        return hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.path, key)
+
+    def exists(self, config: Dict[str, Any]) -> bool:
+        return os.path.exists(os.path.join(self.entry_path(self.key(config)), "meta.json"))
+
+    def save(
+        self,
+        config: Dict[str, Any],
+        oof_preds: np.ndarray,
+        test_preds: np.ndarray,
+        fold_plans: List[List[Tuple[np.ndarray, np.ndarray]]],
+        val_score: float,
+    ) -> str:
+        """
+        Saves the predictions of a model configuration.
+
+        Args:
+            config (Dict[str, Any]): The configuration, from model_config.
+            oof_preds (np.ndarray): The out-of-fold prediction of every labelled row.
+            test_preds (np.ndarray): The prediction of every test row.
+            fold_plans (List[List[Tuple[np.ndarray, np.ndarray]]]): Train and validation rows of every fold, for
+                every seed of the model (one plan unless it is bagged).
+            val_score (float): The validation score.
+
+        Returns:
+            str: The key of the entry.
+        """
+        key = self.key(config)
+        path = self.entry_path(key)
+        os.makedirs(path, exist_ok=True)
+        folds = np.full((len(fold_plans), len(oof_preds)), -1, dtype=np.int8)
+        for plan, tr_val_idx in enumerate(fold_plans):
+            for fold, (_, val_idx) in enumerate(tr_val_idx):
+                folds[plan, val_idx] = fold
+        np.save(os.path.join(path, "oof.npy"), np.asarray(oof_preds, dtype=np.float32))
+        np.save(os.path.join(path, "test.npy"), np.asarray(test_preds, dtype=np.float32))
+        np.save(os.path.join(path, "folds.npy"), folds)
+        # meta.json is written last, so an entry only exists once its predictions are complete
+        with open(os.path.join(path, "meta.json"), "w") as file:
+            json.dump({"key": key, "val_score": float(val_score), "config": config}, file, indent=1, default=str)
+        return key
+
+    def meta(self, key: str) -> Dict[str, Any]:
+        with open(os.path.join(self.entry_path(key), "meta.json"), "r") as file:
+            return json.load(file)
+
+    def load(self, key: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Loads the predictions of an entry.
+
+        Args:
+            key (str): The key of the entry.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: The out-of-fold predictions, the test predictions and the
+            (n_seeds, n_rows) fold of every labelled row under every seed.
+        """
+        path = self.entry_path(key)
+        return tuple(np.load(os.path.join(path, f"{name}.npy")) for name in ["oof", "test", "folds"])
+
+    def keys(self) -> List[str]:
+        return sorted(
+            key for key in os.listdir(self.path) if os.path.exists(os.path.join(self.entry_path(key), "meta.json"))
+        )
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Lists the stored entries.
+
+        Returns:
+            pd.DataFrame: Key, validation score, number of features and seed of every entry.
+        """
+        rows = []
+        for key in self.keys():
+            meta = self.meta(key)
+            rows.append(
+                {
+                    "key": key,
+                    "val_score": meta["val_score"],
+                    "n_features": len(meta["config"]["features"]),
+                    "seed": meta["config"]["seed"],
+                }
+            )
+        return pd.DataFrame(rows, columns=["key", "val_score", "n_features", "seed"])
+
+    def blend(self, keys: List[str], y: np.ndarray, task_type: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Stacks stored models with a linear model fitted on their out-of-fold predictions.
+
+        Classification predictions are blended on the logit scale with a logistic regression. The stacker is
+        cross-fitted on the stored folds of the first entry (its first seed): the blended prediction of every
+        labelled row comes from a stacker fitted on the other folds, and the test predictions average the fold
+        stackers. No stored model is retrained. All entries must come from the same rows.
+
+        Args:
+            keys (List[str]): The entries to blend.
+            y (np.ndarray): The target values of the labelled rows.
+            task_type (str): The type of task ('classification' or 'regression').
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The blended out-of-fold and test predictions.
+        """
+        if len({self.meta(key)["config"].get("data") for key in keys}) > 1:
+            raise ValueError("The entries were trained on different rows and cannot be blended")
+        if task_type not in ["classification", "regression"]:
+            raise ValueError(f"Unsupported task type: {task_type}")
+        entries = [self.load(key) for key in keys]
+        oof = np.column_stack([entry[0] for entry in entries]).astype(np.float64)
+        test = np.column_stack([entry[1] for entry in entries]).astype(np.float64)
+        folds = np.atleast_2d(entries[0][2])[0]
+        if task_type == "classification":
+            oof, test = [np.log(np.clip(preds, 1e-6, 1 - 1e-6) / (1 - np.clip(preds, 1e-6, 1 - 1e-6))) for preds in [oof, test]]
+        blended_oof, blended_test = np.zeros(len(oof)), np.zeros(len(test))
+        fold_ids = np.unique(folds[folds >= 0])
+        for fold in fold_ids:
+            val_rows = folds == fold
+            if task_type == "classification":
+                stacker = LogisticRegression(C=1.0).fit(oof[~val_rows], y[~val_rows])
+                blended_oof[val_rows] = stacker.predict_proba(oof[val_rows])[:, 1]
+                blended_test += stacker.predict_proba(test)[:, 1] / len(fold_ids)
+            else:
+                stacker = LinearRegression().fit(oof[~val_rows], y[~val_rows])
+                blended_oof[val_rows] = stacker.predict(oof[val_rows])
+                blended_test += stacker.predict(test) / len(fold_ids)
+        return blended_oof, blended_test
@@ -0,0 +1,73 @@
+import threading
+from collections import deque
+from typing import List, Any, Iterator
+
+
+class Prefetcher:
+    """
+    Loads the data sources of a sequence of processors in a background thread, ahead of their processing.
+
+    While the current processor aggregates, the next ones are parsed from disk. A semaphore bounds the number of
+    processors holding raw tables at once: a slot is taken before a source is loaded and given back when the
+    consumer asks for the next processor, i.e. once the previous one is processed.
+
+    Attributes:
+        max_resident (int): Maximal number of loaded raw tables, including the one being processed.
+    """
+
+    _done = object()
+
+    def __init__(self, processors: List[Any], max_resident: int = 2) -> None:
+        """
+        Initializes the Prefetcher.
+
+        Args:
+            processors (List[Any]): Processors with a load_data() method, in processing order. The prefetcher drops
+                its reference to a processor once it is handed out, so its tables are freed after processing unless
+                the caller keeps another reference.
+            max_resident (int): Maximal number of loaded raw tables. 1 disables prefetching.
+        """
+        self.max_resident = max(1, max_resident)
+        self._pending = deque(processors)
+        self._ready = deque()
+        self._available = threading.Condition()
+        self._slots = threading.Semaphore(self.max_resident)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._load, daemon=True)
+
+    def _load(self) -> None:
+        while self._pending:
+            self._slots.acquire()
+            if self._stop.is_set():
+                return
+            processor = self._pending.popleft()
+            try:
+                item = processor.load_data()
+            except BaseException as error:
+                item = error
+            with self._available:
+                self._ready.append(item)
+                self._available.notify()
+            if isinstance(item, BaseException):
+                return
+        with self._available:
+            self._ready.append(self._done)
+            self._available.notify()
+
+    def __iter__(self) -> Iterator[Any]:
+        self._thread.start()
+        try:
+            while True:
+                with self._available:
+                    self._available.wait_for(lambda: self._ready)
+                    item = self._ready.popleft()
+                if item is self._done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+                del item
+                self._slots.release()
+        finally:
+            self._stop.set()
+            self._slots.release()
@@ -0,0 +1,230 @@
+import json
+import hashlib
+from typing import List, Optional, Union
+import numpy as np
+import pandas as pd
+from feature_store import FeatureStore
+
+
+class RedundancyFilter:
+    """
+    Finds constant, duplicated and nearly duplicated features before model training.
+
+    The matrix is read in blocks of columns, so it never has to be converted to one large array:
+    - constants are columns with a single value (or only missing values),
+    - exact duplicates are found by hashing the float64 contents of every column, and confirmed by comparison,
+    - near-duplicates are found by a blocked correlation pass over a sample of rows, standardized block by block.
+    Every dropped feature is mapped to the feature it duplicates, so it can be left out of feature engineering.
+
+    Attributes:
+        block_size (int): Number of columns read at once.
+        corr_threshold (float): Absolute correlation above which a feature is a near-duplicate. None disables the pass.
+        sample_rows (int): Number of rows the correlations are computed on.
+        seed (int): Seed of the row sample.
+        constants (List[str]): Constant features.
+        duplicates (Dict[str, str]): Exact duplicates, mapped to the feature they duplicate.
+        near_duplicates (Dict[str, str]): Near-duplicates, mapped to the feature they are correlated with.
+    """
+
+    def __init__(
+        self,
+        block_size: int = 256,
+        corr_threshold: Optional[float] = 0.999,
+        sample_rows: int = 50000,
+        seed: int = 7,
+    ) -> None:
+        """
+        Initializes the RedundancyFilter.
+
+        Args:
+            block_size (int): Number of columns read at once.
+            corr_threshold (Optional[float]): Absolute correlation above which a feature is a near-duplicate.
+                None disables the near-duplicate pass.
+            sample_rows (int): Number of rows the correlations are computed on.
+            seed (int): Seed of the row sample.
+        """
+        self.block_size = block_size
+        self.corr_threshold = corr_threshold
+        self.sample_rows = sample_rows
+        self.seed = seed
+        self.constants = []
+        self.duplicates = {}
+        self.near_duplicates = {}
+
+    @property
+    def dropped_features(self) -> List[str]:
+        return self.constants + list(self.duplicates) + list(self.near_duplicates)
+
+    @staticmethod
+    def read_block(data: Union[pd.DataFrame, FeatureStore], columns: List[str], rows: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Reads a block of columns as float64.
+
+        Args:
+            data (Union[pd.DataFrame, FeatureStore]): The features.
+            columns (List[str]): The columns of the block.
+            rows (Optional[np.ndarray]): Row positions to read. If None, all rows.
+
+        Returns:
+            np.ndarray: The (n_rows, n_columns) values, with -0.0 normalized to 0.0.
+        """
+        if isinstance(data, FeatureStore):
+            values = data.select(columns).read_rows(slice(None) if rows is None else rows).astype(np.float64)
+        else:
+            block = data[columns] if rows is None else data[columns].iloc[rows]
+            values = block.to_numpy(dtype=np.float64)
+        return values + 0.0
+
+    def blocks(self, features: List[str]) -> List[List[str]]:
+        return [features[start : start + self.block_size] for start in range(0, len(features), self.block_size)]
+
+    def find_constants_and_duplicates(
+        self, data: Union[pd.DataFrame, FeatureStore], features: List[str], rows: Optional[np.ndarray]
+    ) -> List[str]:
+        """
+        Finds constant and exactly duplicated features in one pass of column blocks.
+
+        Args:
+            data (Union[pd.DataFrame, FeatureStore]): The features.
+            features (List[str]): The candidate features, in priority order: the first of duplicates is kept.
+            rows (Optional[np.ndarray]): Row positions to compare on. If None, all rows.
+
+        Returns:
+            List[str]: The remaining features.
+        """
+        first_by_digest = {}
+        remaining = []
+        for columns in self.blocks(features):
+            values = self.read_block(data, columns, rows)
+            missing = np.isnan(values)
+            n_missing = missing.sum(axis=0)
+            with np.errstate(invalid="ignore"):
+                spread = np.nanmax(np.where(missing, -np.inf, values), axis=0) - np.nanmin(
+                    np.where(missing, np.inf, values), axis=0
+                )
+            constant = (n_missing == len(values)) | ((n_missing == 0) & (spread == 0))
+            for j, column in enumerate(columns):
+                if constant[j]:
+                    self.constants.append(column)
+                    continue
+                # NaNs are hashed by position only, whatever their payload
+                contents = np.where(missing[:, j], np.nan, values[:, j])
+                digest = hashlib.sha1(np.ascontiguousarray(contents).tobytes()).hexdigest()
+                if digest in first_by_digest:
+                    kept = first_by_digest[digest]
+                    if np.array_equal(self.read_block(data, [kept], rows)[:, 0], contents, equal_nan=True):
+                        self.duplicates[column] = kept
+                        continue
+                first_by_digest.setdefault(digest, column)
+                remaining.append(column)
+        return remaining
+
+    def find_near_duplicates(
+        self, data: Union[pd.DataFrame, FeatureStore], features: List[str], rows: np.ndarray
+    ) -> None:
+        """
+        Finds features almost perfectly correlated with an earlier feature, comparing blocks of columns pairwise.
+
+        Args:
+            data (Union[pd.DataFrame, FeatureStore]): The features.
+            features (List[str]): The candidate features, in priority order.
+            rows (np.ndarray): Row positions of the sample.
+        """
+        blocks = self.blocks(features)
+        standardized = []
+        for columns in blocks:
+            values = self.read_block(data, columns, rows)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                centered = values - np.nanmean(values, axis=0)
+                scaled = centered / np.sqrt(np.nanmean(centered**2, axis=0))
+            # missing values sit at the mean, so they don't add correlation
+            standardized.append(np.nan_to_num(scaled, nan=0.0, posinf=0.0, neginf=0.0).astype(np.float32))
+
+        offsets = np.cumsum([0] + [len(columns) for columns in blocks])
+        pairs = []
+        for i in range(len(blocks)):
+            for j in range(i, len(blocks)):
+                corr = standardized[i].T @ standardized[j] / len(rows)
+                if i == j:
+                    corr = np.triu(corr, k=1)
+                left, right = np.nonzero(np.abs(corr) >= self.corr_threshold)
+                pairs.extend(zip(offsets[i] + left, offsets[j] + right))
+
+        for left, right in sorted(pairs, key=lambda pair: (pair[1], pair[0])):
+            if features[right] not in self.near_duplicates and features[left] not in self.near_duplicates:
+                self.near_duplicates[features[right]] = features[left]
+
+    def fit(
+        self, data: Union[pd.DataFrame, FeatureStore], features: List[str], rows: Optional[np.ndarray] = None
+    ) -> "RedundancyFilter":
+        """
+        Finds the redundant features.
+
+        Args:
+            data (Union[pd.DataFrame, FeatureStore]): The features.
+            features (List[str]): The candidate features, in priority order.
+            rows (Optional[np.ndarray]): Row positions to use (e.g. the labelled rows). If None, all rows.
+
+        Returns:
+            RedundancyFilter: The fitted filter.
+        """
+        self.constants, self.duplicates, self.near_duplicates = [], {}, {}
+        remaining = self.find_constants_and_duplicates(data, list(features), rows)
+        if self.corr_threshold is not None and len(remaining) > 1:
+            n_rows = data.n_rows if isinstance(data, FeatureStore) else len(data)
+            candidates = np.arange(n_rows) if rows is None else np.asarray(rows)
+            rng = np.random.default_rng(self.seed)
+            sample = np.sort(rng.choice(candidates, min(self.sample_rows, len(candidates)), replace=False))
+            self.find_near_duplicates(data, remaining, sample)
+        print(
+            f"Redundant features: {len(self.constants)} constant, {len(self.duplicates)} duplicated, "
+            f"{len(self.near_duplicates)} nearly duplicated"
+        )
+        return self
+
+    def transform(self, data: Union[pd.DataFrame, FeatureStore]) -> Union[pd.DataFrame, FeatureStore]:
+        """
+        Drops the redundant features.
+
+        Args:
+            data (Union[pd.DataFrame, FeatureStore]): The features.
+
+        Returns:
+            Union[pd.DataFrame, FeatureStore]: The features without the redundant ones.
+        """
+        if isinstance(data, FeatureStore):
+            return data.drop(self.dropped_features)
+        return data.drop(columns=self.dropped_features, errors="ignore")
+
+    def save(self, path: str) -> None:
+        """
+        Saves the dropped features and the features they duplicate as JSON.
+
+        Args:
+            path (str): The output file.
+        """
+        with open(path, "w") as file:
+            json.dump(
+                {"constants": self.constants, "duplicates": self.duplicates, "near_duplicates": self.near_duplicates},
+                file,
+                indent=1,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "RedundancyFilter":
+        """
+        Loads the mapping saved by save, e.g. to prune the redundant features from the FeaturePlan.
+
+        Args:
+            path (str): The mapping file.
+
+        Returns:
+            RedundancyFilter: A filter with the saved mapping.
+        """
+        redundancy_filter = cls()
+        with open(path, "r") as file:
+            mapping = json.load(file)
+        redundancy_filter.constants = mapping["constants"]
+        redundancy_filter.duplicates = mapping["duplicates"]
+        redundancy_filter.near_duplicates = mapping["near_duplicates"]
+        return redundancy_filter
@@ -0,0 +1,445 @@
+import os
+import glob
+import json
+import time
+import asyncio
+import argparse
+import collections
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+import lightgbm as lgb
+
+### number of latest requests the latency percentiles are computed on
+latency_window = 10000
+status_texts = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
+
+
+class ModelPool:
+    """
+    The fold ensemble, loaded once and kept warm for the lifetime of the server.
+
+    Models are loaded from their saved files with LightGBM alone: the server does not import models.py, which pulls
+    in the plotting and tuning libraries.
+
+    Attributes:
+        boosters (List[lgb.Booster]): The fold models, saved at their best iteration.
+        features (List[str]): The features, in model order.
+        feature_index (Dict[str, int]): Column of every feature.
+        category_codes (Dict[int, Dict[float, int]]): For the categorical columns of boosters trained on pandas
+            category columns, the position of every training category, which is what the trees split on.
+        n_threads (int): Number of LightGBM threads per batch.
+    """
+
+    def __init__(self, model_dir: str, n_threads: int = 4) -> None:
+        """
+        Loads the fold models saved in a directory.
+
+        Args:
+            model_dir (str): Directory of the fold_*.txt model files, and of categorical_features.json when the
+                models were trained on pandas category columns.
+            n_threads (int): Number of LightGBM threads per batch.
+        """
+        paths = sorted(glob.glob(os.path.join(model_dir, "fold_*.txt")))
+        if not paths:
+            raise ValueError(f"No fold models in {model_dir}")
+        self.boosters = [lgb.Booster(model_file=path) for path in paths]
+        self.features = self.boosters[0].feature_name()
+        self.feature_index = {feature: column for column, feature in enumerate(self.features)}
+        self.category_codes = self.load_category_codes(model_dir)
+        self.n_threads = n_threads
+
+    def load_category_codes(self, model_dir: str) -> Dict[int, Dict[float, int]]:
+        """
+        Reads the category mapping the model files store in pandas_categorical, one list of categories per
+        categorical feature, in feature order.
+
+        Args:
+            model_dir (str): Directory of the model files.
+
+        Returns:
+            Dict[int, Dict[float, int]]: Position of every category, by column.
+        """
+        categories = self.boosters[0].pandas_categorical or []
+        if any((booster.pandas_categorical or []) != categories for booster in self.boosters):
+            raise ValueError("The fold models were trained on different categories")
+        if not categories:
+            return {}
+        path = os.path.join(model_dir, "categorical_features.json")
+        if not os.path.exists(path):
+            raise ValueError(f"The models were trained on pandas categories but {path} is missing")
+        with open(path, "r") as file:
+            categoricals = set(json.load(file))
+        columns = [column for column, feature in enumerate(self.features) if feature in categoricals]
+        if len(columns) != len(categories):
+            raise ValueError(f"The models have {len(categories)} categorical features, {path} lists {len(columns)}")
+        return {
+            column: {float(category): code for code, category in enumerate(column_categories)}
+            for column, column_categories in zip(columns, categories)
+        }
+
+    def matrix(self, rows: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Converts rows to a float32 matrix; missing or null features are NaN, and categorical values are replaced by
+        their training category codes (NaN if unseen).
+
+        Args:
+            rows (List[Dict[str, Any]]): Feature values by name.
+
+        Returns:
+            np.ndarray: The (n_rows, n_features) matrix.
+        """
+        matrix = np.full((len(rows), len(self.features)), np.nan, dtype=np.float32)
+        for row, values in enumerate(rows):
+            for feature, value in values.items():
+                column = self.feature_index.get(feature)
+                if column is not None and value is not None:
+                    if column in self.category_codes:
+                        value = self.category_codes[column].get(float(value), np.nan)
+                    matrix[row, column] = value
+        return matrix
+
+    def predict(self, matrix: np.ndarray) -> np.ndarray:
+        """
+        Averages the predictions of the fold models.
+
+        Args:
+            matrix (np.ndarray): The float32 rows.
+
+        Returns:
+            np.ndarray: The prediction of every row.
+        """
+        preds = np.zeros(len(matrix))
+        for booster in self.boosters:
+            preds += booster.predict(matrix, num_threads=self.n_threads)
+        return preds / len(self.boosters)
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent scoring requests into micro-batches.
+
+    The first waiting request opens a batch, which collects the requests arriving within the wait window (or until
+    it is full) and is scored as one matrix in a worker thread, so the event loop keeps accepting requests while
+    LightGBM runs.
+
+    Attributes:
+        pool (ModelPool): The models.
+        max_wait_ms (float): How long a batch waits for more requests after its first one.
+        max_batch_rows (int): Number of rows above which a batch is scored without waiting.
+        queue (Optional[asyncio.Queue]): Matrices waiting to be scored, with the futures of their requests; created by
+            start in the running event loop.
+        stats (Dict[str, Any]): Counters of the scored requests, rows and batches.
+        latencies (collections.deque): Latency in ms of the latest requests.
+    """
+
+    def __init__(self, pool: ModelPool, max_wait_ms: float = 5.0, max_batch_rows: int = 4096) -> None:
+        """
+        Initializes the MicroBatcher.
+
+        Args:
+            pool (ModelPool): The models.
+            max_wait_ms (float): How long a batch waits for more requests after its first one.
+            max_batch_rows (int): Number of rows above which a batch is scored without waiting.
+        """
+        self.pool = pool
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_rows = max_batch_rows
+        self.queue = None
+        self.stats = {"requests": 0, "rows": 0, "batches": 0, "started": time.perf_counter()}
+        self.latencies = collections.deque(maxlen=latency_window)
+
+    async def score(self, rows: List[Dict[str, Any]]) -> List[float]:
+        """
+        Scores the rows of a request within the next micro-batch.
+
+        Args:
+            rows (List[Dict[str, Any]]): Feature values by name.
+
+        Returns:
+            List[float]: The prediction of every row.
+        """
+        start = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((self.pool.matrix(rows), future))
+        preds = await future
+        self.latencies.append((time.perf_counter() - start) * 1000)
+        self.stats["requests"] += 1
+        return preds.tolist()
+
+    def start(self) -> asyncio.Task:
+        """
+        Starts collecting batches in the running event loop.
+
+        Returns:
+            asyncio.Task: The batching task, to cancel on shutdown.
+        """
+        self.queue = asyncio.Queue()
+        self.stats["started"] = time.perf_counter()
+        return asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self) -> None:
+        """
+        Collects and scores micro-batches until cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            n_rows = len(batch[0][0])
+            deadline = loop.time() + self.max_wait_ms / 1000
+            while n_rows < self.max_batch_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+                n_rows += len(batch[-1][0])
+
+            matrix = np.concatenate([matrix for matrix, _ in batch])
+            try:
+                preds = await loop.run_in_executor(None, self.pool.predict, matrix)
+            except Exception as error:
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+            offset = 0
+            for request_matrix, future in batch:
+                future.set_result(preds[offset : offset + len(request_matrix)])
+                offset += len(request_matrix)
+            self.stats["rows"] += n_rows
+            self.stats["batches"] += 1
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Summarizes throughput and tail latency since the start of the server.
+
+        Returns:
+            Dict[str, Any]: Requests, rows and batches scored, rows per second, mean batch size and latency
+            percentiles in ms over the latest requests.
+        """
+        elapsed = time.perf_counter() - self.stats["started"]
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        return {
+            "requests": self.stats["requests"],
+            "rows": self.stats["rows"],
+            "batches": self.stats["batches"],
+            "rows_per_second": self.stats["rows"] / elapsed if elapsed > 0 else 0.0,
+            "mean_batch_rows": self.stats["rows"] / max(1, self.stats["batches"]),
+            "latency_ms": {f"p{q}": float(np.percentile(latencies, q)) for q in [50, 95, 99]},
+        }
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, bytes]]:
+    """
+    Reads one HTTP/1.1 request.
+
+    Args:
+        reader (asyncio.StreamReader): The connection.
+
+    Returns:
+        Optional[Tuple[str, str, bytes]]: The method, path and body, or None when the client closed the connection.
+    """
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    content_length = 0
+    while True:
+        header = await reader.readline()
+        if header in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = header.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            content_length = int(value.strip())
+    body = await reader.readexactly(content_length) if content_length else b""
+    return method, path, body
+
+
+def write_response(writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any]) -> None:
+    body = json.dumps(payload).encode()
+    writer.write(
+        f"HTTP/1.1 {status} {status_texts[status]}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode()
+        + body
+    )
+
+
+class ScoringServer:
+    """
+    A local HTTP scoring server of the fold ensemble.
+
+    Endpoints:
+    - POST /score with {"rows": [{feature: value, ...}, ...]} returns {"preds": [...]},
+    - GET /stats returns the throughput and tail latency report,
+    - GET /features returns the features the models expect.
+    Connections are kept alive, so a client can send many requests on one connection.
+
+    Attributes:
+        batcher (MicroBatcher): The micro-batcher scoring the requests.
+    """
+
+    def __init__(self, batcher: MicroBatcher) -> None:
+        """
+        Initializes the ScoringServer.
+
+        Args:
+            batcher (MicroBatcher): The micro-batcher scoring the requests.
+        """
+        self.batcher = batcher
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, body = request
+                if method == "POST" and path == "/score":
+                    try:
+                        rows = json.loads(body)["rows"]
+                    except (ValueError, KeyError, TypeError):
+                        write_response(writer, 400, {"error": "expected a JSON body with a rows list"})
+                    else:
+                        try:
+                            write_response(writer, 200, {"preds": await self.batcher.score(rows)})
+                        except Exception as error:
+                            write_response(writer, 500, {"error": str(error)})
+                elif method == "GET" and path == "/stats":
+                    write_response(writer, 200, self.batcher.report())
+                elif method == "GET" and path == "/features":
+                    write_response(writer, 200, {"features": self.batcher.pool.features})
+                else:
+                    write_response(writer, 404, {"error": f"unknown endpoint {method} {path}"})
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int) -> None:
+        """
+        Serves until cancelled.
+
+        Args:
+            host (str): The interface to listen on.
+            port (int): The port to listen on.
+        """
+        batcher_task = self.batcher.start()
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Scoring {len(self.batcher.pool.features)} features with {len(self.batcher.pool.boosters)} models on {host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher_task.cancel()
+
+
+async def generate_load(
+    host: str,
+    port: int,
+    n_requests: int,
+    concurrency: int,
+    rows_per_request: int = 1,
+    seed: int = 7,
+) -> Dict[str, Any]:
+    """
+    Sends scoring requests from concurrent clients, each on its own kept-alive connection, with random feature
+    values for the features the server expects.
+
+    Args:
+        host (str): The server host.
+        port (int): The server port.
+        n_requests (int): Total number of requests.
+        concurrency (int): Number of concurrent clients.
+        rows_per_request (int): Number of rows per request.
+        seed (int): Seed of the feature values.
+
+    Returns:
+        Dict[str, Any]: Client-side requests per second and latency percentiles in ms, and the server report.
+    """
+
+    async def request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        body = json.dumps(payload).encode() if payload is not None else b""
+        writer.write(f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+        await reader.readline()
+        content_length = 0
+        while True:
+            header = await reader.readline()
+            if header in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = header.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                content_length = int(value.strip())
+        return json.loads(await reader.readexactly(content_length))
+
+    reader, writer = await asyncio.open_connection(host, port)
+    features = (await request(reader, writer, "GET", "/features"))["features"]
+    rng = np.random.default_rng(seed)
+    payloads = [
+        {"rows": [dict(zip(features, rng.normal(size=len(features)).tolist())) for _ in range(rows_per_request)]}
+        for _ in range(min(n_requests, 64))
+    ]
+    latencies = []
+    counter = iter(range(n_requests))
+
+    async def client() -> None:
+        client_reader, client_writer = await asyncio.open_connection(host, port)
+        for request_id in counter:
+            start = time.perf_counter()
+            await request(client_reader, client_writer, "POST", "/score", payloads[request_id % len(payloads)])
+            latencies.append((time.perf_counter() - start) * 1000)
+        client_writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    server_report = await request(reader, writer, "GET", "/stats")
+    writer.close()
+    return {
+        "requests_per_second": n_requests / elapsed,
+        "latency_ms": {f"p{q}": float(np.percentile(latencies, q)) for q in [50, 95, 99]},
+        "server": server_report,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parse command line arguments.
+
+    Returns:
+        argparse.Namespace: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Local scoring server of the fold models")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve = subparsers.add_parser("serve", help="Serve the fold models saved with --model_dir")
+    serve.add_argument("--model_dir", type=str, required=True, help="Directory of the fold_*.txt model files")
+    serve.add_argument("--max_wait_ms", type=float, default=5.0, help="Wait window of a micro-batch")
+    serve.add_argument("--max_batch_rows", type=int, default=4096, help="Rows above which a batch is scored at once")
+    serve.add_argument("--n_threads", type=int, default=4, help="LightGBM threads per batch")
+    load = subparsers.add_parser("load", help="Send load to a running server and report throughput and latency")
+    load.add_argument("--n_requests", type=int, default=10000, help="Total number of requests")
+    load.add_argument("--concurrency", type=int, default=64, help="Number of concurrent clients")
+    load.add_argument("--rows_per_request", type=int, default=1, help="Rows per request")
+    for subparser in [serve, load]:
+        subparser.add_argument("--host", type=str, default="127.0.0.1", help="Host of the server")
+        subparser.add_argument("--port", type=int, default=8080, help="Port of the server")
+    return parser.parse_args()
+
+
+def main() -> None:
+    """
+    Serves the models or generates load, depending on the command.
+    """
+    args = parse_args()
+    if args.command == "serve":
+        batcher = MicroBatcher(ModelPool(args.model_dir, args.n_threads), args.max_wait_ms, args.max_batch_rows)
+        asyncio.run(ScoringServer(batcher).serve(args.host, args.port))
+    else:
+        report = asyncio.run(generate_load(args.host, args.port, args.n_requests, args.concurrency, args.rows_per_request))
+        print(json.dumps(report, indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+import os
+import gc
+import sys
+import json
+import time
+import pickle
+import argparse
+import subprocess
+from typing import List, Dict, Tuple, Optional
+import numpy as np
+import pandas as pd
+from data_processors import (
+    MainData,
+    BureauData,
+    PreviousApplicationData,
+    InstallmentsPaymentsData,
+    POSCashBalanceData,
+    CreditCardBalanceData,
+    BureauBalanceData,
+    previous_app_categoricals,
+)
+from feature_plan import FeaturePlan
+from worker_pool import shutdown_worker_pool
+from prefetcher import Prefetcher
+
+### tables partitioned directly on SK_ID_CURR; bureau_balance follows its bureau credit
+customer_tables = [
+    "bureau",
+    "previous_application",
+    "installments_payments",
+    "POS_CASH_balance",
+    "credit_card_balance",
+]
+chunk_rows = 1_000_000
+
+
+def shard_of(ids: np.ndarray, n_shards: int) -> np.ndarray:
+    """
+    Assigns customers to shards by hashing their SK_ID_CURR.
+
+    Args:
+        ids (np.ndarray): SK_ID_CURR values.
+        n_shards (int): Number of shards.
+
+    Returns:
+        np.ndarray: The shard of every id.
+    """
+    return (pd.util.hash_array(np.asarray(ids, dtype=np.int64)) % np.uint64(n_shards)).astype(np.int64)
+
+
+def shard_dir_name(work_dir: str, shard: int) -> str:
+    """
+    Builds the directory of a shard, laid out like the competition data directory.
+
+    Args:
+        work_dir (str): The working directory of the sharded run.
+        shard (int): The shard number.
+
+    Returns:
+        str: The shard directory, with a trailing separator as the processors expect.
+    """
+    return os.path.join(work_dir, f"shard_{shard:03d}") + os.sep
+
+
+def write_partitioned(chunk: pd.DataFrame, shards: np.ndarray, work_dir: str, table: str, n_shards: int, written: set) -> None:
+    """
+    Appends the rows of a chunk to the CSV file of their shard.
+
+    Args:
+        chunk (pd.DataFrame): A chunk of a table.
+        shards (np.ndarray): The shard of every row of the chunk.
+        work_dir (str): The working directory of the sharded run.
+        table (str): The table name.
+        n_shards (int): Number of shards.
+        written (set): Shards whose file already has a header. Updated in place.
+    """
+    for shard in range(n_shards):
+        part = chunk[shards == shard]
+        if part.empty and shard in written:
+            continue
+        part.to_csv(
+            shard_dir_name(work_dir, shard) + f"{table}.csv",
+            mode="a" if shard in written else "w",
+            header=shard not in written,
+            index=False,
+        )
+        written.add(shard)
+
+
+def partition_tables(
+    path_to_data: str,
+    work_dir: str,
+    n_shards: int,
+    customer_ids: Optional[np.ndarray] = None,
+) -> Dict[str, List[str]]:
+    """
+    Hash-partitions every child table by SK_ID_CURR into shard directories, streaming the tables in chunks.
+
+    Rows of customers outside customer_ids are dropped on the way, and the vocabulary of the previous application
+    categoricals is collected, so every shard encodes them with the same codes.
+
+    Args:
+        path_to_data (str): Path to the data directory.
+        work_dir (str): The working directory of the sharded run.
+        n_shards (int): Number of shards.
+        customer_ids (Optional[np.ndarray]): SK_ID_CURR to keep. If None, all customers are kept.
+
+    Returns:
+        Dict[str, List[str]]: Sorted categories (as strings) of every previous application categorical.
+    """
+    for shard in range(n_shards):
+        os.makedirs(shard_dir_name(work_dir, shard), exist_ok=True)
+    vocab = {col: set() for col in previous_app_categoricals}
+    bureau_shards = []
+
+    for table in customer_tables:
+        written = set()
+        for chunk in pd.read_csv(path_to_data + f"{table}.csv", chunksize=chunk_rows):
+            if customer_ids is not None:
+                chunk = chunk[chunk["SK_ID_CURR"].isin(customer_ids)]
+            shards = shard_of(chunk["SK_ID_CURR"].values, n_shards)
+            write_partitioned(chunk, shards, work_dir, table, n_shards, written)
+            if table == "bureau":
+                bureau_shards.append(pd.Series(shards, index=chunk["SK_ID_BUREAU"].values))
+            if table == "previous_application":
+                for col in previous_app_categoricals:
+                    vocab[col].update(chunk[col].astype(str).unique())
+        gc.collect()
+
+    bureau_shard = pd.concat(bureau_shards)
+    written = set()
+    for chunk in pd.read_csv(path_to_data + "bureau_balance.csv", chunksize=chunk_rows):
+        shards = chunk["SK_ID_BUREAU"].map(bureau_shard)
+        # balances of credits missing from bureau (or of unsampled customers) can't be attached to a customer
+        chunk, shards = chunk[shards.notnull()], shards[shards.notnull()].values.astype(np.int64)
+        write_partitioned(chunk, shards, work_dir, "bureau_balance", n_shards, written)
+
+    return {col: sorted(values) for col, values in vocab.items()}
+
+
+def compute_shard_features(
+    shard_dir: str,
+    num_parallel_processes: int,
+    category_vocab: Dict[str, List[str]],
+    feature_plan: Optional[FeaturePlan] = None,
+    backend: str = "pandas",
+    max_resident_tables: int = 2,
+) -> pd.DataFrame:
+    """
+    Runs the full chain of child-table processors on one shard.
+
+    Args:
+        shard_dir (str): The shard directory.
+        num_parallel_processes (int): Number of parallel processes of the shard.
+        category_vocab (Dict[str, List[str]]): Categories of the previous application categoricals.
+        feature_plan (Optional[FeaturePlan]): Plan used to skip aggregations of unselected features.
+        backend (str): Aggregation backend of the processor recipes.
+        max_resident_tables (int): Maximal number of raw child tables in memory, the next ones being prefetched.
+
+    Returns:
+        pd.DataFrame: Child-table features of the shard customers, one row per customer.
+    """
+    df = pd.DataFrame({"SK_ID_CURR": np.load(shard_dir + "customer_ids.npy")})
+
+    bureau_balance_processor = BureauBalanceData(shard_dir, None, num_parallel_processes, None, feature_plan, backend=backend)
+    processors = Prefetcher(
+        [
+            BureauData(shard_dir, num_parallel_processes, None, feature_plan, backend=backend),
+            PreviousApplicationData(shard_dir, num_parallel_processes, None, feature_plan, category_vocab, backend=backend),
+            InstallmentsPaymentsData(shard_dir, num_parallel_processes, None, feature_plan, backend=backend),
+            POSCashBalanceData(shard_dir, num_parallel_processes, None, feature_plan, backend=backend),
+            CreditCardBalanceData(shard_dir, num_parallel_processes, None, feature_plan, backend=backend),
+            bureau_balance_processor,
+        ],
+        max_resident_tables,
+    )
+    for processor in processors:
+        feature = processor.process()
+        if isinstance(processor, BureauData):
+            bureau_balance_processor.set_id_mapping(processor.get_id_mapping())
+        for feat_df in feature:
+            df = df.merge(feat_df, on="SK_ID_CURR", how="left")
+        del processor, feature
+        gc.collect()
+    del bureau_balance_processor
+    shutdown_worker_pool()
+
+    return df
+
+
+def run_nodes(
+    shard_dirs: List[str],
+    n_nodes: int,
+    num_parallel_processes: int,
+    work_dir: str,
+    backend: str = "pandas",
+    max_resident_tables: int = 2,
+) -> None:
+    """
+    Runs one worker subprocess ("node") per shard, at most n_nodes at a time.
+
+    The nodes only communicate through files: they read their shard directory and the shared settings in work_dir,
+    and write features.pkl into their shard directory.
+
+    Args:
+        shard_dirs (List[str]): The shard directories.
+        n_nodes (int): Maximal number of concurrently running nodes.
+        num_parallel_processes (int): Number of parallel processes per node.
+        work_dir (str): The working directory of the sharded run.
+        backend (str): Aggregation backend of the processor recipes.
+        max_resident_tables (int): Maximal number of raw child tables in memory per node.
+    """
+    pending = list(shard_dirs)
+    running = {}
+    while pending or running:
+        while pending and len(running) < n_nodes:
+            shard_dir = pending.pop(0)
+            running[shard_dir] = subprocess.Popen(
+                [
+                    sys.executable,
+                    os.path.abspath(__file__),
+                    "--shard_dir",
+                    shard_dir,
+                    "--work_dir",
+                    work_dir,
+                    "--num_parallel_processes",
+                    str(num_parallel_processes),
+                    "--backend",
+                    backend,
+                    "--max_resident_tables",
+                    str(max_resident_tables),
+                ]
+            )
+        for shard_dir, node in list(running.items()):
+            return_code = node.poll()
+            if return_code is None:
+                continue
+            del running[shard_dir]
+            if return_code != 0:
+                for other in running.values():
+                    other.kill()
+                raise RuntimeError(f"Node for {shard_dir} failed with exit code {return_code}")
+        time.sleep(0.5)
+
+
+def sharded_feature_engineering(
+    path_to_data: str,
+    work_dir: str,
+    n_shards: int,
+    n_nodes: int,
+    num_parallel_processes: int,
+    sample_rate: float,
+    feature_plan: Optional[FeaturePlan] = None,
+    backend: str = "pandas",
+    max_resident_tables: int = 2,
+    seed: Optional[int] = None,
+) -> Tuple[pd.DataFrame, np.array, List[str]]:
+    """
+    Performs feature engineering with the child tables hash-partitioned by SK_ID_CURR across local worker nodes.
+
+    The main table is processed by the coordinator, because its label encodings and categorical counts need all
+    applications. Every child-table aggregation is per customer, so shard feature matrices are simply concatenated.
+
+    Args:
+        path_to_data: The path to the data directory.
+        work_dir: The working directory for shards and their outputs.
+        n_shards: Number of shards.
+        n_nodes: Number of concurrently running worker nodes.
+        num_parallel_processes: Total number of parallel processes, split across the nodes.
+        sample_rate: The sampling rate of training customers.
+        feature_plan: Optional plan of selected features.
+        backend: Aggregation backend of the processor recipes ('pandas' or 'polars').
+        max_resident_tables: Maximal number of raw child tables in memory per node.
+        seed: Random seed of the customer sampling.
+
+    Returns:
+        Tuple containing the processed DataFrame, target values array, and a list of categorical features.
+    """
+    main_data_processor = MainData(path_to_data, sampling=sample_rate, random_state=seed)
+    df, target_col, y, categorical_feats = main_data_processor.process()
+    customer_ids = main_data_processor.get_customer_ids()
+    del main_data_processor
+    gc.collect()
+
+    category_vocab = partition_tables(
+        path_to_data, work_dir, n_shards, customer_ids if sample_rate < 1 else None
+    )
+    with open(os.path.join(work_dir, "category_vocab.json"), "w") as file:
+        json.dump(category_vocab, file)
+    with open(os.path.join(work_dir, "feature_plan.pkl"), "wb") as file:
+        pickle.dump(feature_plan, file)
+    shard_dirs = [shard_dir_name(work_dir, shard) for shard in range(n_shards)]
+    shards = shard_of(customer_ids, n_shards)
+    for shard, shard_dir in enumerate(shard_dirs):
+        np.save(shard_dir + "customer_ids.npy", customer_ids[shards == shard])
+
+    run_nodes(shard_dirs, n_nodes, max(1, num_parallel_processes // n_nodes), work_dir, backend, max_resident_tables)
+
+    shard_features = pd.concat(
+        [pd.read_pickle(shard_dir + "features.pkl") for shard_dir in shard_dirs],
+        axis=0,
+        ignore_index=True,
+        sort=False,
+    )
+    df = df.merge(shard_features, on="SK_ID_CURR", how="left")
+    return df, y, categorical_feats
+
+
+def main() -> None:
+    """
+    Entry point of a worker node: computes the features of one shard and saves them next to its data.
+    """
+    parser = argparse.ArgumentParser(description="Home Credit shard worker")
+    parser.add_argument("--shard_dir", required=True, type=str, help="Shard directory")
+    parser.add_argument("--work_dir", required=True, type=str, help="Working directory of the sharded run")
+    parser.add_argument("--num_parallel_processes", type=int, default=1, help="Number of parallel processes")
+    parser.add_argument("--backend", type=str, default="pandas", help="Aggregation backend: pandas or polars")
+    parser.add_argument("--max_resident_tables", type=int, default=2, help="Maximal number of raw tables in memory")
+    args = parser.parse_args()
+
+    with open(os.path.join(args.work_dir, "category_vocab.json"), "r") as file:
+        category_vocab = json.load(file)
+    with open(os.path.join(args.work_dir, "feature_plan.pkl"), "rb") as file:
+        feature_plan = pickle.load(file)
+    df = compute_shard_features(
+        args.shard_dir,
+        args.num_parallel_processes,
+        category_vocab,
+        feature_plan,
+        args.backend,
+        args.max_resident_tables,
+    )
+    # write under a temporary name, so a crashed node never leaves a partial output behind
+    df.to_pickle(args.shard_dir + "features.pkl.tmp")
+    os.replace(args.shard_dir + "features.pkl.tmp", args.shard_dir + "features.pkl")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,477 @@
+import os
+import argparse
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+### fan-out settings, calibrated on the competition data (rows per parent: mean, dispersion)
+fan_out = {
+    "bureau": (5.6, 1.5),
+    "bureau_balance": (15.6, 1.0),
+    "previous_application": (4.9, 1.5),
+    "pos_cash_balance": (6.1, 1.2),
+    "installments_payments": (8.2, 1.2),
+    "credit_card_balance": (20.0, 1.0),
+}
+test_to_train_ratio = 48744 / 307511
+share_bureau_credits_with_balance = 0.36
+share_customers_with_cards = 0.3
+
+application_categoricals = {
+    "NAME_CONTRACT_TYPE": ["Cash loans", "Revolving loans"],
+    "CODE_GENDER": ["F", "M", "XNA"],
+    "FLAG_OWN_CAR": ["N", "Y"],
+    "FLAG_OWN_REALTY": ["Y", "N"],
+    "NAME_TYPE_SUITE": ["Unaccompanied", "Family", "Spouse, partner", "Children", "Other_B", None],
+    "NAME_INCOME_TYPE": ["Working", "Commercial associate", "Pensioner", "State servant", "Unemployed"],
+    "NAME_EDUCATION_TYPE": ["Secondary / secondary special", "Higher education", "Incomplete higher", "Lower secondary"],
+    "NAME_FAMILY_STATUS": ["Married", "Single / not married", "Civil marriage", "Separated", "Widow"],
+    "NAME_HOUSING_TYPE": ["House / apartment", "With parents", "Municipal apartment", "Rented apartment"],
+    "OCCUPATION_TYPE": ["Laborers", "Sales staff", "Core staff", "Managers", "Drivers", "Accountants", None],
+    "WEEKDAY_APPR_PROCESS_START": ["MONDAY", "TUESDAY", "WEDNESDAY", "THURSDAY", "FRIDAY", "SATURDAY", "SUNDAY"],
+    "ORGANIZATION_TYPE": ["Business Entity Type 3", "XNA", "Self-employed", "Other", "Medicine", "Government", "School"],
+    "FONDKAPREMONT_MODE": ["reg oper account", "org spec account", "not specified", None],
+    "HOUSETYPE_MODE": ["block of flats", "specific housing", "terraced house", None],
+    "WALLSMATERIAL_MODE": ["Panel", "Stone, brick", "Block", "Wooden", None],
+    "EMERGENCYSTATE_MODE": ["No", "Yes", None],
+}
+application_flags = [
+    "FLAG_MOBIL",
+    "FLAG_EMP_PHONE",
+    "FLAG_WORK_PHONE",
+    "FLAG_CONT_MOBILE",
+    "FLAG_PHONE",
+    "FLAG_EMAIL",
+    "REG_REGION_NOT_LIVE_REGION",
+    "REG_REGION_NOT_WORK_REGION",
+    "LIVE_REGION_NOT_WORK_REGION",
+    "REG_CITY_NOT_LIVE_CITY",
+    "REG_CITY_NOT_WORK_CITY",
+    "LIVE_CITY_NOT_WORK_CITY",
+] + [f"FLAG_DOCUMENT_{i}" for i in range(2, 22)]
+building_stats = [
+    "APARTMENTS",
+    "BASEMENTAREA",
+    "YEARS_BEGINEXPLUATATION",
+    "YEARS_BUILD",
+    "COMMONAREA",
+    "ELEVATORS",
+    "ENTRANCES",
+    "FLOORSMAX",
+    "FLOORSMIN",
+    "LANDAREA",
+    "LIVINGAPARTMENTS",
+    "LIVINGAREA",
+    "NONLIVINGAPARTMENTS",
+    "NONLIVINGAREA",
+]
+previous_app_categoricals = {
+    "NAME_CONTRACT_TYPE": ["Cash loans", "Consumer loans", "Revolving loans"],
+    "WEEKDAY_APPR_PROCESS_START": ["MONDAY", "TUESDAY", "WEDNESDAY", "THURSDAY", "FRIDAY", "SATURDAY", "SUNDAY"],
+    "FLAG_LAST_APPL_PER_CONTRACT": ["Y", "N"],
+    "NAME_CASH_LOAN_PURPOSE": ["XAP", "XNA", "Repairs", "Other", "Urgent needs"],
+    "NAME_CONTRACT_STATUS": ["Approved", "Canceled", "Refused", "Unused offer"],
+    "NAME_PAYMENT_TYPE": ["Cash through the bank", "XNA", "Non-cash from your account"],
+    "CODE_REJECT_REASON": ["XAP", "HC", "LIMIT", "SCO", "CLIENT"],
+    "NAME_TYPE_SUITE": ["Unaccompanied", "Family", "Spouse, partner", None],
+    "NAME_CLIENT_TYPE": ["Repeater", "New", "Refreshed", "XNA"],
+    "NAME_GOODS_CATEGORY": ["XNA", "Mobile", "Consumer Electronics", "Computers", "Audio/Video", "Furniture"],
+    "NAME_PORTFOLIO": ["POS", "Cash", "XNA", "Cards"],
+    "NAME_PRODUCT_TYPE": ["XNA", "x-sell", "walk-in"],
+    "CHANNEL_TYPE": ["Credit and cash offices", "Country-wide", "Stone", "Regional / Local", "Contact center"],
+    "NAME_SELLER_INDUSTRY": ["XNA", "Consumer electronics", "Connectivity", "Furniture", "Construction"],
+    "NAME_YIELD_GROUP": ["XNA", "middle", "high", "low_normal", "low_action"],
+    "PRODUCT_COMBINATION": ["Cash", "POS household with interest", "POS mobile with interest", "Cash X-Sell: middle", "Cash X-Sell: low", "Card Street", None],
+}
+
+
+def fan_out_counts(rng: np.random.Generator, n_parents: int, mean: float, dispersion: float) -> np.ndarray:
+    """
+    Draws the number of child rows per parent from an overdispersed (negative binomial) distribution.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        n_parents (int): Number of parent records.
+        mean (float): Mean number of children per parent.
+        dispersion (float): Negative binomial shape. Lower values give heavier tails.
+
+    Returns:
+        np.ndarray: Number of children per parent.
+    """
+    p = dispersion / (dispersion + mean)
+    return rng.negative_binomial(dispersion, p, size=n_parents)
+
+
+def with_missing(rng: np.random.Generator, values: np.ndarray, share: float) -> np.ndarray:
+    """
+    Replaces a random share of the values with NaN.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        values (np.ndarray): The values.
+        share (float): The share of values to blank out.
+
+    Returns:
+        np.ndarray: A float copy of the values with NaNs.
+    """
+    values = values.astype(np.float64)
+    values[rng.random(values.shape[0]) < share] = np.nan
+    return values
+
+
+def choice(rng: np.random.Generator, options: List, size: int) -> np.ndarray:
+    """
+    Draws categorical values with a decreasing (Zipf-like) frequency, so the first option dominates.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        options (List): The category values. None stands for a missing value.
+        size (int): Number of values to draw.
+
+    Returns:
+        np.ndarray: An object array of category values.
+    """
+    weights = 1 / np.arange(1, len(options) + 1)
+    return np.array(options, dtype=object)[
+        rng.choice(len(options), size=size, p=weights / weights.sum())
+    ]
+
+
+def generate_applications(rng: np.random.Generator, sk_ids: np.ndarray, with_target: bool) -> pd.DataFrame:
+    """
+    Generates application_train or application_test rows.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        sk_ids (np.ndarray): SK_ID_CURR of the applications.
+        with_target (bool): Whether to add the TARGET column.
+
+    Returns:
+        pd.DataFrame: The applications.
+    """
+    n = sk_ids.shape[0]
+    df = {"SK_ID_CURR": sk_ids}
+    if with_target:
+        df["TARGET"] = (rng.random(n) < 0.08).astype(int)
+    for col, options in application_categoricals.items():
+        df[col] = choice(rng, options, n)
+    for col in application_flags:
+        df[col] = (rng.random(n) < 0.3).astype(int)
+    df["CNT_CHILDREN"] = rng.poisson(0.4, n)
+    df["CNT_FAM_MEMBERS"] = with_missing(rng, df["CNT_CHILDREN"] + rng.integers(1, 3, n), 0.0001)
+    df["AMT_INCOME_TOTAL"] = np.round(rng.lognormal(11.9, 0.5, n), -2)
+    df["AMT_CREDIT"] = np.round(rng.lognormal(13.0, 0.7, n), 1)
+    df["AMT_ANNUITY"] = with_missing(rng, np.round(df["AMT_CREDIT"] / rng.choice([12, 24, 36, 48, 60], n) * 1.2, 1), 0.0001)
+    df["AMT_GOODS_PRICE"] = with_missing(rng, np.round(df["AMT_CREDIT"] * rng.uniform(0.8, 1.0, n), -2), 0.001)
+    df["REGION_POPULATION_RELATIVE"] = rng.uniform(0.0003, 0.07, n)
+    df["DAYS_BIRTH"] = -rng.integers(7500, 25000, n)
+    df["DAYS_EMPLOYED"] = np.where(rng.random(n) < 0.18, 365243, -rng.integers(0, 15000, n))
+    df["DAYS_REGISTRATION"] = -rng.integers(0, 20000, n).astype(float)
+    df["DAYS_ID_PUBLISH"] = -rng.integers(0, 7000, n)
+    df["OWN_CAR_AGE"] = with_missing(rng, rng.integers(0, 40, n), 0.66)
+    df["REGION_RATING_CLIENT"] = rng.integers(1, 4, n)
+    df["REGION_RATING_CLIENT_W_CITY"] = rng.integers(1, 4, n)
+    df["HOUR_APPR_PROCESS_START"] = rng.integers(0, 24, n)
+    df["EXT_SOURCE_1"] = with_missing(rng, rng.beta(3, 3, n), 0.56)
+    df["EXT_SOURCE_2"] = with_missing(rng, rng.beta(4, 2, n), 0.002)
+    df["EXT_SOURCE_3"] = with_missing(rng, rng.beta(4, 3, n), 0.2)
+    for stat in building_stats:
+        base = rng.beta(1.5, 8, n)
+        for suffix in ["AVG", "MODE", "MEDI"]:
+            df[f"{stat}_{suffix}"] = with_missing(rng, base * rng.uniform(0.95, 1.05, n), 0.55)
+    df["TOTALAREA_MODE"] = with_missing(rng, rng.beta(1.5, 8, n), 0.48)
+    for days in [30, 60]:
+        df[f"OBS_{days}_CNT_SOCIAL_CIRCLE"] = with_missing(rng, rng.poisson(1.4, n), 0.003)
+        df[f"DEF_{days}_CNT_SOCIAL_CIRCLE"] = with_missing(rng, rng.poisson(0.1, n), 0.003)
+    df["DAYS_LAST_PHONE_CHANGE"] = -rng.integers(0, 4000, n).astype(float)
+    for period, lam in [("HOUR", 0.006), ("DAY", 0.007), ("WEEK", 0.03), ("MON", 0.27), ("QRT", 0.27), ("YEAR", 1.9)]:
+        df[f"AMT_REQ_CREDIT_BUREAU_{period}"] = with_missing(rng, rng.poisson(lam, n), 0.135)
+    return pd.DataFrame(df)
+
+
+def generate_bureau(rng: np.random.Generator, sk_ids: np.ndarray) -> pd.DataFrame:
+    """
+    Generates bureau rows for the given customers.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        sk_ids (np.ndarray): SK_ID_CURR of all customers.
+
+    Returns:
+        pd.DataFrame: The bureau credits.
+    """
+    counts = fan_out_counts(rng, sk_ids.shape[0], *fan_out["bureau"])
+    n = counts.sum()
+    days_credit = -rng.integers(0, 2922, n)
+    duration = rng.choice([180, 365, 730, 1095, 1825, 3650], n)
+    active = choice(rng, ["Closed", "Active", "Sold", "Bad debt"], n)
+    amt_credit = np.round(rng.lognormal(12.0, 1.2, n), 1)
+    debt_share = rng.uniform(0, 1, n) * (active == "Active")
+    return pd.DataFrame(
+        {
+            "SK_ID_CURR": np.repeat(sk_ids, counts),
+            "SK_ID_BUREAU": 5000000 + np.arange(n),
+            "CREDIT_ACTIVE": active,
+            "CREDIT_CURRENCY": choice(rng, ["currency 1", "currency 2", "currency 3", "currency 4"], n),
+            "DAYS_CREDIT": days_credit,
+            "CREDIT_DAY_OVERDUE": np.where(rng.random(n) < 0.02, rng.integers(1, 2000, n), 0),
+            "DAYS_CREDIT_ENDDATE": with_missing(rng, days_credit + duration, 0.06),
+            "DAYS_ENDDATE_FACT": with_missing(rng, days_credit + duration * rng.uniform(0.3, 1.0, n), 0.37),
+            "AMT_CREDIT_MAX_OVERDUE": with_missing(rng, np.where(rng.random(n) < 0.1, rng.lognormal(8, 2, n), 0), 0.65),
+            "CNT_CREDIT_PROLONG": np.where(rng.random(n) < 0.005, rng.integers(1, 5, n), 0),
+            "AMT_CREDIT_SUM": with_missing(rng, amt_credit, 0.00001),
+            "AMT_CREDIT_SUM_DEBT": with_missing(rng, np.round(amt_credit * debt_share, 1), 0.15),
+            "AMT_CREDIT_SUM_LIMIT": with_missing(rng, np.where(rng.random(n) < 0.1, amt_credit * 0.3, 0), 0.34),
+            "AMT_CREDIT_SUM_OVERDUE": np.where(rng.random(n) < 0.003, rng.lognormal(8, 2, n), 0),
+            "CREDIT_TYPE": choice(rng, ["Consumer credit", "Credit card", "Car loan", "Mortgage", "Microloan", "Loan for business development"], n),
+            "DAYS_CREDIT_UPDATE": days_credit + rng.integers(0, 2922, n),
+            "AMT_ANNUITY": with_missing(rng, np.round(amt_credit / duration * 30 * 1.15, 1), 0.71),
+        }
+    )
+
+
+def generate_bureau_balance(rng: np.random.Generator, bureau: pd.DataFrame) -> pd.DataFrame:
+    """
+    Generates monthly bureau_balance rows for a share of the bureau credits.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        bureau (pd.DataFrame): The bureau credits.
+
+    Returns:
+        pd.DataFrame: The monthly statuses of bureau credits.
+    """
+    bureau_ids = bureau["SK_ID_BUREAU"].values
+    bureau_ids = bureau_ids[rng.random(bureau_ids.shape[0]) < share_bureau_credits_with_balance]
+    counts = fan_out_counts(rng, bureau_ids.shape[0], *fan_out["bureau_balance"]) + 1
+    n = counts.sum()
+    # months count backwards from 0 for every credit
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    return pd.DataFrame(
+        {
+            "SK_ID_BUREAU": np.repeat(bureau_ids, counts),
+            "MONTHS_BALANCE": -(np.arange(n) - offsets),
+            "STATUS": choice(rng, ["C", "0", "X", "1", "5", "2", "3", "4"], n),
+        }
+    )
+
+
+def generate_previous_applications(rng: np.random.Generator, sk_ids: np.ndarray) -> pd.DataFrame:
+    """
+    Generates previous_application rows for the given customers.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        sk_ids (np.ndarray): SK_ID_CURR of all customers.
+
+    Returns:
+        pd.DataFrame: The previous applications.
+    """
+    counts = fan_out_counts(rng, sk_ids.shape[0], *fan_out["previous_application"])
+    n = counts.sum()
+    df = {
+        "SK_ID_PREV": 1000000 + np.arange(n),
+        "SK_ID_CURR": np.repeat(sk_ids, counts),
+    }
+    for col, options in previous_app_categoricals.items():
+        df[col] = choice(rng, options, n)
+    cnt_payment = rng.choice([6, 12, 18, 24, 30, 36, 48, 60], n).astype(float)
+    interest = rng.uniform(0.085, 0.45, n)
+    amt_application = np.round(rng.lognormal(11.5, 1.0, n), 1)
+    amt_credit = np.round(amt_application * rng.uniform(0.9, 1.2, n), 1)
+    days_decision = -rng.integers(1, 2922, n)
+    first_due = days_decision + rng.integers(10, 60, n)
+    df.update(
+        {
+            "AMT_ANNUITY": with_missing(rng, np.round(amt_credit * (1 + interest) ** (cnt_payment / 12) / cnt_payment, 1), 0.22),
+            "AMT_APPLICATION": amt_application,
+            "AMT_CREDIT": amt_credit,
+            "AMT_DOWN_PAYMENT": with_missing(rng, np.round(amt_application * rng.uniform(0, 0.2, n), 1), 0.54),
+            "AMT_GOODS_PRICE": with_missing(rng, amt_application, 0.23),
+            "HOUR_APPR_PROCESS_START": rng.integers(0, 24, n),
+            "NFLAG_LAST_APPL_IN_DAY": (rng.random(n) < 0.996).astype(int),
+            "RATE_DOWN_PAYMENT": with_missing(rng, rng.uniform(0, 0.3, n), 0.54),
+            "RATE_INTEREST_PRIMARY": with_missing(rng, interest, 0.997),
+            "RATE_INTEREST_PRIVILEGED": with_missing(rng, interest, 0.997),
+            "DAYS_DECISION": days_decision,
+            "SELLERPLACE_AREA": rng.integers(-1, 5000, n),
+            "CNT_PAYMENT": with_missing(rng, cnt_payment, 0.22),
+            "DAYS_FIRST_DRAWING": with_missing(rng, np.where(rng.random(n) < 0.96, 365243, days_decision + 5), 0.4),
+            "DAYS_FIRST_DUE": with_missing(rng, first_due, 0.4),
+            "DAYS_LAST_DUE_1ST_VERSION": with_missing(rng, first_due + cnt_payment * 30, 0.4),
+            "DAYS_LAST_DUE": with_missing(rng, np.where(rng.random(n) < 0.5, 365243, first_due + cnt_payment * 30), 0.4),
+            "DAYS_TERMINATION": with_missing(rng, np.where(rng.random(n) < 0.55, 365243, first_due + cnt_payment * 30), 0.4),
+            "NFLAG_INSURED_ON_APPROVAL": with_missing(rng, (rng.random(n) < 0.33).astype(int), 0.4),
+        }
+    )
+    return pd.DataFrame(df)
+
+
+def generate_monthly_history(rng: np.random.Generator, previous: pd.DataFrame, settings_key: str) -> pd.DataFrame:
+    """
+    Generates the skeleton of a monthly history (SK_ID_PREV, SK_ID_CURR, MONTHS_BALANCE) for previous loans.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        previous (pd.DataFrame): Previous loans to generate the history for.
+        settings_key (str): Key of the fan-out settings to use.
+
+    Returns:
+        pd.DataFrame: One row per loan and month, months counting backwards from the most recent one.
+    """
+    counts = fan_out_counts(rng, previous.shape[0], *fan_out[settings_key]) + 1
+    n = counts.sum()
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    last_month = np.repeat(-rng.integers(1, 72, previous.shape[0]), counts)
+    return pd.DataFrame(
+        {
+            "SK_ID_PREV": np.repeat(previous["SK_ID_PREV"].values, counts),
+            "SK_ID_CURR": np.repeat(previous["SK_ID_CURR"].values, counts),
+            "MONTHS_BALANCE": last_month - (np.arange(n) - offsets),
+        }
+    )
+
+
+def generate_pos_cash_balance(rng: np.random.Generator, previous: pd.DataFrame) -> pd.DataFrame:
+    """
+    Generates POS_CASH_balance rows for the previous loans.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        previous (pd.DataFrame): The previous applications.
+
+    Returns:
+        pd.DataFrame: Monthly POS and cash loan balances.
+    """
+    df = generate_monthly_history(rng, previous, "pos_cash_balance")
+    n = df.shape[0]
+    cnt_instalment = with_missing(rng, rng.choice([6, 10, 12, 18, 24, 36, 48], n), 0.003)
+    df["CNT_INSTALMENT"] = cnt_instalment
+    df["CNT_INSTALMENT_FUTURE"] = np.maximum(cnt_instalment - rng.integers(0, 24, n), 0)
+    df["NAME_CONTRACT_STATUS"] = choice(rng, ["Active", "Completed", "Signed", "Demand", "Returned to the store"], n)
+    df["SK_DPD"] = np.where(rng.random(n) < 0.03, rng.integers(1, 500, n), 0)
+    df["SK_DPD_DEF"] = np.where(rng.random(n) < 0.01, rng.integers(1, 50, n), 0)
+    return df
+
+
+def generate_installments_payments(rng: np.random.Generator, previous: pd.DataFrame) -> pd.DataFrame:
+    """
+    Generates installments_payments rows for the previous loans.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        previous (pd.DataFrame): The previous applications.
+
+    Returns:
+        pd.DataFrame: Installment schedules and the corresponding payments.
+    """
+    df = generate_monthly_history(rng, previous, "installments_payments")
+    n = df.shape[0]
+    amt_instalment = np.round(rng.lognormal(9.2, 1.1, n), 2)
+    days_instalment = (df["MONTHS_BALANCE"].values * 30 + rng.integers(0, 30, n)).astype(float)
+    df.drop(columns="MONTHS_BALANCE", inplace=True)
+    df["NUM_INSTALMENT_VERSION"] = choice(rng, [1, 0, 2, 3, 4], n).astype(float)
+    df["NUM_INSTALMENT_NUMBER"] = df.groupby("SK_ID_PREV").cumcount().values + 1
+    df["DAYS_INSTALMENT"] = days_instalment
+    df["DAYS_ENTRY_PAYMENT"] = with_missing(rng, days_instalment + np.round(rng.normal(-8, 12, n)), 0.0002)
+    df["AMT_INSTALMENT"] = amt_instalment
+    df["AMT_PAYMENT"] = with_missing(rng, np.where(rng.random(n) < 0.9, amt_instalment, amt_instalment * rng.uniform(0, 2, n)), 0.0002)
+    return df
+
+
+def generate_credit_card_balance(rng: np.random.Generator, previous: pd.DataFrame) -> pd.DataFrame:
+    """
+    Generates credit_card_balance rows for a share of the customers.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        previous (pd.DataFrame): The previous applications.
+
+    Returns:
+        pd.DataFrame: Monthly credit card balances.
+    """
+    card_owners = previous.drop_duplicates("SK_ID_CURR")
+    card_owners = card_owners[rng.random(card_owners.shape[0]) < share_customers_with_cards]
+    df = generate_monthly_history(rng, card_owners, "credit_card_balance")
+    n = df.shape[0]
+    limit = rng.choice([0, 45000, 90000, 135000, 180000, 270000], n).astype(float)
+    balance = limit * rng.beta(0.7, 1.5, n)
+    drawings_atm = with_missing(rng, np.where(rng.random(n) < 0.15, limit * rng.uniform(0, 0.2, n), 0), 0.2)
+    drawings_pos = with_missing(rng, np.where(rng.random(n) < 0.15, limit * rng.uniform(0, 0.2, n), 0), 0.2)
+    drawings_other = with_missing(rng, np.where(rng.random(n) < 0.01, limit * rng.uniform(0, 0.2, n), 0), 0.2)
+    min_inst = with_missing(rng, balance * 0.05, 0.08)
+    payment = with_missing(rng, min_inst * rng.uniform(0, 3, n), 0.2)
+    df["AMT_BALANCE"] = balance
+    df["AMT_CREDIT_LIMIT_ACTUAL"] = limit
+    df["AMT_DRAWINGS_ATM_CURRENT"] = drawings_atm
+    df["AMT_DRAWINGS_CURRENT"] = np.nansum([drawings_atm, drawings_pos, drawings_other], axis=0)
+    df["AMT_DRAWINGS_OTHER_CURRENT"] = drawings_other
+    df["AMT_DRAWINGS_POS_CURRENT"] = drawings_pos
+    df["AMT_INST_MIN_REGULARITY"] = min_inst
+    df["AMT_PAYMENT_CURRENT"] = payment
+    df["AMT_PAYMENT_TOTAL_CURRENT"] = np.nan_to_num(payment)
+    df["AMT_RECEIVABLE_PRINCIPAL"] = balance * 0.95
+    df["AMT_RECIVABLE"] = balance
+    df["AMT_TOTAL_RECEIVABLE"] = balance
+    df["CNT_DRAWINGS_ATM_CURRENT"] = with_missing(rng, (drawings_atm > 0) * rng.integers(1, 5, n), 0.2)
+    df["CNT_DRAWINGS_CURRENT"] = rng.poisson(0.7, n)
+    df["CNT_DRAWINGS_OTHER_CURRENT"] = with_missing(rng, (drawings_other > 0).astype(int), 0.2)
+    df["CNT_DRAWINGS_POS_CURRENT"] = with_missing(rng, (drawings_pos > 0) * rng.integers(1, 10, n), 0.2)
+    df["CNT_INSTALMENT_MATURE_CUM"] = with_missing(rng, rng.integers(0, 60, n), 0.08)
+    df["NAME_CONTRACT_STATUS"] = choice(rng, ["Active", "Completed", "Signed", "Demand"], n)
+    df["SK_DPD"] = np.where(rng.random(n) < 0.04, rng.integers(1, 300, n), 0)
+    df["SK_DPD_DEF"] = np.where(rng.random(n) < 0.02, rng.integers(1, 30, n), 0)
+    return df
+
+
+def generate_synthetic_data(path_to_data: str, n_train: int, seed: int = 7, n_test: Optional[int] = None) -> Dict[str, int]:
+    """
+    Generates schema-faithful synthetic versions of all competition tables and saves them as CSV files.
+
+    Args:
+        path_to_data (str): Directory the CSV files are written to.
+        n_train (int): Number of customers in application_train.
+        seed (int): Random seed.
+        n_test (Optional[int]): Number of customers in application_test. Defaults to the competition ratio.
+
+    Returns:
+        Dict[str, int]: Number of rows written per table.
+    """
+    rng = np.random.default_rng(seed)
+    if n_test is None:
+        n_test = max(1, int(n_train * test_to_train_ratio))
+    os.makedirs(path_to_data, exist_ok=True)
+    sk_ids = 100000 + rng.permutation(n_train + n_test)
+    tables = {
+        "application_train": generate_applications(rng, np.sort(sk_ids[:n_train]), True),
+        "application_test": generate_applications(rng, np.sort(sk_ids[n_train:]), False),
+    }
+    tables["bureau"] = generate_bureau(rng, sk_ids)
+    tables["bureau_balance"] = generate_bureau_balance(rng, tables["bureau"])
+    tables["previous_application"] = generate_previous_applications(rng, sk_ids)
+    tables["POS_CASH_balance"] = generate_pos_cash_balance(rng, tables["previous_application"])
+    tables["installments_payments"] = generate_installments_payments(rng, tables["previous_application"])
+    tables["credit_card_balance"] = generate_credit_card_balance(rng, tables["previous_application"])
+
+    n_rows = {}
+    for name, df in tables.items():
+        df.to_csv(os.path.join(path_to_data, f"{name}.csv"), index=False)
+        n_rows[name] = df.shape[0]
+    return n_rows
+
+
+def main() -> None:
+    """
+    Generates a synthetic dataset from the command line.
+    """
+    parser = argparse.ArgumentParser(description="Synthetic Home Credit data generator")
+    parser.add_argument("--path_to_data", required=True, type=str, help="Output directory")
+    parser.add_argument("--n_train", type=int, default=10000, help="Number of train customers")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed")
+    args = parser.parse_args()
+    for name, rows in generate_synthetic_data(args.path_to_data, args.n_train, args.seed).items():
+        print(f"{name}: {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+import os
+import json
+import argparse
+from typing import List, Optional, Iterator, Tuple
+import numpy as np
+import pandas as pd
+
+### monthly channels of the user image, per table: the column and unit (in days) of the event time, the columns
+### to read and the channels as (name, value, reduction of the rows falling in the same month)
+### values are non-negative, so 0 means no event in the month
+image_sources = {
+    "bureau": {
+        "time": ("DAYS_CREDIT", 30),
+        "columns": ["SK_ID_CURR", "SK_ID_BUREAU", "DAYS_CREDIT", "AMT_CREDIT_SUM", "CREDIT_DAY_OVERDUE"],
+        "channels": [
+            ("bureau_credits", lambda df: np.ones(len(df)), "sum"),
+            ("bureau_amt_credit", lambda df: df["AMT_CREDIT_SUM"], "sum"),
+            ("bureau_day_overdue", lambda df: df["CREDIT_DAY_OVERDUE"], "max"),
+        ],
+    },
+    "bureau_balance": {
+        "time": ("MONTHS_BALANCE", 1),
+        "columns": ["SK_ID_BUREAU", "MONTHS_BALANCE", "STATUS"],
+        "channels": [
+            # statuses 1-5 are buckets of days past due, C and X carry no delay
+            ("bureau_dpd_status", lambda df: pd.to_numeric(df["STATUS"], errors="coerce"), "max"),
+        ],
+    },
+    "previous_application": {
+        "time": ("DAYS_DECISION", 30),
+        "columns": ["SK_ID_CURR", "DAYS_DECISION", "NAME_CONTRACT_STATUS", "AMT_CREDIT"],
+        "channels": [
+            ("prev_applications", lambda df: np.ones(len(df)), "sum"),
+            ("prev_refused", lambda df: df["NAME_CONTRACT_STATUS"] == "Refused", "sum"),
+            ("prev_amt_credit", lambda df: df["AMT_CREDIT"], "sum"),
+        ],
+    },
+    "installments_payments": {
+        "time": ("DAYS_INSTALMENT", 30),
+        "columns": ["SK_ID_CURR", "DAYS_INSTALMENT", "DAYS_ENTRY_PAYMENT", "AMT_INSTALMENT", "AMT_PAYMENT"],
+        "channels": [
+            ("inst_days_late", lambda df: (df["DAYS_ENTRY_PAYMENT"] - df["DAYS_INSTALMENT"]).clip(lower=0), "max"),
+            ("inst_missing_money", lambda df: (df["AMT_INSTALMENT"] - df["AMT_PAYMENT"]).clip(lower=0), "sum"),
+        ],
+    },
+    "POS_CASH_balance": {
+        "time": ("MONTHS_BALANCE", 1),
+        "columns": ["SK_ID_CURR", "MONTHS_BALANCE", "SK_DPD", "CNT_INSTALMENT_FUTURE"],
+        "channels": [
+            ("pos_dpd", lambda df: df["SK_DPD"], "max"),
+            ("pos_instalments_left", lambda df: df["CNT_INSTALMENT_FUTURE"], "sum"),
+        ],
+    },
+    "credit_card_balance": {
+        "time": ("MONTHS_BALANCE", 1),
+        "columns": ["SK_ID_CURR", "MONTHS_BALANCE", "AMT_BALANCE", "AMT_DRAWINGS_CURRENT", "SK_DPD"],
+        "channels": [
+            ("cc_balance", lambda df: df["AMT_BALANCE"], "sum"),
+            ("cc_drawings", lambda df: df["AMT_DRAWINGS_CURRENT"], "sum"),
+            ("cc_dpd", lambda df: df["SK_DPD"], "max"),
+        ],
+    },
+}
+reductions = {"sum": np.add, "max": np.maximum}
+n_history_months = 96
+chunk_rows = 1_000_000
+
+
+class UserImageStore:
+    """
+    A disk-backed (n_customers, n_months, n_channels) float32 tensor of monthly customer histories.
+
+    Month 0 is the month before the application, month k the k-th month before it. The tensor is stored in C order,
+    so the image of a customer is one contiguous block and batches of customers are read with a single slice.
+
+    Attributes:
+        path (str): Directory of the store.
+        manifest (dict): Number of customers and months and the channel names.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Opens the user image store in a directory, reading its manifest if the store exists.
+
+        Args:
+            path (str): Directory of the store.
+        """
+        self.path = path
+        self.manifest = {"n_customers": 0, "n_months": n_history_months, "channels": []}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as file:
+                self.manifest = json.load(file)
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.path, "manifest.json")
+
+    @property
+    def tensor_path(self) -> str:
+        return os.path.join(self.path, "images.f32")
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return self.manifest["n_customers"], self.manifest["n_months"], len(self.manifest["channels"])
+
+    @property
+    def channels(self) -> List[str]:
+        return self.manifest["channels"]
+
+    def create(self, ids: np.ndarray, channels: List[str], n_months: int = n_history_months) -> "UserImageStore":
+        """
+        Creates an all-zero tensor for the given customers, replacing any previous content.
+
+        Args:
+            ids (np.ndarray): SK_ID_CURR of the customers, in row order.
+            channels (List[str]): Names of the channels.
+            n_months (int): Number of months of history.
+
+        Returns:
+            UserImageStore: The empty store.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        np.save(os.path.join(self.path, "ids.npy"), np.asarray(ids))
+        self.manifest = {"n_customers": len(ids), "n_months": n_months, "channels": list(channels)}
+        with open(self.manifest_path, "w") as file:
+            json.dump(self.manifest, file)
+        # a new memmap file is zero-filled (and sparse on disk)
+        np.memmap(self.tensor_path, dtype=np.float32, mode="w+", shape=self.shape).flush()
+        return self
+
+    def ids(self) -> np.ndarray:
+        """
+        Returns the SK_ID_CURR of the customers.
+
+        Returns:
+            np.ndarray: The ids, in row order.
+        """
+        return np.load(os.path.join(self.path, "ids.npy"))
+
+    def tensor(self, mode: str = "r") -> np.memmap:
+        """
+        Maps the tensor.
+
+        Args:
+            mode (str): 'r' for read-only access, 'r+' to update it in place.
+
+        Returns:
+            np.memmap: The (n_customers, n_months, n_channels) tensor.
+        """
+        return np.memmap(self.tensor_path, dtype=np.float32, mode=mode, shape=self.shape)
+
+    def batches(self, batch_size: int = 4096, rows: Optional[np.ndarray] = None) -> Iterator[np.ndarray]:
+        """
+        Reads the images in batches, for training a model on data that does not fit in memory.
+
+        Args:
+            batch_size (int): Number of customers per batch.
+            rows (Optional[np.ndarray]): Customer rows to read, in order. If None, all customers in row order.
+
+        Yields:
+            np.ndarray: The (batch_size, n_months, n_channels) images of the next customers.
+        """
+        tensor = self.tensor()
+        n_rows = self.shape[0] if rows is None else len(rows)
+        for start in range(0, n_rows, batch_size):
+            if rows is None:
+                yield np.array(tensor[start : start + batch_size])
+            else:
+                # sorted reads are sequential on disk, the batch keeps the requested order
+                batch_rows = rows[start : start + batch_size]
+                order = np.argsort(batch_rows, kind="stable")
+                batch = np.empty((len(batch_rows),) + self.shape[1:], dtype=np.float32)
+                batch[order] = tensor[batch_rows[order]]
+                yield batch
+
+
+class UserImageBuilder:
+    """
+    Builds the user images of the README's convolutional network by streaming every child table once.
+
+    Every chunk of a table is scattered into the memory-mapped tensor with vectorized indexing: the rows are mapped
+    to (customer, month) cells by a binary search of the customer ids, sorted once by cell, and reduced per cell
+    with ufunc.reduceat before being combined with the values of the previous chunks.
+
+    Attributes:
+        path_to_data (str): Path to the data directory.
+        customer_ids (np.ndarray): SK_ID_CURR of the images, in row order.
+        n_months (int): Number of months of history.
+        chunk_rows (int): Number of rows read at once.
+        channels (List[str]): Names of all channels, in tensor order.
+    """
+
+    def __init__(
+        self,
+        path_to_data: str,
+        customer_ids: np.ndarray,
+        n_months: int = n_history_months,
+        chunk_rows: int = chunk_rows,
+    ) -> None:
+        """
+        Initializes the UserImageBuilder.
+
+        Args:
+            path_to_data (str): Path to the data directory.
+            customer_ids (np.ndarray): SK_ID_CURR of the images, in row order. Rows of other customers are skipped.
+            n_months (int): Number of months of history. Older events are skipped.
+            chunk_rows (int): Number of rows read at once.
+        """
+        self.path_to_data = path_to_data
+        self.customer_ids = np.asarray(customer_ids)
+        self.n_months = n_months
+        self.chunk_rows = chunk_rows
+        self.channels = [name for source in image_sources.values() for name, _, _ in source["channels"]]
+        self._id_order = np.argsort(self.customer_ids, kind="stable")
+        self._sorted_ids = self.customer_ids[self._id_order]
+        self._bureau_ids = None
+        self._bureau_customers = None
+
+    @staticmethod
+    def lookup(sorted_keys: np.ndarray, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds keys in a sorted array.
+
+        Args:
+            sorted_keys (np.ndarray): The sorted array.
+            keys (np.ndarray): The keys to find.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The position of every key and whether it was found.
+        """
+        if len(sorted_keys) == 0:
+            return np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=bool)
+        positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+        return positions, sorted_keys[positions] == keys
+
+    def customer_rows(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Maps SK_ID_CURR values to image rows.
+
+        Args:
+            ids (np.ndarray): SK_ID_CURR values.
+
+        Returns:
+            np.ndarray: The image row of every id, -1 for customers without an image.
+        """
+        positions, found = self.lookup(self._sorted_ids, ids)
+        return np.where(found, self._id_order[positions], -1)
+
+    def month_index(self, table: str, df: pd.DataFrame) -> np.ndarray:
+        """
+        Computes how many months before the application the rows happened.
+
+        Month 0 holds the last 30 days before the application in every table: for tables timed in days it is
+        floor(-days / 30), and for tables timed in MONTHS_BALANCE it is -months - 1, so that -1 (the last
+        month) lands in month 0 as well. MONTHS_BALANCE 0, the month of the application, is merged into month 0,
+        like day 0 of the day-timed tables.
+
+        Args:
+            table (str): The table name.
+            df (pd.DataFrame): Rows of the table.
+
+        Returns:
+            np.ndarray: The month of every row, negative for rows without a time.
+        """
+        column, days_per_unit = image_sources[table]["time"]
+        time = df[column].to_numpy(dtype=np.float64)
+        months = np.floor(-time / days_per_unit) if days_per_unit > 1 else np.maximum(-time - 1, 0)
+        return np.where(np.isnan(months), -1, months).astype(np.int64)
+
+    def attach_customers(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """
+        Adds SK_ID_CURR to bureau_balance rows from the bureau credits streamed before.
+
+        Args:
+            chunk (pd.DataFrame): Rows of bureau_balance.
+
+        Returns:
+            pd.DataFrame: The rows of known credits, with SK_ID_CURR.
+        """
+        positions, found = self.lookup(self._bureau_ids, chunk["SK_ID_BUREAU"].to_numpy())
+        chunk = chunk[found].copy()
+        chunk["SK_ID_CURR"] = self._bureau_customers[positions[found]]
+        return chunk
+
+    def scatter(self, table: str, chunk: pd.DataFrame, flat: np.ndarray) -> None:
+        """
+        Adds the channels of a chunk of rows to the tensor.
+
+        Args:
+            table (str): The table name.
+            chunk (pd.DataFrame): Rows of the table, with SK_ID_CURR.
+            flat (np.ndarray): The flattened tensor, updated in place.
+        """
+        rows = self.customer_rows(chunk["SK_ID_CURR"].to_numpy())
+        months = self.month_index(table, chunk)
+        keep = (rows >= 0) & (months >= 0) & (months < self.n_months)
+        if not keep.any():
+            return
+        cells = (rows[keep] * self.n_months + months[keep]) * len(self.channels)
+        order = np.argsort(cells, kind="stable")
+        cells = cells[order]
+        starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])
+        for name, value, how in image_sources[table]["channels"]:
+            values = np.nan_to_num(np.asarray(value(chunk), dtype=np.float64)[keep][order])
+            reduced = reductions[how].reduceat(values, starts)
+            targets = cells[starts] + self.channels.index(name)
+            flat[targets] = reductions[how](flat[targets], reduced)
+
+    def build(self, output_dir: str) -> UserImageStore:
+        """
+        Streams all child tables into a new user image store.
+
+        Args:
+            output_dir (str): Directory of the store.
+
+        Returns:
+            UserImageStore: The filled store.
+        """
+        store = UserImageStore(output_dir).create(self.customer_ids, self.channels, self.n_months)
+        tensor = store.tensor(mode="r+")
+        flat = tensor.reshape(-1)
+        bureau_ids, bureau_customers = [], []
+        for table, source in image_sources.items():
+            if table == "bureau_balance":
+                order = np.argsort(np.concatenate(bureau_ids), kind="stable")
+                self._bureau_ids = np.concatenate(bureau_ids)[order]
+                self._bureau_customers = np.concatenate(bureau_customers)[order]
+            for chunk in pd.read_csv(
+                self.path_to_data + f"{table}.csv", usecols=source["columns"], chunksize=self.chunk_rows
+            ):
+                if table == "bureau":
+                    bureau_ids.append(chunk["SK_ID_BUREAU"].to_numpy())
+                    bureau_customers.append(chunk["SK_ID_CURR"].to_numpy())
+                if table == "bureau_balance":
+                    chunk = self.attach_customers(chunk)
+                self.scatter(table, chunk, flat)
+            print(f"User images: {table} done")
+        tensor.flush()
+        return store
+
+
+def main() -> None:
+    """
+    Builds the user images of all train and test customers from the command line.
+    """
+    parser = argparse.ArgumentParser(description="User image builder")
+    parser.add_argument("--path_to_data", required=True, type=str, help="Path to the data directory")
+    parser.add_argument("--output_dir", required=True, type=str, help="Directory of the user image store")
+    parser.add_argument("--n_months", type=int, default=n_history_months, help="Number of months of history")
+    parser.add_argument("--chunk_rows", type=int, default=chunk_rows, help="Number of rows read at once")
+    args = parser.parse_args()
+    # same row order as the main frame: train customers, then test customers
+    customer_ids = np.concatenate(
+        [
+            pd.read_csv(args.path_to_data + f"{name}.csv", usecols=["SK_ID_CURR"])["SK_ID_CURR"].to_numpy()
+            for name in ["application_train", "application_test"]
+        ]
+    )
+    store = UserImageBuilder(args.path_to_data, customer_ids, args.n_months, args.chunk_rows).build(args.output_dir)
+    print(f"User images: {store.shape} in {store.tensor_path}")
+
+
+if __name__ == "__main__":
+    main()
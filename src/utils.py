@@ -1,8 +1,21 @@
 import json
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Any
 import numpy as np
 import pandas as pd
 
+### name prefixes of the features of every source processor, most specific first; features without one of them
+### come from the application table, except the integer-named previous application one-hot counts
+feature_sources = {
+    "installments_payments_nested": "NestedInstallmentsModel",
+    "installments_payments": "InstallmentsPaymentsData",
+    "previous_app": "PreviousApplicationData",
+    "buro_bal": "BureauBalanceData",
+    "bureau": "BureauData",
+    "pos_bal": "POSCashBalanceData",
+    "cc_bal": "CreditCardBalanceData",
+    "pred": "LoanTermsModel",
+}
+
 
 def load_features_and_params(path_to_opt_settings: str) -> Tuple[List[str], Dict]:
     """
@@ -90,3 +103,50 @@ def reduce_column_names(multi_level_df: pd.DataFrame, prefix: str) -> list:
     ]
 
     return new_columns
+
+
+def agg_name(agg: Any) -> str:
+    """
+    Returns the label pandas uses for an aggregation in the second level of the column index.
+
+    Parameters:
+    agg (Any): An aggregation from a recipe, either a string like "sum" or a callable.
+
+    Returns:
+    str: The aggregation label, e.g. "sum" or "dispersion".
+    """
+    return agg if isinstance(agg, str) else agg.__name__
+
+
+def recipe_feature_name(prefix: str, column: str, agg: Any) -> str:
+    """
+    Builds the name of the feature produced by a single recipe entry, consistently with reduce_column_names.
+
+    Parameters:
+    prefix (str): The prefix passed to reduce_column_names for the segment.
+    column (str): The aggregated column.
+    agg (Any): The aggregation, either a string or a callable.
+
+    Returns:
+    str: The final feature name.
+    """
+    return f"{prefix}_{column}_{agg_name(agg)}".replace(" ", "_")
+
+
+def feature_source(feature: str) -> str:
+    """
+    Finds the processor a feature comes from, by its name prefix.
+
+    Parameters:
+    feature (str): The feature name.
+
+    Returns:
+    str: The name of the processor class (or model stage) producing the feature.
+    """
+    # the previous application one-hot counts keep the integer names of their category columns
+    if str(feature).isdigit():
+        return "PreviousApplicationData"
+    for prefix, source in feature_sources.items():
+        if feature.startswith(f"{prefix}_"):
+            return source
+    return "MainData"
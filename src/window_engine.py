@@ -0,0 +1,219 @@
+from typing import List, Dict, Any, Optional
+import numpy as np
+import pandas as pd
+from utils import agg_name
+from kernels import SegmentKernel
+from aggregation_backends import PandasBackend
+
+### aggregations derived from cumulative scans; everything else falls back to the aggregation backend
+window_aggregations = {"count", "sum", "mean", "min", "max", "dispersion", "share_na"}
+
+
+class WindowEngine:
+    """
+    Evaluates aggregation recipes over nested time windows of a child table in a single pass.
+
+    The rows are sorted once per customer so that every window (time > threshold, or time < threshold) is a
+    prefix of the customer's segment. Grouped cumulative counts and sums (and cumulative min/max) are computed
+    once per column, and the statistics of every window are read off at the last row of its prefix, instead of
+    filtering and grouping the table again for every window.
+
+    Attributes:
+        key (str): The grouping column.
+        time_col (str): The column defining the windows.
+        below (bool): Whether windows keep rows below the threshold (True) or above it (False).
+        backend (Any): Aggregation backend used for aggregations without a cumulative form.
+        order_by (Optional[str]): Column ordering the rows within a group for backend segment kernels.
+        df (pd.DataFrame): The rows, sorted by key and by distance from the window origin.
+        starts (np.ndarray): First row of every group.
+        sizes (np.ndarray): Number of rows of every group.
+        keys (np.ndarray): Key of every group.
+        group_ids (np.ndarray): Group of every row.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        key: str,
+        time_col: str,
+        backend: Any = None,
+        below: bool = False,
+        order_by: Optional[str] = None,
+    ) -> None:
+        """
+        Initializes the WindowEngine, sorting the rows once.
+
+        Args:
+            df (pd.DataFrame): The rows to aggregate.
+            key (str): The grouping column.
+            time_col (str): The column defining the windows.
+            backend (Any): Aggregation backend for the remaining aggregations. Defaults to pandas.
+            below (bool): If True, windows keep rows with time < threshold, otherwise rows with time > threshold.
+            order_by (Optional[str]): Column ordering the rows within a group for backend segment kernels.
+        """
+        self.key = key
+        self.time_col = time_col
+        self.below = below
+        self.backend = backend if backend is not None else PandasBackend()
+        self.order_by = order_by
+        # rows without a time are never inside a bounded window, so they go to the end of their segment
+        self.df = df.sort_values(
+            [key, time_col], ascending=[True, below], na_position="last", kind="mergesort"
+        )
+        keys = self.df[key].to_numpy()
+        self.starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.zeros(0, dtype=np.int64)
+        self.sizes = np.diff(np.append(self.starts, len(keys)))
+        self.keys = keys[self.starts]
+        self.group_ids = np.repeat(np.arange(len(self.starts)), self.sizes)
+
+    def window_lengths(self, threshold: Optional[float]) -> np.ndarray:
+        """
+        Counts the rows of every group inside a window.
+
+        Args:
+            threshold (Optional[float]): The window bound. None means all rows.
+
+        Returns:
+            np.ndarray: The length of the window prefix of every group.
+        """
+        if threshold is None:
+            return self.sizes
+        time = self.df[self.time_col].to_numpy(dtype=np.float64)
+        in_window = time < threshold if self.below else time > threshold
+        return np.bincount(
+            self.group_ids, weights=in_window.astype(np.float64), minlength=len(self.starts)
+        ).astype(np.int64)
+
+    def grouped_scan(self, values: np.ndarray, how: str) -> np.ndarray:
+        """
+        Computes a cumulative scan restarting at every group.
+
+        Args:
+            values (np.ndarray): Row values in engine order.
+            how (str): 'cumsum', 'cummin' or 'cummax'.
+
+        Returns:
+            np.ndarray: The scanned values.
+        """
+        return getattr(pd.Series(values).groupby(self.group_ids), how)().to_numpy()
+
+    def aggregate_windows(
+        self, windows: Dict[str, Optional[float]], agg_maps: Dict[str, Dict[str, List[Any]]]
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        Aggregates every window with its own recipe.
+
+        Args:
+            windows (Dict[str, Optional[float]]): Threshold of every window, by window name. None means all rows.
+            agg_maps (Dict[str, Dict[str, List[Any]]]): Recipe of every window, by window name. Windows with an
+                empty or missing recipe are skipped.
+
+        Returns:
+            Dict[str, pd.DataFrame]: Per window, one row per key with at least one row in the window (sorted, as
+            index) and (column, aggregation) multi-level columns, as the aggregation backends return them.
+        """
+        lengths = {name: self.window_lengths(threshold) for name, threshold in windows.items() if agg_maps.get(name)}
+        ends = {name: np.maximum(self.starts + length - 1, 0) for name, length in lengths.items()}
+        native = {name: {} for name in lengths}
+        fallback = {name: {} for name in lengths}
+
+        columns = list(dict.fromkeys(column for name in lengths for column in agg_maps[name]))
+        for column in columns:
+            numeric = pd.api.types.is_numeric_dtype(self.df[column])
+            scans = {}
+            for name in lengths:
+                for agg in agg_maps[name].get(column, []):
+                    label = agg_name(agg)
+                    if not numeric or isinstance(agg, SegmentKernel) or label not in window_aggregations:
+                        fallback[name].setdefault(column, []).append(agg)
+                        continue
+                    if not scans:
+                        scans = self.column_scans(column)
+                    native[name][(column, label)] = self.window_statistic(scans, label, ends[name], lengths[name])
+
+        return {
+            name: self.assemble(native[name], fallback[name], agg_maps[name], lengths[name]) for name in lengths
+        }
+
+    def column_scans(self, column: str) -> Dict[str, np.ndarray]:
+        """
+        Computes the grouped cumulative non-null count, sum, min and max of a column.
+
+        Args:
+            column (str): The column.
+
+        Returns:
+            Dict[str, np.ndarray]: The scans, by name.
+        """
+        values = self.df[column].to_numpy(dtype=np.float64)
+        missing = np.isnan(values)
+        return {
+            "count": self.grouped_scan((~missing).astype(np.int64), "cumsum"),
+            "sum": self.grouped_scan(np.where(missing, 0.0, values), "cumsum"),
+            "min": self.grouped_scan(np.where(missing, np.inf, values), "cummin"),
+            "max": self.grouped_scan(np.where(missing, -np.inf, values), "cummax"),
+        }
+
+    @staticmethod
+    def window_statistic(scans: Dict[str, np.ndarray], label: str, ends: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        """
+        Reads a statistic of every group's window off the scans.
+
+        Args:
+            scans (Dict[str, np.ndarray]): The grouped scans of the column.
+            label (str): The aggregation name.
+            ends (np.ndarray): Last row of every group's window.
+            lengths (np.ndarray): Window length of every group.
+
+        Returns:
+            np.ndarray: The statistic per group (meaningless for groups with an empty window).
+        """
+        count = scans["count"][ends]
+        if label == "count":
+            return count
+        if label == "sum":
+            return scans["sum"][ends]
+        if label == "mean":
+            return np.where(count > 0, scans["sum"][ends] / np.maximum(count, 1), np.nan)
+        if label == "share_na":
+            return (lengths - count) / np.maximum(lengths, 1)
+        window_min = np.where(count > 0, scans["min"][ends], np.nan)
+        window_max = np.where(count > 0, scans["max"][ends], np.nan)
+        if label == "min":
+            return window_min
+        if label == "max":
+            return window_max
+        return window_max - window_min
+
+    def assemble(
+        self,
+        native: Dict[tuple, np.ndarray],
+        fallback_map: Dict[str, List[Any]],
+        agg_map: Dict[str, List[Any]],
+        lengths: np.ndarray,
+    ) -> pd.DataFrame:
+        """
+        Builds the feature frame of one window from the scanned statistics and the backend fallback.
+
+        Args:
+            native (Dict[tuple, np.ndarray]): Scanned statistics by (column, aggregation).
+            fallback_map (Dict[str, List[Any]]): Entries the backend has to compute on the window rows.
+            agg_map (Dict[str, List[Any]]): The full recipe of the window, for column order.
+            lengths (np.ndarray): Window length of every group.
+
+        Returns:
+            pd.DataFrame: One row per key with a non-empty window and (column, aggregation) multi-level columns.
+        """
+        present = lengths > 0
+        stats = pd.DataFrame(
+            {label: values[present] for label, values in native.items()},
+            index=pd.Index(self.keys[present], name=self.key),
+        )
+        if native:
+            stats.columns = pd.MultiIndex.from_tuples(list(native))
+        if fallback_map:
+            positions = np.arange(len(self.group_ids)) - self.starts[self.group_ids]
+            window_rows = self.df[positions < lengths[self.group_ids]]
+            fallback_stats = self.backend.groupby_agg(window_rows, self.key, fallback_map, order_by=self.order_by)
+            stats = fallback_stats if not native else stats.join(fallback_stats, how="outer")
+        return stats[[(column, agg_name(agg)) for column, aggs in agg_map.items() for agg in aggs]]
@@ -0,0 +1,289 @@
+import os
+import time
+import uuid
+import shutil
+import tempfile
+import multiprocessing
+import concurrent.futures
+from contextlib import contextmanager
+from typing import List, Dict, Any, Tuple, Optional, Iterator
+import numpy as np
+import pandas as pd
+from utils import reduce_column_names
+from aggregation_backends import get_backend
+from window_engine import WindowEngine
+from cost_ledger import get_cost_ledger
+
+### modules the forkserver imports once, so every worker starts with them loaded
+preload_modules = ["numpy", "pandas", "data_processors"]
+
+filter_operators = {
+    "==": lambda column, value: column == value,
+    "!=": lambda column, value: column != value,
+    ">": lambda column, value: column > value,
+    ">=": lambda column, value: column >= value,
+    "<": lambda column, value: column < value,
+    "isin": lambda column, value: column.isin(value),
+}
+
+
+class WorkerPool:
+    """
+    A long-lived process pool shared by all processors.
+
+    Workers are started by a forkserver (spawn where unavailable) that preloads the heavy modules, so they neither
+    inherit the memory of the parent, which may already hold the merged features, nor pay the import cost for every
+    processor. Processors publish their frame once to a temporary file and submit small task descriptors (task name,
+    frame path, filters, recipe, prefixes); workers load each published frame once and keep it cached. Workers time
+    every task, and the pool records the times of the segments in the cost ledger.
+
+    Attributes:
+        n_workers (int): Number of worker processes.
+        executor (concurrent.futures.ProcessPoolExecutor): The underlying pool.
+        frame_dir (str): Directory of the published frames.
+    """
+
+    def __init__(self, n_workers: int) -> None:
+        """
+        Initializes the WorkerPool.
+
+        Args:
+            n_workers (int): Number of worker processes.
+        """
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        context = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            context.set_forkserver_preload(preload_modules)
+        self.n_workers = n_workers
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=n_workers, mp_context=context)
+        self.frame_dir = tempfile.mkdtemp(prefix="homecredit_frames_")
+
+    @contextmanager
+    def shared_frame(self, df: pd.DataFrame) -> Iterator[str]:
+        """
+        Publishes a frame for the workers for the duration of a block.
+
+        Args:
+            df (pd.DataFrame): The frame the tasks operate on.
+
+        Yields:
+            str: The reference of the frame, to pass to submit.
+        """
+        path = os.path.join(self.frame_dir, f"{uuid.uuid4().hex}.pkl")
+        df.to_pickle(path, protocol=5)
+        try:
+            yield path
+        finally:
+            os.remove(path)
+
+    def submit(self, task: str, frame: str, **kwargs: Any) -> concurrent.futures.Future:
+        """
+        Submits a task descriptor.
+
+        Args:
+            task (str): Name of the task in task_functions.
+            frame (str): Reference of a published frame.
+            **kwargs: Arguments of the task.
+
+        Returns:
+            concurrent.futures.Future: The future of the task result.
+        """
+        future = concurrent.futures.Future()
+
+        def record(timed: concurrent.futures.Future) -> None:
+            if timed.exception() is not None:
+                future.set_exception(timed.exception())
+                return
+            result, seconds = timed.result()
+            get_cost_ledger().record(task_recipes(task, kwargs), seconds)
+            future.set_result(result)
+
+        self.executor.submit(run_task, task, frame, kwargs).add_done_callback(record)
+        return future
+
+    def shutdown(self) -> None:
+        """
+        Stops the workers and removes the published frames.
+        """
+        self.executor.shutdown()
+        shutil.rmtree(self.frame_dir, ignore_errors=True)
+
+
+_pool = None
+
+
+def get_worker_pool(n_workers: int) -> WorkerPool:
+    """
+    Returns the shared worker pool, creating it on first use.
+
+    Args:
+        n_workers (int): Number of worker processes, used when the pool is created.
+
+    Returns:
+        WorkerPool: The shared pool.
+    """
+    global _pool
+    if _pool is None:
+        _pool = WorkerPool(n_workers)
+    return _pool
+
+
+def shutdown_worker_pool() -> None:
+    """
+    Shuts the shared worker pool down, if it was started.
+    """
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+### worker side
+_frame_cache = {}
+
+
+def load_frame(frame: str) -> pd.DataFrame:
+    """
+    Loads a published frame, keeping the last one cached as processors submit many tasks on the same frame.
+
+    Args:
+        frame (str): Reference of the published frame.
+
+    Returns:
+        pd.DataFrame: The frame.
+    """
+    if frame not in _frame_cache:
+        _frame_cache.clear()
+        _frame_cache[frame] = pd.read_pickle(frame)
+    return _frame_cache[frame]
+
+
+def apply_filters(df: pd.DataFrame, filters: List[Tuple[str, str, Any]]) -> pd.DataFrame:
+    """
+    Selects the rows matching declarative filters.
+
+    Args:
+        df (pd.DataFrame): The rows.
+        filters (List[Tuple[str, str, Any]]): (column, operator, value) conditions, all of which have to hold.
+
+    Returns:
+        pd.DataFrame: The matching rows.
+    """
+    for column, operator, value in filters:
+        df = df[filter_operators[operator](df[column], value)]
+    return df
+
+
+def aggregate_segment(
+    df: pd.DataFrame,
+    filters: List[Tuple[str, str, Any]],
+    agg_map: Dict[str, List[Any]],
+    name_prefix: str,
+    backend: str,
+    float32: bool = True,
+    key: str = "SK_ID_CURR",
+    order_by: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Aggregates one filtered segment of a frame per customer.
+
+    Args:
+        df (pd.DataFrame): The frame.
+        filters (List[Tuple[str, str, Any]]): Conditions selecting the segment.
+        agg_map (Dict[str, List[Any]]): Aggregation mapping to compute.
+        name_prefix (str): Prefix of the feature names.
+        backend (str): Name of the aggregation backend.
+        float32 (bool): Whether to downcast the features to float32.
+        key (str): The grouping column.
+        order_by (Optional[str]): Column ordering the rows within a group for segment kernels.
+
+    Returns:
+        pd.DataFrame: The features of the segment, with the key as a column.
+    """
+    stats = get_backend(backend).groupby_agg(apply_filters(df, filters), key, agg_map, order_by=order_by)
+    if float32:
+        stats = stats.astype(np.float32)
+    stats.columns = reduce_column_names(stats, name_prefix)
+    return stats.reset_index()
+
+
+def aggregate_windows(
+    df: pd.DataFrame,
+    filters: List[Tuple[str, str, Any]],
+    time_col: str,
+    windows: Dict[str, Optional[float]],
+    agg_maps: Dict[str, Dict[str, List[Any]]],
+    name_prefixes: Dict[str, str],
+    backend: str,
+    below: bool = False,
+    float32: bool = True,
+    key: str = "SK_ID_CURR",
+    order_by: Optional[str] = None,
+) -> List[pd.DataFrame]:
+    """
+    Aggregates nested time windows of one filtered segment of a frame in a single pass.
+
+    Args:
+        df (pd.DataFrame): The frame.
+        filters (List[Tuple[str, str, Any]]): Conditions selecting the segment.
+        time_col (str): The column defining the windows.
+        windows (Dict[str, Optional[float]]): Bound of every window, by window name. None means all rows.
+        agg_maps (Dict[str, Dict[str, List[Any]]]): Aggregation mapping of every window, by window name.
+        name_prefixes (Dict[str, str]): Feature name prefix of every window, by window name.
+        backend (str): Name of the aggregation backend.
+        below (bool): Whether windows keep rows below their bound (True) or above it (False).
+        float32 (bool): Whether to downcast the features to float32.
+        key (str): The grouping column.
+        order_by (Optional[str]): Column ordering the rows within a group for segment kernels.
+
+    Returns:
+        List[pd.DataFrame]: The features of every window, with the key as a column.
+    """
+    engine = WindowEngine(apply_filters(df, filters), key, time_col, get_backend(backend), below, order_by)
+    feature_dfs = []
+    for name, stats in engine.aggregate_windows(windows, agg_maps).items():
+        if float32:
+            stats = stats.astype(np.float32)
+        stats.columns = reduce_column_names(stats, name_prefixes[name])
+        feature_dfs.append(stats.reset_index())
+    return feature_dfs
+
+
+task_functions = {
+    "aggregate_segment": aggregate_segment,
+    "aggregate_windows": aggregate_windows,
+}
+
+
+def task_recipes(task: str, kwargs: Dict[str, Any]) -> Dict[str, Dict[str, List[Any]]]:
+    """
+    Lists the segments a task descriptor computes.
+
+    Args:
+        task (str): Name of the task in task_functions.
+        kwargs (Dict[str, Any]): Arguments of the task.
+
+    Returns:
+        Dict[str, Dict[str, List[Any]]]: Aggregation mapping of every segment, by name prefix.
+    """
+    if task == "aggregate_segment":
+        return {kwargs["name_prefix"]: kwargs["agg_map"]}
+    return {kwargs["name_prefixes"][name]: agg_map for name, agg_map in kwargs["agg_maps"].items()}
+
+
+def run_task(task: str, frame: str, kwargs: Dict[str, Any]) -> Tuple[Any, float]:
+    """
+    Executes a task descriptor in a worker.
+
+    Args:
+        task (str): Name of the task in task_functions.
+        frame (str): Reference of the published frame.
+        kwargs (Dict[str, Any]): Arguments of the task.
+
+    Returns:
+        Tuple[Any, float]: The task result and its compute time in seconds, excluding the frame load.
+    """
+    df = load_frame(frame)
+    start = time.perf_counter()
+    result = task_functions[task](df, **kwargs)
+    return result, time.perf_counter() - start
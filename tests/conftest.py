@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the pipeline modules are flat modules in src/, imported as `from utils import ...`
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,76 @@
+import functools
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("polars")
+
+from aggregation_backends import PandasBackend, PolarsBackend, compare_feature_frames
+from data_processors import (
+    BureauData,
+    PreviousApplicationData,
+    InstallmentsPaymentsData,
+    POSCashBalanceData,
+    CreditCardBalanceData,
+)
+from kernels import skew, last_value, trend_slope, longest_positive_streak
+from synthetic_data import generate_synthetic_data
+from utils import dispersion, share_na
+from worker_pool import shutdown_worker_pool
+
+
+@pytest.fixture(scope="module")
+def rows() -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    n = 2000
+    delay = rng.normal(0, 10, n)
+    delay[rng.random(n) < 0.1] = np.nan
+    return pd.DataFrame(
+        {
+            "SK_ID_CURR": rng.integers(100000, 100200, n),
+            "DAYS_INSTALMENT": -rng.integers(1, 3000, n),
+            "delay": delay,
+            "AMT_PAYMENT": rng.lognormal(9, 1, n),
+        }
+    )
+
+
+@pytest.fixture(scope="module")
+def path_to_data(tmp_path_factory: pytest.TempPathFactory) -> str:
+    path = str(tmp_path_factory.mktemp("synthetic")) + "/"
+    generate_synthetic_data(path, 300, seed=7)
+    return path
+
+
+def test_fallback_only_recipe(rows: pd.DataFrame) -> None:
+    # the installments windows hand the backend segment kernels only, with no Polars expression at all
+    agg_map = {"delay": [skew, last_value, trend_slope, longest_positive_streak]}
+    expected = PandasBackend().groupby_agg(rows, "SK_ID_CURR", agg_map, "DAYS_INSTALMENT")
+    result = PolarsBackend().groupby_agg(rows, "SK_ID_CURR", agg_map, "DAYS_INSTALMENT")
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_mixed_recipe(rows: pd.DataFrame) -> None:
+    agg_map = {
+        "delay": ["sum", "mean", "max", "min", dispersion, share_na, last_value],
+        "AMT_PAYMENT": ["count", "nunique", trend_slope],
+    }
+    expected = PandasBackend().groupby_agg(rows, "SK_ID_CURR", agg_map, "DAYS_INSTALMENT")
+    result = PolarsBackend().groupby_agg(rows, "SK_ID_CURR", agg_map, "DAYS_INSTALMENT")
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, rtol=1e-5)
+
+
+@pytest.mark.parametrize(
+    "processor",
+    [BureauData, PreviousApplicationData, InstallmentsPaymentsData, POSCashBalanceData, CreditCardBalanceData],
+)
+def test_processor_parity(path_to_data: str, processor: type) -> None:
+    features = {}
+    for backend in ["pandas", "polars"]:
+        feature_dfs = processor(path_to_data, 1, backend=backend).process()
+        features[backend] = functools.reduce(
+            lambda left, right: left.merge(right, on="SK_ID_CURR", how="outer"), feature_dfs
+        )
+    shutdown_worker_pool()
+    parity, max_diff = compare_feature_frames(features["pandas"], features["polars"])
+    assert parity, f"max abs diff {max_diff}"